@@ -0,0 +1,1194 @@
+# Núcleo de análisis de los balances del BCRA, sin interfaz: carga, normalización,
+# índice, variaciones y los cálculos de cada sección de la app (comparativo, evolución,
+# market share y concentración). Lo usan app.py (con st.cache_data encima) y reportes.py (por lotes).
+import os
+import json
+import time
+import shutil
+import tempfile
+import hashlib
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import yaml
+from yaml.loader import SafeLoader
+
+
+# --- CACHE EN DISCO POR ARCHIVO (Parquet) ---
+# Cada TXT mensual se guarda ya limpio y tipado. La clave es la URL + hash del contenido,
+# asi un archivo historico que no cambia nunca se vuelve a parsear.
+CACHE_DIR = os.environ.get("BCRA_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache_bcra"))
+FORMATO_CACHE = 2  # Subirlo cuando cambie lo que se guarda en cada Parquet
+COL_NAMES = ["ID", "Banco", "Fecha", "Codigo", "Cuenta", "Debe", "Haber"]
+
+# Tipos declarados: el TXT se lee todo como texto (sin inferencia por bloque) y se tipa al limpiar
+DTYPES_CRUDOS = {col: str for col in COL_NAMES}
+ESQUEMA_PARQUET = pa.schema([("ID", pa.int32()), ("Banco", pa.string()), ("Fecha", pa.int32()), ("Codigo", pa.int32()),
+                             ("Cuenta", pa.string()), ("Debe", pa.float64()), ("Haber", pa.float64())])
+TIPOS_HECHOS = {"ID": "int32", "Codigo": "int32", "Fecha": "int32", "Debe": "float64", "Haber": "float64"}
+
+# --- DESCARGA CONCURRENTE Y CONDICIONAL ---
+MAX_DESCARGAS = 6        # Archivos procesados en paralelo
+REINTENTOS = 3           # Intentos por archivo antes de darlo por fallido
+ESPERA_BASE = 1.0        # Segundos de espera inicial (se duplica en cada reintento)
+BLOQUE_BYTES = 1 << 20   # Tamaño de bloque al descargar / hashear (1 MB)
+CHUNK_FILAS = 200_000    # Filas del TXT que se parsean por vez
+
+def nombre_archivo(url):
+    # "COMPLETO_012024.TXT" a partir de la URL de Dropbox o de la ruta local
+    return os.path.basename(urllib.parse.urlparse(url).path) or url
+
+def leer_meta(clave_url):
+    ruta = os.path.join(CACHE_DIR, f"{clave_url}.json")
+    if not os.path.exists(ruta):
+        return {}
+    with open(ruta) as f:
+        return json.load(f)
+
+def guardar_meta(clave_url, meta):
+    ruta = os.path.join(CACHE_DIR, f"{clave_url}.json")
+    with open(ruta + ".tmp", "w") as f:
+        json.dump(meta, f)
+    os.replace(ruta + ".tmp", ruta)
+
+def descargar_archivo(url, meta):
+    # Devuelve (ruta_local, es_temporal, validadores). ruta_local=None si el archivo no cambió (HTTP 304).
+    # Acepta URLs (Dropbox) o rutas locales; para las locales el validador es tamaño+mtime.
+    # La descarga se escribe a disco por bloques: el archivo nunca está entero en memoria.
+    if os.path.exists(url):
+        st_archivo = os.stat(url)
+        validador = f"{st_archivo.st_size}-{st_archivo.st_mtime_ns}"
+        if meta.get("etag") == validador:
+            return None, False, meta
+        return url, False, {"etag": validador}
+
+    headers = {}
+    if meta.get("etag"): headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"): headers["If-Modified-Since"] = meta["last_modified"]
+    req = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=60) as resp:
+            validadores = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+            fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    shutil.copyfileobj(resp, f, BLOQUE_BYTES)
+            except BaseException:
+                os.remove(tmp)
+                raise
+            return tmp, True, validadores
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, False, meta
+        raise
+
+def descargar_con_reintentos(url, meta):
+    for intento in range(REINTENTOS):
+        try:
+            return descargar_archivo(url, meta)
+        except urllib.error.HTTPError as e:
+            # Los 4xx (salvo 429) no se arreglan reintentando
+            if 400 <= e.code < 500 and e.code != 429 or intento == REINTENTOS - 1:
+                raise
+        except (urllib.error.URLError, TimeoutError, ConnectionError):
+            if intento == REINTENTOS - 1:
+                raise
+        time.sleep(ESPERA_BASE * 2 ** intento)
+
+def hashear_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(BLOQUE_BYTES), b""):
+            h.update(bloque)
+    return h.hexdigest()[:16]
+
+def limpiar_bloque(temp_df):
+    # Limpieza de un bloque de filas del TXT: se hace una vez y queda guardada en el cache
+    for col in ['Banco', 'Cuenta', 'Fecha', 'ID', 'Codigo']:
+        temp_df[col] = temp_df[col].astype(str).str.replace('"', '').str.strip()
+    temp_df = temp_df[temp_df['Fecha'].str.len() == 6].copy()
+    # ID, Codigo y Fecha (AAAAMM) como enteros: las filas no numéricas son basura del archivo
+    for col in ['ID', 'Codigo', 'Fecha']:
+        temp_df[col] = pd.to_numeric(temp_df[col], errors='coerce')
+    temp_df = temp_df.dropna(subset=['ID', 'Codigo', 'Fecha'])
+    temp_df = temp_df.astype({'ID': 'int32', 'Codigo': 'int32', 'Fecha': 'int32'})
+    temp_df['Debe'] = pd.to_numeric(temp_df['Debe'], errors='coerce').fillna(0).astype('float64')
+    temp_df['Haber'] = pd.to_numeric(temp_df['Haber'], errors='coerce').fillna(0).astype('float64')
+    return temp_df
+
+def convertir_a_parquet(ruta_txt, ruta):
+    # Lee el TXT en bloques de CHUNK_FILAS con tipos declarados (sin inferencia) y va
+    # agregando cada bloque limpio al Parquet: en memoria hay un solo bloque por vez.
+    tmp = ruta + ".tmp"
+    with pq.ParquetWriter(tmp, ESQUEMA_PARQUET) as writer:
+        for bloque in pd.read_csv(ruta_txt, sep='\t', names=COL_NAMES, encoding='latin-1', on_bad_lines='skip',
+                                  dtype=DTYPES_CRUDOS, chunksize=CHUNK_FILAS):
+            bloque = limpiar_bloque(bloque)
+            writer.write_table(pa.Table.from_pandas(bloque, schema=ESQUEMA_PARQUET, preserve_index=False))
+    os.replace(tmp, ruta)
+
+def leer_archivo_cacheado(url):
+    # Devuelve la ruta del Parquet limpio del archivo (descargándolo y convirtiéndolo si hace falta)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    clave_url = hashlib.sha256(url.encode()).hexdigest()[:16]
+    meta = leer_meta(clave_url)
+    if meta.get("parquet") and not os.path.exists(os.path.join(CACHE_DIR, meta["parquet"])) \
+            or meta.get("formato") != FORMATO_CACHE:
+        meta = {}  # Se borró el Parquet o cambió el formato: forzamos una descarga completa
+
+    ruta_txt, es_temporal, validadores = descargar_con_reintentos(url, meta)
+    if ruta_txt is None:
+        # Sin cambios desde la última descarga: no se baja ni se parsea nada
+        return os.path.join(CACHE_DIR, meta["parquet"])
+
+    try:
+        clave_contenido = hashear_archivo(ruta_txt)
+        archivo = f"{clave_url}_{clave_contenido}_v{FORMATO_CACHE}.parquet"
+        ruta = os.path.join(CACHE_DIR, archivo)
+        if not os.path.exists(ruta):
+            convertir_a_parquet(ruta_txt, ruta)
+            # Borrado de versiones viejas del mismo archivo
+            for viejo in os.listdir(CACHE_DIR):
+                if viejo.startswith(clave_url + "_") and viejo.endswith(".parquet") and viejo != archivo:
+                    os.remove(os.path.join(CACHE_DIR, viejo))
+    finally:
+        if es_temporal:
+            os.remove(ruta_txt)
+
+    guardar_meta(clave_url, {**validadores, "url": url, "parquet": archivo, "formato": FORMATO_CACHE})
+    return ruta
+
+def leer_archivos(urls):
+    # Descarga y conversión en paralelo. Devuelve las rutas de los Parquet en el orden
+    # de `urls` y la lista de archivos que fallaron con su error.
+    urls = list(dict.fromkeys(urls))  # Una URL repetida se procesa una sola vez
+    resultados, fallidos = {}, []
+    with ThreadPoolExecutor(max_workers=MAX_DESCARGAS) as pool:
+        futuros = {pool.submit(leer_archivo_cacheado, url): url for url in urls}
+        for futuro in as_completed(futuros):
+            url = futuros[futuro]
+            try:
+                resultados[url] = futuro.result()
+            except Exception as e:
+                fallidos.append((nombre_archivo(url), str(e)))
+    return [resultados[url] for url in urls if url in resultados], sorted(fallidos)
+
+def armar_hechos(rutas):
+    # Arma la tabla de hechos leyendo un Parquet por vez y copiándolo en columnas
+    # preasignadas. Pico de memoria ≈ tabla final + el archivo mensual más grande
+    # (+ un bloque de CHUNK_FILAS por descarga en curso): no crece con la cantidad de
+    # archivos más allá de los propios datos, porque nunca se juntan todos en una lista
+    # ni se hacen concat / sort / drop_duplicates globales.
+    # Devuelve (hechos, nombres de bancos, nombres de cuentas, archivos), con archivos = qué periodos
+    # trae cada Parquet (lo usa ampliar_datos para saber qué se puede reutilizar).
+    total = sum(pq.ParquetFile(r).metadata.num_rows for r in rutas)
+    columnas = {col: np.empty(total, dtype=tipo) for col, tipo in TIPOS_HECHOS.items()}
+    nombres_bancos, nombres_cuentas = [], []
+
+    # Los archivos se copian en orden de periodo, así el resultado queda ordenado sin sort global
+    fechas_archivo = {r: np.unique(pd.read_parquet(r, columns=["Fecha"])["Fecha"].to_numpy()) for r in rutas}
+    orden = sorted(rutas, key=lambda r: fechas_archivo[r][0] if len(fechas_archivo[r]) else 0)
+    archivos = pd.DataFrame({"Archivo": pd.Series([os.path.basename(r) for r in orden for _ in fechas_archivo[r]], dtype="str"),
+                             "Fecha": np.concatenate([fechas_archivo[r] for r in orden] + [[]]).astype("int32")})
+    n, ultima_clave, solapados = 0, -1, False
+    for ruta in orden:
+        temp_df = pd.read_parquet(ruta)
+        nombres_bancos.append(temp_df[["Fecha", "ID", "Banco"]].drop_duplicates())
+        nombres_cuentas.append(temp_df[["Fecha", "Codigo", "Cuenta"]].drop_duplicates())
+        # Duplicados y orden dentro del archivo (un mes)
+        temp_df = temp_df[list(TIPOS_HECHOS)].drop_duplicates().sort_values(["Fecha", "ID", "Codigo"])
+        if len(temp_df):
+            claves_archivo = clave_hechos(temp_df["ID"].iloc[[0, -1]], temp_df["Codigo"].iloc[[0, -1]], temp_df["Fecha"].iloc[[0, -1]])
+            solapados |= bool(claves_archivo[0] <= ultima_clave)
+            ultima_clave = claves_archivo[1]
+        for col in TIPOS_HECHOS:
+            columnas[col][n:n + len(temp_df)] = temp_df[col].to_numpy()
+        n += len(temp_df)
+        del temp_df
+
+    hechos = pd.DataFrame({col: arr[:n] for col, arr in columnas.items()}, copy=False)
+
+    # Solo si dos archivos se solapan (p. ej. traen el mismo periodo) hace falta reordenar / deduplicar todo
+    if solapados:
+        hechos = hechos.drop_duplicates().sort_values(["Fecha", "ID", "Codigo"]).reset_index(drop=True)
+
+    vacio_bancos = pd.DataFrame({"Fecha": pd.Series(dtype="int32"), "ID": pd.Series(dtype="int32"), "Banco": pd.Series(dtype="str")})
+    vacio_cuentas = pd.DataFrame({"Fecha": pd.Series(dtype="int32"), "Codigo": pd.Series(dtype="int32"), "Cuenta": pd.Series(dtype="str")})
+    return (hechos, pd.concat([vacio_bancos] + nombres_bancos, ignore_index=True),
+            pd.concat([vacio_cuentas] + nombres_cuentas, ignore_index=True), archivos)
+
+
+# --- DATOS PUBLICADOS (compartidos entre procesos) ---
+# El resultado de cargar_datos se publica una vez por versión como archivos Arrow sin comprimir
+# (+ .npy para el índice). Cada proceso (workers de Streamlit, reportes.py) los mapea en memoria
+# de solo lectura en lugar de armar su propia copia: las columnas se leen sin copiar y las páginas
+# las comparte el sistema operativo. Una versión nueva es otra carpeta; las viejas se borran.
+PUBLICAR = os.environ.get("BCRA_PUBLICAR", "1") != "0"
+PUBLICADOS = os.path.join(CACHE_DIR, "publicado")
+FORMATO_DATOS = 4         # Subirlo cuando cambie la estructura de `datos` (o las definiciones de RATIOS)
+VERSIONES_PUBLICADAS = 3  # Se conservan las más recientes (a quien ya las tiene mapeadas no le afecta borrarlas)
+TABLAS_PUBLICADAS = ["hechos", "bancos", "cuentas", "periodos", "totales_sistema", "concentracion", "ratios",
+                     "historial_bancos", "historial_cuentas", "archivos"]
+TABLAS_CON_INDICE = ["bancos", "cuentas", "periodos", "totales_sistema", "concentracion"]
+ARRAYS_PUBLICADOS = ["clave", "bordes"]
+
+def carpeta_publicada(version):
+    return os.path.join(PUBLICADOS, f"v{FORMATO_DATOS}_{version}")
+
+def publicar_datos(datos):
+    # Escribe `datos` en una carpeta temporal y la renombra de una vez: nadie ve una versión a medias
+    destino = carpeta_publicada(datos["version"])
+    if os.path.isdir(destino):
+        return destino
+    os.makedirs(PUBLICADOS, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=PUBLICADOS, prefix=".tmp_")
+    try:
+        for nombre in TABLAS_PUBLICADAS:
+            tabla = pa.Table.from_pandas(datos[nombre], preserve_index=nombre in TABLAS_CON_INDICE)
+            with pa.OSFile(os.path.join(tmp, f"{nombre}.arrow"), "wb") as f, pa.ipc.new_file(f, tabla.schema) as writer:
+                writer.write_table(tabla)
+        for nombre in ARRAYS_PUBLICADOS:
+            np.save(os.path.join(tmp, f"{nombre}.npy"), datos[nombre])
+        os.rename(tmp, destino)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        if not os.path.isdir(destino):  # Si otro proceso la publicó primero, está todo bien
+            raise
+
+    # Versiones viejas: se borran las que excedan VERSIONES_PUBLICADAS
+    versiones = sorted((os.path.join(PUBLICADOS, d) for d in os.listdir(PUBLICADOS) if not d.startswith(".")),
+                       key=os.path.getmtime, reverse=True)
+    for vieja in versiones[VERSIONES_PUBLICADAS:]:
+        shutil.rmtree(vieja, ignore_errors=True)
+    return destino
+
+def mapear_datos(carpeta, version):
+    # Abre una versión publicada sin copiarla: DataFrames sobre buffers Arrow mapeados (solo lectura)
+    datos = {"version": version}
+    for nombre in TABLAS_PUBLICADAS:
+        tabla = pa.ipc.open_file(pa.memory_map(os.path.join(carpeta, f"{nombre}.arrow"), "r")).read_all()
+        # split_blocks: una columna por bloque, así pandas no las junta (y copia) en un solo array
+        datos[nombre] = tabla.to_pandas(split_blocks=True)
+    for nombre in ARRAYS_PUBLICADOS:
+        datos[nombre] = np.load(os.path.join(carpeta, f"{nombre}.npy"), mmap_mode="r")
+    return datos
+
+
+# --- MANIFIESTO DE PERIODOS ---
+# Periodo (AAAAMM) -> URL del COMPLETO_MMAAAA.TXT. Se lee sin descargar ningún dato.
+MANIFIESTO = os.environ.get("BCRA_MANIFIESTO", os.path.join(os.path.dirname(os.path.abspath(__file__)), "manifiesto.yaml"))
+
+def cargar_manifiesto(ruta=MANIFIESTO):
+    with open(ruta, encoding="utf-8") as f:
+        manifiesto = yaml.load(f, Loader=SafeLoader)
+    return {int(fecha): url for fecha, url in sorted(manifiesto["periodos"].items())}
+
+
+# --- MOTOR DE VARIACIONES ---
+def clave_hechos(ids, codigos, fechas):
+    # Clave entera única por (Fecha, ID, Codigo). Como la tabla de hechos está ordenada
+    # por Fecha, ID, Codigo, la clave queda ordenada y se puede buscar con searchsorted.
+    return (np.asarray(fechas, dtype="int64") * 10**11
+            + np.asarray(ids, dtype="int64") * 10**6
+            + np.asarray(codigos, dtype="int64"))
+
+def fecha_mes_anterior(fechas):
+    # AAAAMM -> AAAAMM del mes anterior (enero pasa a diciembre del año previo)
+    fechas = np.asarray(fechas)
+    return np.where(fechas % 100 == 1, fechas - 100 + 11, fechas - 1)
+
+def calcular_variacion(hechos, fechas_ref, hechos_ref=None, claves=None):
+    # Variación absoluta y % de cada fila de `hechos` contra la misma (ID, Codigo) en `fechas_ref`.
+    # Si la cuenta no existe en el periodo de referencia se toma saldo 0 (Var. % = 0).
+    hechos_ref = hechos if hechos_ref is None else hechos_ref
+    if claves is None:
+        claves = clave_hechos(hechos_ref["ID"], hechos_ref["Codigo"], hechos_ref["Fecha"])
+    buscadas = clave_hechos(hechos["ID"], hechos["Codigo"], fechas_ref)
+    pos = np.searchsorted(claves, buscadas).clip(max=max(len(claves) - 1, 0))
+    encontrada = (claves[pos] == buscadas) if len(claves) else np.zeros(len(buscadas), dtype=bool)
+    saldo_ref = np.where(encontrada, hechos_ref["Saldo_Act"].to_numpy()[pos] if len(claves) else 0.0, 0.0)
+
+    saldo = hechos["Saldo_Act"].to_numpy()
+    var_abs = saldo - saldo_ref
+    var_pct = np.divide(var_abs, np.abs(saldo_ref), out=np.zeros_like(var_abs), where=saldo_ref != 0) * 100
+    return var_abs, var_pct
+
+
+# --- ÍNDICE PARTICIONADO POR (PERIODO, BANCO, CÓDIGO) ---
+def seleccionar(datos, desde=None, hasta=None, ids=None, codigos=None):
+    # Devuelve las filas de hechos con Fecha entre desde/hasta (inclusive), de los bancos `ids`
+    # y los códigos `codigos` (None = sin filtro). Como la tabla está ordenada por la clave
+    # (Fecha, ID, Codigo), cada combinación es un bloque contiguo que se ubica con searchsorted:
+    # el costo depende del tamaño del resultado y no del dataset completo.
+    hechos, claves, bordes = datos["hechos"], datos["clave"], datos["bordes"]
+    fechas = datos["periodos"].index.to_numpy()
+    i0 = np.searchsorted(fechas, desde, side="left") if desde is not None else 0
+    i1 = np.searchsorted(fechas, hasta, side="right") if hasta is not None else len(fechas)
+    if i0 >= i1:
+        return hechos.iloc[0:0]
+    if ids is None and codigos is None:
+        # Rango de periodos completo: un solo bloque, sin copiar
+        return hechos.iloc[bordes[i0]:bordes[i1]]
+
+    fechas = fechas[i0:i1]
+    ids = datos["bancos"].index.to_numpy() if ids is None else np.unique(np.asarray(ids))
+    if codigos is None:
+        # Todo el bloque (Fecha, ID): desde el código 0 hasta el máximo posible
+        f, i = [a.ravel() for a in np.meshgrid(fechas, ids, indexing="ij")]
+        desde_clave, hasta_clave = clave_hechos(i, 0, f), clave_hechos(i, 10**6 - 1, f)
+    else:
+        codigos = np.unique(np.asarray(codigos))
+        f, i, c = [a.ravel() for a in np.meshgrid(fechas, ids, codigos, indexing="ij")]
+        desde_clave = hasta_clave = clave_hechos(i, c, f)
+    lo = np.searchsorted(claves, desde_clave, side="left")
+    hi = np.searchsorted(claves, hasta_clave, side="right")
+
+    # Concatenamos los rangos [lo, hi) sin bucles de Python
+    largos = hi - lo
+    lo, largos = lo[largos > 0], largos[largos > 0]
+    if not len(lo):
+        return hechos.iloc[0:0]
+    inicios = np.repeat(lo - np.concatenate([[0], np.cumsum(largos)[:-1]]), largos)
+    return hechos.iloc[inicios + np.arange(largos.sum())]
+
+
+def version_archivos(rutas):
+    # Los nombres de los Parquet llevan el hash del contenido de cada archivo: la versión cambia
+    # si cambia cualquiera de ellos, y se puede calcular sin armar los datos
+    return hashlib.sha256("|".join(os.path.basename(r) for r in rutas).encode()).hexdigest()[:12]
+
+
+# --- DIMENSIONES (cuentas y periodos) ---
+# Se arman igual con el motor en memoria (cargar_datos) y con el de DuckDB (motor_duckdb.py)
+def clasificar_nivel_0(codigo):
+    if not codigo: return "Otros"
+    p = codigo[0]
+    if p in ['1', '2']: return "Activo"
+    elif p == '3': return "Pasivo"
+    elif p in ['4', '5', '6']: return "Patrimonio Neto"
+    elif p == '7': return "Partidas fuera del balance"
+    else: return "Otros"
+
+# Totalizadores de cuarto nivel (XYZW00): no se distinguen por los ceros, van en una lista
+TOTALIZADORES_4 = ["511100", "511500", "515500", "521100", "521900",
+                   "525100", "525900", "515100", "521500"]
+
+def clasificar_nivel_1(codigo):
+    if not codigo: return "Otro"
+    # 1. Casos específicos para Totalizador_1
+    if codigo.endswith("00000") or codigo == "650000": return "Totalizador_1"
+    # 2. Casos para Totalizador_2 (terminan en 0000 pero no son el 650000)
+    elif codigo.endswith("0000"):return "Totalizador_2"
+    # 3. Casos para Totalizador_3
+    elif codigo.endswith("000"): return "Totalizador_3"
+    # 4. Casos específicos para Totalizador_4 (Agrupados en una lista)
+    elif codigo in TOTALIZADORES_4:return "Totalizador_4"
+    # 5. Todo lo demás
+    else: return "Otro"
+
+def clasificar_vista(codigo):
+    if not codigo: return "Otro"
+    # El 650000 y los terminados en 00000 son MACRO
+    if codigo == "650000" or codigo.endswith("00000"):
+        return "Vista Macro"
+    # Los terminados en 0000 (que no sean el anterior) son SUBTOTALES
+    elif codigo.endswith("0000"):
+        return "Vista Subtotales"
+    else:
+        return "Otro"  
+
+MAPEO_N2 = {
+    "11": "Efectivo y depósitos en bancos",
+    "12": "Títulos públicos y privados",
+    "13": "Préstamos",
+    "14": "Otros créditos por intermediación financiera",
+    "15": "Créditos por arrendamientos financieros",
+    "16": "Participaciones en otras sociedades",
+    "17": "Créditos diversos",
+    "18": "Propiedad, planta y equipo",
+    "19": "Bienes diversos",
+    "21": "Activos intangibles",
+    "22": "Filiales en el exterior",
+    "23": "Partidas pendientes de imputación (deudores)",
+    "31": "Depósitos",
+    "32": "Otras obligaciones por intermediación financiera",
+    "33": "Obligaciones diversas",
+    "34": "Provisiones",
+    "35": "Partidas pendientes de imputación (acreedores)",
+    "36": "Obligaciones subordinadas",
+    "41": "Capital social",
+    "42": "Aportes no capitalizado",
+    "43": "Ajustes al patrimonio",
+    "44": "Reserva de utilidades",
+    "45": "Resultados no asignados",
+    "46": "Otros resultados integrales acumulados",
+    "51": "Ingresos financieros",
+    "52": "Egresos financieros",
+    "53": "Cargos por incobrabilidad",
+    "54": "Ingresos por servicios",
+    "55": "Egresos por servicios",
+    "56": "Gastos de administración",
+    "57": "Utilidades diversas",
+    "58": "Perdidas diversas",
+    "59": "Resultado de filiales en el exterior",
+    "61": "Impuesto a las ganancias",
+    "62": "Resultado monetario",
+    "65": "Otros resultados integrales (ORI)",
+    "71": "PFB - Deudoras",
+    "72": "PFB - Acreedoras"
+}
+
+def clasificar_cuentas(cuentas):
+    # Codigo -> Cuenta  =>  + Nivel_0, Nivel_1, Nivel_2, Vista (la jerarquía se calcula una vez por Codigo distinto)
+    codigos_str = cuentas.index.astype(str)
+    cuentas['Nivel_0'] = [clasificar_nivel_0(c) for c in codigos_str]
+    cuentas['Nivel_1'] = [clasificar_nivel_1(c) for c in codigos_str]
+    cuentas['Nivel_2'] = codigos_str.str[:2].map(MAPEO_N2)
+    cuentas['Vista'] = [clasificar_vista(c) for c in codigos_str]
+    return cuentas
+
+def armar_periodos(fechas):
+    # Fecha (AAAAMM) -> Año, Mes, Periodo (MM-AAAA), Periodo_DT
+    fechas = pd.Series(sorted(fechas), dtype="int32")
+    fechas_str = fechas.astype(str)
+    periodos = pd.DataFrame({
+        "Año": fechas_str.str[:4].to_numpy(),
+        "Mes": fechas_str.str[4:].to_numpy(),
+        # Periodo para mostrar (MM-AAAA)
+        "Periodo": (fechas_str.str[4:] + "-" + fechas_str.str[:4]).to_numpy(),
+        "Periodo_DT": pd.to_datetime(fechas_str, format='%Y%m', errors='coerce').to_numpy(),
+    }, index=pd.Index(fechas, name="Fecha"))
+    return periodos
+
+
+# --- CONCENTRACIÓN (HHI, CR3 / CR5 y ranking de bancos) ---
+# La participación de cada banco es |Saldo_Act| sobre la suma de |Saldo_Act| de todos los bancos en el
+# (Codigo, Fecha): en las cuentas de un solo signo coincide con el Market Share y en las que mezclan
+# signos mide tamaño sin que un saldo negativo "reste" participación.
+def calcular_concentracion(hechos):
+    # Una sola pasada vectorizada sobre todas las filas: se ordena por (Codigo, Fecha, |saldo| descendente)
+    # y cada grupo queda contiguo. Devuelve (ranking, concentracion):
+    #   ranking: puesto de cada fila de `hechos` en su (Codigo, Fecha), 1 = mayor saldo (empates por orden de fila)
+    #   concentracion: Codigo -> Fecha, Bancos, HHI (0 a 10.000), CR3, CR5 (% del sistema en los 3 / 5 mayores)
+    if hechos.empty:
+        vacio = pd.DataFrame({"Fecha": pd.Series(dtype="int32"), "Bancos": pd.Series(dtype="int32"),
+                              "HHI": pd.Series(dtype="float64"), "CR3": pd.Series(dtype="float64"),
+                              "CR5": pd.Series(dtype="float64")}, index=pd.Index([], dtype="int32", name="Codigo"))
+        return np.empty(0, dtype="int32"), vacio
+    codigo, fecha = hechos["Codigo"].to_numpy(), hechos["Fecha"].to_numpy()
+    valor = np.abs(hechos["Saldo_Act"].to_numpy())
+    orden = np.lexsort((-valor, fecha, codigo))
+    codigo, fecha, valor = codigo[orden], fecha[orden], valor[orden]
+
+    inicio = np.flatnonzero(np.r_[True, (codigo[1:] != codigo[:-1]) | (fecha[1:] != fecha[:-1])])
+    largo = np.diff(np.append(inicio, len(orden)))
+    grupo = np.repeat(np.arange(len(inicio)), largo)
+    puesto = np.arange(len(orden)) - inicio[grupo] + 1
+    ranking = np.empty(len(orden), dtype="int32")
+    ranking[orden] = puesto
+
+    total = np.add.reduceat(valor, inicio)[grupo]
+    share = np.divide(valor, total, out=np.zeros_like(valor), where=total != 0) * 100
+    concentracion = pd.DataFrame({
+        "Fecha": fecha[inicio],
+        "Bancos": largo.astype("int32"),
+        "HHI": np.bincount(grupo, weights=share ** 2, minlength=len(inicio)),
+        "CR3": np.bincount(grupo, weights=np.where(puesto <= 3, share, 0), minlength=len(inicio)),
+        "CR5": np.bincount(grupo, weights=np.where(puesto <= 5, share, 0), minlength=len(inicio)),
+    }, index=pd.Index(codigo[inicio], name="Codigo"))
+    return ranking, concentracion
+
+
+# --- RATIOS (definiciones declarativas, calculadas para todos los bancos y periodos al cargar) ---
+# Cada término es un rubro (dos dígitos, p. ej. "13" = Préstamos: se toma su totalizador 130000), un grupo
+# (un dígito: los totalizadores de todos los rubros de MAPEO_N2 que empiezan así) o un código de 6 dígitos;
+# un "-" adelante lo resta. Como Saldo_Act = Debe + Haber, los saldos acreedores (pasivo, patrimonio,
+# ingresos) son negativos: las cuentas patrimoniales entran en valor absoluto y las de resultados (5 y 6)
+# con el signo cambiado, así una ganancia suma y un gasto o una pérdida resta.
+# Los ratios quedan en `datos`: al cambiar estas definiciones hay que subir FORMATO_DATOS.
+RATIOS = {
+    "Préstamos / Depósitos": {"numerador": ["13"], "denominador": ["31"],
+                              "descripcion": "Préstamos sobre depósitos (%)"},
+    "Patrimonio / Activo": {"numerador": ["4"], "denominador": ["1", "2"],
+                            "descripcion": "Patrimonio neto sobre activo total (%)"},
+    "ROA": {"numerador": ["5", "6"], "denominador": ["1", "2"],
+            "descripcion": "Resultado acumulado del ejercicio (rubros 5 y 6) sobre activo total (%)"},
+    "ROE": {"numerador": ["5", "6"], "denominador": ["4"],
+            "descripcion": "Resultado acumulado del ejercicio (rubros 5 y 6) sobre patrimonio neto (%)"},
+    "Eficiencia": {"numerador": ["-56"], "denominador": ["51", "52", "54", "55"],
+                   "descripcion": "Gastos de administración sobre ingresos netos financieros y por servicios (%)"},
+}
+RUBROS_RESULTADO = ("5", "6")
+
+def codigos_termino(termino):
+    # "13" -> [130000]; "1" -> totalizadores de los rubros 11..19; "511100" -> [511100]
+    if len(termino) == 6:
+        return [int(termino)]
+    return [int(rubro + "0000") for rubro in MAPEO_N2 if rubro.startswith(termino)]
+
+def pesos_ratios(ratios=RATIOS):
+    # Matriz de pesos Codigo x (numeradores | denominadores): parte[grupo] = valores[grupo, :] @ pesos.
+    # Devuelve (codigos ordenados, absoluto por código, pesos)
+    terminos = []  # (Codigo, columna, peso)
+    for j, definicion in enumerate(ratios.values()):
+        for columna, parte in ((j, "numerador"), (len(ratios) + j, "denominador")):
+            for termino in definicion[parte]:
+                signo = -1.0 if termino.startswith("-") else 1.0
+                termino = termino.lstrip("-")
+                if termino.startswith(RUBROS_RESULTADO):
+                    signo = -signo
+                terminos += [(codigo, columna, signo) for codigo in codigos_termino(termino)]
+    codigos = np.array(sorted({t[0] for t in terminos}), dtype="int32")
+    pesos = np.zeros((len(codigos), 2 * len(ratios)))
+    for codigo, columna, peso in terminos:
+        pesos[np.searchsorted(codigos, codigo), columna] += peso
+    absoluto = np.array([not str(c).startswith(RUBROS_RESULTADO) for c in codigos], dtype=bool)
+    return codigos, absoluto, pesos
+
+def calcular_ratios(hechos, ratios=RATIOS):
+    # Una pasada para todos los bancos y periodos: las filas de los códigos que usan los ratios se
+    # vuelcan a una matriz (Fecha, ID) x Codigo y numeradores y denominadores salen de un producto
+    # matricial con los pesos. Devuelve Fecha, ID, Ratio (categoría), Numerador, Denominador, Valor (%);
+    # una fila por (Fecha, ID, Ratio) si el banco informa alguno de los códigos de ese ratio.
+    codigos, absoluto, pesos = pesos_ratios(ratios)
+    filas = np.isin(hechos["Codigo"].to_numpy(), codigos)
+    fecha, banco = hechos["Fecha"].to_numpy()[filas], hechos["ID"].to_numpy()[filas]
+    columna = np.searchsorted(codigos, hechos["Codigo"].to_numpy()[filas])
+    saldo = hechos["Saldo_Act"].to_numpy()[filas]
+    valor = np.where(absoluto[columna], np.abs(saldo), saldo)
+
+    grupos, fila = np.unique(fecha.astype("int64") << 32 | banco.astype("int64"), return_inverse=True)
+    plano = fila * len(codigos) + columna
+    matriz = np.bincount(plano, weights=valor, minlength=len(grupos) * len(codigos)).reshape(len(grupos), len(codigos))
+    informa = np.bincount(plano, minlength=len(grupos) * len(codigos)).reshape(len(grupos), len(codigos)) > 0
+
+    n = len(ratios)
+    partes = matriz @ pesos
+    usa = (pesos[:, :n] != 0) | (pesos[:, n:] != 0)
+    presente = (informa.astype("int64") @ usa.astype("int64")).ravel() > 0
+    numerador, denominador = partes[:, :n].ravel(), partes[:, n:].ravel()
+    df = pd.DataFrame({
+        "Fecha": np.repeat((grupos >> 32).astype("int32"), n),
+        "ID": np.repeat((grupos & 0xFFFFFFFF).astype("int32"), n),
+        "Ratio": pd.Categorical.from_codes(np.tile(np.arange(n), len(grupos)), categories=list(ratios)),
+        "Numerador": numerador,
+        "Denominador": denominador,
+        "Valor": np.divide(numerador, denominador, out=np.full(len(numerador), np.nan), where=denominador != 0) * 100,
+    })
+    return df[presente].reset_index(drop=True)
+
+
+# --- JERARQUÍA DE CUENTAS (árbol por Codigo y roll-up de las hojas) ---
+# Las mismas reglas de sufijos que clasificar_nivel_1, como árbol explícito: el padre de un código es el
+# ancestro más cercano que existe entre los códigos conocidos (XYZW00 si está en TOTALIZADORES_4, XYZ000,
+# XY0000, X00000) y las hojas son los códigos sin hijos. El roll-up es una agregación dispersa: la lista
+# de aristas (hoja, destino, peso) reparte cada fila de hechos de una hoja a todos sus destinos (sus
+# ancestros, o las agrupaciones que la incluyen) y un solo bincount suma todos los bancos y periodos.
+TOLERANCIA_TOTALES = 1.0  # Diferencia (en pesos) que se acepta entre un totalizador informado y el calculado
+
+def ancestros_posibles(codigo):
+    # "131101" -> ["131000", "130000", "100000"], del más cercano al más lejano
+    if len(codigo) != 6:
+        return []
+    candidatos = [codigo[:4] + "00"] if codigo[:4] + "00" in TOTALIZADORES_4 else []
+    candidatos += [codigo[:3] + "000", codigo[:2] + "0000", codigo[:1] + "00000"]
+    return [c for c in dict.fromkeys(candidatos) if c != codigo]
+
+def armar_arbol(codigos):
+    # Codigo -> Padre (0 = raíz), Nivel (0 = raíz), Hoja
+    codigos = np.unique(np.asarray(codigos, dtype="int32"))
+    existentes = set(map(str, codigos))
+    padres = np.array([next((int(p) for p in ancestros_posibles(c) if p in existentes), 0)
+                       for c in map(str, codigos)], dtype="int32")
+    arbol = pd.DataFrame({"Padre": padres}, index=pd.Index(codigos, name="Codigo"))
+    arbol["Hoja"] = ~arbol.index.isin(padres)
+    # Profundidad: se sube un nivel por vez para todos los códigos a la vez (el árbol tiene pocos niveles)
+    nivel = np.zeros(len(codigos), dtype="int32")
+    actual = padres.copy()
+    while (actual != 0).any():
+        nivel += actual != 0
+        actual = np.where(actual != 0, arbol["Padre"].reindex(actual, fill_value=0).to_numpy(), 0)
+    arbol["Nivel"] = nivel
+    return arbol
+
+def aristas_rollup(arbol):
+    # (hoja, ancestro) para cada hoja y cada uno de sus ancestros: el totalizador calculado de un código
+    # es la suma de las hojas de su subárbol
+    hojas = arbol.index.to_numpy()[arbol["Hoja"].to_numpy()]
+    origen, destino = [], []
+    actual = arbol["Padre"].reindex(hojas).to_numpy()
+    while len(hojas):
+        sigue = actual != 0
+        hojas, actual = hojas[sigue], actual[sigue]
+        origen.append(hojas)
+        destino.append(actual)
+        actual = arbol["Padre"].reindex(actual).to_numpy()
+    origen = np.concatenate(origen + [np.empty(0, dtype="int32")])
+    destino = np.concatenate(destino + [np.empty(0, dtype="int32")])
+    return origen, destino, np.ones(len(origen))
+
+def aristas_agrupaciones(arbol, agrupaciones):
+    # Agrupaciones propias: nombre -> términos. Un código de 6 dígitos suma las hojas de su subárbol
+    # (o a sí mismo si es hoja); un prefijo más corto, todas las hojas que empiezan así; "-" resta.
+    # Devuelve (hoja, número de agrupación, peso), como aristas_rollup
+    hojas = arbol.index.to_numpy()[arbol["Hoja"].to_numpy()]
+    hojas_str = hojas.astype(str)
+    origen_r, destino_r, _ = aristas_rollup(arbol)
+    origen, destino, pesos = [], [], []
+    for k, terminos in enumerate(agrupaciones.values()):
+        for termino in terminos:
+            signo = -1.0 if termino.startswith("-") else 1.0
+            termino = termino.lstrip("-")
+            if len(termino) == 6:
+                incluidas = np.append(origen_r[destino_r == int(termino)], hojas[hojas == int(termino)])
+            else:
+                incluidas = hojas[np.char.startswith(hojas_str, termino)]
+            origen.append(incluidas)
+            destino.append(np.full(len(incluidas), k))
+            pesos.append(np.full(len(incluidas), signo))
+    vacio = [np.empty(0, dtype="int32")]
+    return (np.concatenate(origen + vacio), np.concatenate(destino + vacio).astype("int64"),
+            np.concatenate(pesos + [np.empty(0)]))
+
+def agregar_hojas(hechos, origen, destino, pesos):
+    # Suma Saldo_Act de las hojas en cada destino para cada (Fecha, ID), sin bucles por banco ni por cuenta.
+    # Devuelve Fecha, ID, Destino, Valor para los destinos con alguna hoja informada
+    orden = np.argsort(origen, kind="stable")
+    origen, destino, pesos = origen[orden], destino[orden], pesos[orden]
+    codigo = hechos["Codigo"].to_numpy()
+    lo = np.searchsorted(origen, codigo, side="left")
+    largos = np.searchsorted(origen, codigo, side="right") - lo
+    # Cada fila se repite una vez por arista de su código (las que no son hojas no tienen aristas)
+    fila = np.repeat(np.arange(len(codigo)), largos)
+    arista = np.repeat(lo - np.concatenate([[0], np.cumsum(largos)[:-1]]), largos) + np.arange(largos.sum())
+    fecha, banco = hechos["Fecha"].to_numpy()[fila], hechos["ID"].to_numpy()[fila]
+    grupos, grupo = np.unique(fecha.astype("int64") << 32 | banco.astype("int64"), return_inverse=True)
+    destinos, columna = np.unique(destino[arista], return_inverse=True)
+    plano = grupo * len(destinos) + columna
+    total = len(grupos) * len(destinos)
+    valor = np.bincount(plano, weights=hechos["Saldo_Act"].to_numpy()[fila] * pesos[arista], minlength=total)
+    presente = np.bincount(plano, minlength=total) > 0
+    return pd.DataFrame({
+        "Fecha": np.repeat((grupos >> 32).astype("int32"), len(destinos))[presente],
+        "ID": np.repeat((grupos & 0xFFFFFFFF).astype("int32"), len(destinos))[presente],
+        "Destino": np.tile(destinos, len(grupos))[presente],
+        "Valor": valor[presente],
+    })
+
+def verificar_totalizadores(hechos, arbol, tolerancia=TOLERANCIA_TOTALES):
+    # Cada totalizador (código con hijos) informado contra la suma de las hojas de su subárbol, para todas
+    # las filas de `hechos` (Fecha, ID, Codigo, Saldo_Act). Estado: "OK", "Diferencia", "Sin detalle"
+    # (se informa el total pero ninguna hoja) o "Sin informar" (hay hojas pero no el total)
+    calculado = agregar_hojas(hechos, *aristas_rollup(arbol)).rename(columns={"Destino": "Codigo", "Valor": "Calculado"})
+    totalizadores = arbol.index.to_numpy()[~arbol["Hoja"].to_numpy()]
+    informado = (hechos.loc[np.isin(hechos["Codigo"].to_numpy(), totalizadores), ["Fecha", "ID", "Codigo", "Saldo_Act"]]
+                 .groupby(["Fecha", "ID", "Codigo"], as_index=False)["Saldo_Act"].sum()
+                 .rename(columns={"Saldo_Act": "Informado"}))
+    df = informado.merge(calculado.astype({"Codigo": "int32"}), on=["Fecha", "ID", "Codigo"], how="outer")
+    df["Diferencia"] = df["Informado"] - df["Calculado"]
+    iguales = np.isclose(df["Informado"], df["Calculado"], rtol=1e-9, atol=tolerancia)
+    df["Estado"] = np.select([df["Informado"].isna(), df["Calculado"].isna(), iguales],
+                             ["Sin informar", "Sin detalle", "OK"], "Diferencia")
+    return df.sort_values(["Fecha", "ID", "Codigo"], ignore_index=True)
+
+
+# --- CARGA DE DATOS ---
+# El resultado es un esquema estrella:
+#   hechos:   ID, Codigo, Fecha (enteros) + Debe, Haber, Saldo_Act (float64), ordenado por Fecha, ID, Codigo,
+#             con las variaciones Var_Abs_/Var_Pct_ MoM (mes anterior) y YoY (mismo mes del año anterior)
+#             y el Ranking del banco en su (Codigo, Fecha)
+#   bancos:   ID -> Banco (último nombre conocido)
+#   cuentas:  Codigo -> Cuenta, Nivel_0, Nivel_1, Nivel_2, Vista (clasificado una vez por código)
+#   periodos: Fecha -> Año, Mes, Periodo (MM-AAAA), Periodo_DT
+#   clave, bordes: índice por (periodo, banco, código) que usa seleccionar()
+#   totales_sistema: Codigo -> Fecha, Total_Sistema (cubo para Market Share)
+#   concentracion: Codigo -> Fecha, Bancos, HHI, CR3, CR5 (ver calcular_concentracion)
+#   ratios:   Fecha, ID, Ratio, Numerador, Denominador, Valor de cada ratio de RATIOS (ver calcular_ratios)
+#   version: identifica el contenido cargado (cambia si cambia algún archivo); clave para caches de resultados
+#   historial_bancos / historial_cuentas: (Fecha, ID / Codigo, nombre) distintos; archivos: (Archivo, Fecha).
+#             Del tamaño de las dimensiones: permiten sumar un mes nuevo sin rearmar todo (ampliar_datos)
+# Con BCRA_MOTOR=duckdb la app usa motor_duckdb.cargar_datos: mismas dimensiones y version, pero en lugar de
+# hechos / clave / bordes / totales_sistema / concentracion / ratios trae "motor", que consulta los Parquet sin cargarlos (ver abajo)
+# La app lo cachea por conjunto de periodos (las URLs pedidas); cada mes queda además en su Parquet
+def cargar_datos(urls):
+    rutas, fallidos = leer_archivos(urls)
+
+    # Si otro proceso ya armó y publicó esta misma versión, solo se mapea
+    version = version_archivos(rutas)
+    if PUBLICAR and os.path.isdir(carpeta_publicada(version)):
+        try:
+            return mapear_datos(carpeta_publicada(version), version), fallidos
+        except (OSError, pa.ArrowInvalid):
+            pass  # Publicación dañada o ilegible: se arma de nuevo
+
+    # 1. TABLA DE HECHOS (ya ordenada por Fecha, ID, Codigo y sin duplicados)
+    # Con los nombres normalizados por ID/Codigo, las filas repetidas se detectan sin mirar los textos
+    hechos, nombres_bancos, nombres_cuentas, archivos = armar_hechos(rutas)
+    hechos['Saldo_Act'] = hechos['Debe'] + hechos['Haber']
+    clave = clave_hechos(hechos["ID"], hechos["Codigo"], hechos["Fecha"])
+
+    # 2. NORMALIZAR NOMBRES DE BANCOS Y CUENTAS (Tomar el último según la Fecha)
+    # Solo se ordenan los pares distintos (Fecha, ID, Nombre), no todo el dataset
+    bancos = (nombres_bancos.sort_values("Fecha", kind="stable")
+              .drop_duplicates("ID", keep="last").set_index("ID")[["Banco"]].sort_index())
+    cuentas = (nombres_cuentas.sort_values("Fecha", kind="stable")
+               .drop_duplicates("Codigo", keep="last").set_index("Codigo")[["Cuenta"]].sort_index())
+
+    # Variaciones contra el mes anterior y el mismo mes del año anterior, vectorizadas
+    # sobre todas las filas (ID, Codigo, Fecha) una sola vez por carga
+    for sufijo, fechas_ref in [("MoM", fecha_mes_anterior(hechos["Fecha"])), ("YoY", hechos["Fecha"] - 100)]:
+        var_abs, var_pct = calcular_variacion(hechos, fechas_ref, claves=clave)
+        hechos[f"Var_Abs_{sufijo}"] = var_abs
+        hechos[f"Var_Pct_{sufijo}"] = var_pct
+
+    # Ranking y concentración de todos los (Codigo, Fecha) en la misma carga
+    hechos["Ranking"], concentracion = calcular_concentracion(hechos)
+    ratios = calcular_ratios(hechos)
+
+    # 3. DIMENSIÓN PERIODOS
+    periodos = armar_periodos(hechos["Fecha"].unique())
+
+    # 4. DIMENSIÓN CUENTAS
+    cuentas = clasificar_cuentas(cuentas)
+
+    # Índice: clave ordenada por fila y bordes de cada partición de periodo
+    # (las filas del periodo periodos.index[k] van de bordes[k] a bordes[k + 1])
+    bordes = np.searchsorted(hechos["Fecha"].to_numpy(), np.append(periodos.index.to_numpy(), np.iinfo("int32").max))
+
+    # Cubo de totales del sistema: (Codigo, Fecha) -> suma de Saldo_Act de todos los bancos.
+    # Los totales por banco son la propia tabla de hechos, que se recorta con seleccionar().
+    totales_sistema = (hechos.groupby(["Codigo", "Fecha"])["Saldo_Act"].sum()
+                       .rename("Total_Sistema").reset_index("Fecha"))
+
+    datos = {"hechos": hechos, "bancos": bancos, "cuentas": cuentas, "periodos": periodos,
+             "clave": clave, "bordes": bordes, "totales_sistema": totales_sistema,
+             "concentracion": concentracion, "ratios": ratios, "version": version, "historial_bancos": nombres_bancos, "historial_cuentas": nombres_cuentas, "archivos": archivos}
+    return compartir_datos(datos), fallidos
+
+def compartir_datos(datos):
+    # Se publica para los demás procesos y este también pasa a usar la copia mapeada (compartida)
+    if PUBLICAR:
+        try:
+            return mapear_datos(publicar_datos(datos), datos["version"])
+        except OSError:
+            pass  # Sin lugar o sin permisos en el cache: se sigue con la copia propia
+    return datos
+
+def ampliar_datos(base, urls):
+    # Mismo resultado que cargar_datos(urls), reutilizando `base` (cargado antes con otras urls o con otra
+    # versión de los archivos) cuando lo único nuevo son periodos posteriores a todos los que se conservan:
+    # el caso típico es la publicación de un mes nuevo (o la republicación del último). Solo se leen y
+    # deduplican los archivos nuevos; los periodos que ya no se piden se descartan por bloque (bordes).
+    # Las variaciones se recalculan solo para las filas nuevas y las de los periodos cuyo mes / año de
+    # referencia se descartó. Los nombres vigentes salen del historial (del tamaño de las dimensiones) y
+    # las filas existentes no se tocan: se relabelan solas a través de bancos / cuentas.
+    # Si no se cumple (o `base` no tiene historial, p. ej. el motor DuckDB), se carga todo de nuevo.
+    rutas, fallidos = leer_archivos(urls)
+    version = version_archivos(rutas)
+    if version == base.get("version"):
+        return base, fallidos
+    if "archivos" not in base or PUBLICAR and os.path.isdir(carpeta_publicada(version)):
+        return cargar_datos(urls)
+
+    archivos = base["archivos"]
+    sigue = archivos["Archivo"].isin([os.path.basename(r) for r in rutas]).to_numpy()
+    fechas_sigue = np.unique(archivos["Fecha"].to_numpy()[sigue])
+    fechas_sale = np.setdiff1d(archivos["Fecha"].to_numpy()[~sigue], fechas_sigue)
+    conocidos = set(archivos["Archivo"])
+    nuevas = [r for r in rutas if os.path.basename(r) not in conocidos]
+    # Un periodo que trae un archivo que sale y otro que sigue no se puede separar por bloque
+    if not len(fechas_sigue) or np.isin(archivos["Fecha"].to_numpy()[~sigue], fechas_sigue).any():
+        return cargar_datos(urls)
+
+    hechos_nuevos, bancos_nuevos, cuentas_nuevas, archivos_nuevos = armar_hechos(nuevas)
+    if len(archivos_nuevos) and archivos_nuevos["Fecha"].min() <= fechas_sigue[-1]:
+        return cargar_datos(urls)  # Lo nuevo no es posterior a lo que ya estaba: se arma todo
+
+    # 1. HECHOS: bloques de los periodos que siguen + filas nuevas (ya ordenadas y sin duplicados)
+    fechas_base = base["periodos"].index.to_numpy()
+    if len(fechas_sigue) == len(fechas_base):
+        hechos_sigue, clave_sigue = base["hechos"], base["clave"]
+    else:
+        k = np.searchsorted(fechas_base, fechas_sigue)
+        filas = np.concatenate([np.arange(base["bordes"][i], base["bordes"][i + 1]) for i in k])
+        hechos_sigue, clave_sigue = base["hechos"].iloc[filas], base["clave"][filas]
+    hechos_nuevos["Saldo_Act"] = hechos_nuevos["Debe"] + hechos_nuevos["Haber"]
+    # El ranking, la concentración y los ratios de un periodo solo dependen de sus filas: se calculan para los nuevos
+    hechos_nuevos["Ranking"], concentracion_nueva = calcular_concentracion(hechos_nuevos)
+    ratios_nuevos = calcular_ratios(hechos_nuevos)
+    hechos = pd.concat([hechos_sigue, hechos_nuevos], ignore_index=True)
+    clave = np.concatenate([clave_sigue, clave_hechos(hechos_nuevos["ID"], hechos_nuevos["Codigo"], hechos_nuevos["Fecha"])])
+
+    periodos = armar_periodos(np.concatenate([fechas_sigue, np.unique(hechos_nuevos["Fecha"].to_numpy())]))
+    bordes = np.searchsorted(hechos["Fecha"].to_numpy(), np.append(periodos.index.to_numpy(), np.iinfo("int32").max))
+
+    # 2. VARIACIONES: filas nuevas y periodos que perdieron su mes / año de referencia
+    fechas = periodos.index.to_numpy()
+    recalcular = ((fechas > fechas_sigue[-1]) | np.isin(fecha_mes_anterior(fechas), fechas_sale)
+                  | np.isin(fechas - 100, fechas_sale))
+    pos = np.concatenate([np.arange(bordes[i], bordes[i + 1]) for i in np.flatnonzero(recalcular)] + [np.empty(0, dtype="int64")])
+    if len(pos):
+        filas_var = hechos.iloc[pos]
+        for sufijo, fechas_ref in [("MoM", fecha_mes_anterior(filas_var["Fecha"])), ("YoY", filas_var["Fecha"] - 100)]:
+            var_abs, var_pct = calcular_variacion(filas_var, fechas_ref, hechos, claves=clave)
+            hechos.iloc[pos, hechos.columns.get_loc(f"Var_Abs_{sufijo}")] = var_abs
+            hechos.iloc[pos, hechos.columns.get_loc(f"Var_Pct_{sufijo}")] = var_pct
+
+    # 3. NOMBRES VIGENTES: historial de los periodos que siguen + el de los archivos nuevos
+    historial_bancos = base["historial_bancos"]
+    historial_bancos = pd.concat([historial_bancos[historial_bancos["Fecha"].isin(fechas_sigue)], bancos_nuevos], ignore_index=True)
+    historial_cuentas = base["historial_cuentas"]
+    historial_cuentas = pd.concat([historial_cuentas[historial_cuentas["Fecha"].isin(fechas_sigue)], cuentas_nuevas], ignore_index=True)
+    bancos = (historial_bancos.sort_values("Fecha", kind="stable")
+              .drop_duplicates("ID", keep="last").set_index("ID")[["Banco"]].sort_index())
+    nombres = (historial_cuentas.sort_values("Fecha", kind="stable")
+               .drop_duplicates("Codigo", keep="last").set_index("Codigo")[["Cuenta"]].sort_index())
+    # La jerarquía de las cuentas ya conocidas se reutiliza; solo se clasifican los códigos nuevos
+    conocidas = nombres.index.isin(base["cuentas"].index)
+    cuentas = base["cuentas"].loc[nombres.index[conocidas]].assign(Cuenta=nombres.loc[conocidas, "Cuenta"])
+    if not conocidas.all():
+        cuentas = pd.concat([cuentas, clasificar_cuentas(nombres[~conocidas].copy())]).sort_index()
+
+    # 4. CUBOS DE TOTALES, CONCENTRACIÓN Y RATIOS: los de los periodos que siguen no cambian, se suman los de los nuevos
+    totales_base = base["totales_sistema"]
+    totales_sistema = pd.concat([totales_base[totales_base["Fecha"].isin(fechas_sigue)],
+                                 hechos_nuevos.groupby(["Codigo", "Fecha"])["Saldo_Act"].sum()
+                                 .rename("Total_Sistema").reset_index("Fecha")]).sort_index(kind="stable")
+    concentracion = base["concentracion"]
+    concentracion = pd.concat([concentracion[concentracion["Fecha"].isin(fechas_sigue)],
+                               concentracion_nueva]).sort_index(kind="stable")
+    ratios = base["ratios"]
+    ratios = pd.concat([ratios[ratios["Fecha"].isin(fechas_sigue)], ratios_nuevos], ignore_index=True)
+
+    datos = {"hechos": hechos, "bancos": bancos, "cuentas": cuentas, "periodos": periodos,
+             "clave": clave, "bordes": bordes, "totales_sistema": totales_sistema,
+             "concentracion": concentracion, "ratios": ratios, "version": version,
+             "historial_bancos": historial_bancos, "historial_cuentas": historial_cuentas,
+             "archivos": pd.concat([archivos[sigue], archivos_nuevos], ignore_index=True)}
+    return compartir_datos(datos), fallidos
+
+def armar_vista(hechos, datos):
+    # Agrega a un recorte de la tabla de hechos las columnas descriptivas de las dimensiones
+    # (mismas columnas que usaban las secciones antes del esquema estrella)
+    vista = hechos.copy()
+    vista["Banco"] = vista["ID"].map(datos["bancos"]["Banco"])
+    if "Codigo" not in vista:
+        # Saldos ya sumados por banco (motor DuckDB): no hay columnas de cuentas que agregar
+        periodos = datos["periodos"].reindex(vista["Fecha"].to_numpy())
+        for col in ["Año", "Mes", "Periodo", "Periodo_DT"]:
+            vista[col] = periodos[col].array
+        return vista
+    # .array (y no .to_numpy()) conserva el tipo de texto aun con el recorte vacío
+    cuentas = datos["cuentas"].reindex(vista["Codigo"].to_numpy())
+    for col in ["Cuenta", "Nivel_0", "Nivel_1", "Nivel_2", "Vista"]:
+        vista[col] = cuentas[col].array
+    periodos = datos["periodos"].reindex(vista["Fecha"].to_numpy())
+    for col in ["Año", "Mes", "Periodo", "Periodo_DT"]:
+        vista[col] = periodos[col].array
+    vista["Codigo"] = vista["Codigo"].astype(str)
+    return vista
+
+
+# --- CÁLCULOS DE LAS SECCIONES ---
+COMPARACIONES = ["Mes anterior", "Mismo mes del año anterior", "Periodo base"]
+VISTAS = ["Vista Macro", "Vista Subtotales", "Todo"]
+# Columnas del balance comparativo que se exportan (descargas de la app y reportes.py)
+COLUMNAS_BALANCE = ["Banco", "Codigo", "Cuenta", "Nivel_0", "Nivel_2", "Saldo_Act", "Var. Absoluta", "Var. %"]
+
+def fecha_referencia(fecha, comparar_contra, fecha_base=None):
+    # Periodo (AAAAMM) contra el que se calculan las variaciones de la tabla
+    if comparar_contra == "Mes anterior":
+        return int(fecha_mes_anterior(fecha))
+    elif comparar_contra == "Mismo mes del año anterior":
+        return fecha - 100
+    return fecha_base
+
+def periodos_necesarios(fechas_disponibles, fecha, comparar_contra, fecha_base, desde, hasta):
+    # Periodos que hay que cargar para mostrar `fecha` comparada y el rango desde/hasta.
+    # El último disponible va siempre: de ahí salen los nombres vigentes de bancos y cuentas.
+    necesarios = {max(fechas_disponibles), fecha, fecha_referencia(fecha, comparar_contra, fecha_base)}
+    necesarios.update(f for f in fechas_disponibles if desde <= f <= hasta)
+    return sorted(f for f in necesarios if f in fechas_disponibles)
+
+def periodos_iniciales(fechas_disponibles):
+    # Los que pide la app al entrar, con los filtros por defecto: el último periodo contra el mes anterior
+    # y el rango de análisis desde ese mes (si está). Son los que se precargan al arrancar el proceso.
+    if not fechas_disponibles:
+        return []
+    fechas = sorted(fechas_disponibles)
+    fecha_ultima = fechas[-1]
+    fecha_previa = int(fecha_mes_anterior(fecha_ultima))
+    desde = fecha_previa if fecha_previa in fechas else fecha_ultima
+    return periodos_necesarios(fechas, fecha_ultima, "Mes anterior", fechas[0], desde, fecha_ultima)
+
+def codigos_del_periodo(datos, fecha):
+    # Códigos informados por algún banco en `fecha`
+    if "motor" in datos:
+        return datos["motor"].codigos(fecha)
+    return seleccionar(datos, fecha, fecha)["Codigo"].unique()
+
+def armar_comparativo(datos, ids, fecha, comparar_contra="Mes anterior", fecha_base=None):
+    # Filas de los bancos `ids` en `fecha` con las columnas Var. Absoluta y Var. %.
+    # Devuelve (df_comp, fecha_ref).
+    fecha_ref = fecha_referencia(fecha, comparar_contra, fecha_base)
+    if "motor" in datos:
+        # El motor trae las filas con MoM / YoY y la variación contra fecha_ref ya calculadas
+        df_actual, var_ref = datos["motor"].comparativo(ids, fecha, fecha_ref)
+    else:
+        df_actual, var_ref = seleccionar(datos, fecha, fecha, ids=ids), None
+    df_comp = armar_vista(df_actual, datos).fillna(0)
+
+    # Las variaciones MoM / YoY ya vienen calculadas desde la carga; la del periodo base
+    # se calcula vectorizada solo para las filas de la tabla
+    if comparar_contra == "Mes anterior":
+        df_comp['Var. Absoluta'], df_comp['Var. %'] = df_comp['Var_Abs_MoM'], df_comp['Var_Pct_MoM']
+    elif comparar_contra == "Mismo mes del año anterior":
+        df_comp['Var. Absoluta'], df_comp['Var. %'] = df_comp['Var_Abs_YoY'], df_comp['Var_Pct_YoY']
+    elif var_ref is not None:
+        df_comp['Var. Absoluta'], df_comp['Var. %'] = var_ref
+    else:
+        df_comp['Var. Absoluta'], df_comp['Var. %'] = calcular_variacion(df_actual, fecha_ref, seleccionar(datos, fecha_ref, fecha_ref))
+    return df_comp, fecha_ref
+
+def filtrar_balance(df_comp, opcion_vista="Todo", nivel0_sel=None, nivel2_sel="Todos", nivel1_sel="Todos", codigos_sel=None):
+    # Filtros de la tabla de balance: vista, masa patrimonial, rubro, detalle y cuentas (códigos como texto)
+    df_res = df_comp.copy()
+
+    # Filtrado por Vista (Lógica corregida)
+    if opcion_vista == "Vista Macro":
+        df_res = df_res[df_res["Vista"] == "Vista Macro"]
+    elif opcion_vista == "Vista Subtotales":
+        df_res = df_res[(df_res["Vista"] == "Vista Subtotales") | (df_res["Codigo"] == "650000")]
+
+    # Filtros adicionales
+    if nivel0_sel: df_res = df_res[df_res["Nivel_0"].isin(nivel0_sel)]
+    if nivel2_sel != "Todos": df_res = df_res[df_res["Nivel_2"] == nivel2_sel]
+    if nivel1_sel != "Todos": df_res = df_res[df_res["Nivel_1"] == nivel1_sel]
+    if codigos_sel:
+        df_res = df_res[df_res["Codigo"].isin(codigos_sel)]
+    return df_res.sort_values("Codigo", ascending=True)
+
+def armar_evolucion(datos, ids, codigos, desde, hasta, consolidado=True):
+    # Saldo por periodo de los bancos `ids` y los `codigos` elegidos, sumando las cuentas
+    # (columna Banco) o detallado por banco y cuenta (columna Etiqueta). Orden cronológico.
+    if "motor" in datos:
+        # La suma por banco (o por banco y cuenta) la hace el motor: vuelven solo las filas del gráfico
+        df_ev_final = armar_vista(datos["motor"].saldos(ids, codigos, desde, hasta, por_cuenta=not consolidado), datos)
+    else:
+        df_ev_final = armar_vista(seleccionar(datos, desde, hasta, ids=ids, codigos=codigos), datos)
+    if consolidado:
+        # Agrupamos solo por Banco y Periodo (Suma cuentas)
+        df_plot_ev = df_ev_final.groupby(["Periodo", "Periodo_DT", "Banco"])["Saldo_Act"].sum().reset_index()
+    else:
+        # Agrupamos por Banco, Cuenta y Periodo (Detalle total)
+        df_ev_final["Etiqueta"] = df_ev_final["Banco"] + " - " + df_ev_final["Cuenta"]
+        df_plot_ev = df_ev_final.groupby(["Periodo", "Periodo_DT", "Etiqueta"])["Saldo_Act"].sum().reset_index()
+    return df_plot_ev.sort_values("Periodo_DT")
+
+def limitar_series(df, serie, valor, max_series):
+    # Para graficar: deja las `max_series` series (valores de la columna `serie`) de mayor |valor|
+    # acumulado y suma las demás en una serie "Resto" por periodo. Solo conserva las columnas
+    # del gráfico. Devuelve (df, cantidad de series agrupadas en "Resto").
+    columnas = ["Periodo", "Periodo_DT", serie, valor]
+    magnitud = df[valor].abs().groupby(df[serie]).sum()
+    if len(magnitud) <= max_series:
+        return df[columnas], 0
+    en_principales = df[serie].isin(magnitud.nlargest(max_series).index)
+    resto = df[~en_principales].groupby(["Periodo", "Periodo_DT"], as_index=False)[valor].sum()
+    resto[serie] = "Resto"
+    # Orden estable: dentro de cada periodo se respeta el orden original y "Resto" queda al final
+    df = pd.concat([df.loc[en_principales, columnas], resto[columnas]]).sort_values("Periodo_DT", kind="stable")
+    return df, len(magnitud) - max_series
+
+def armar_market_share(datos, ids, codigos, desde, hasta):
+    # Participación (%) de cada banco `ids` sobre el total del sistema en los `codigos`, por periodo.
+    # Devuelve None si el sistema no tiene datos para esas cuentas y periodos.
+    # Total del Sistema por Periodo: sale del cubo precalculado (Codigo, Fecha) -> total,
+    # sin recorrer las filas de todos los bancos
+    if "motor" in datos:
+        total_sistema = datos["motor"].totales(codigos, desde, hasta)
+    else:
+        cubo = datos["totales_sistema"]
+        total_sistema = cubo[cubo.index.isin(codigos)]
+        total_sistema = (total_sistema[total_sistema["Fecha"].between(desde, hasta)]
+                         .groupby("Fecha")["Total_Sistema"].sum().reset_index())
+    if total_sistema.empty:
+        return None
+
+    # Solo las filas de los bancos seleccionados (vía el índice, o ya sumadas por el motor), por Banco y Periodo
+    if "motor" in datos:
+        df_bancos_ms = armar_vista(datos["motor"].saldos(ids, codigos, desde, hasta), datos)
+    else:
+        df_bancos_ms = armar_vista(seleccionar(datos, desde, hasta, ids=ids, codigos=codigos), datos)
+    df_bancos_sum = df_bancos_ms.groupby(["Fecha", "Periodo", "Periodo_DT", "Banco"])["Saldo_Act"].sum().reset_index()
+
+    # Unimos los datos de los bancos con el total del sistema y calculamos el % de participación
+    df_ms_final = pd.merge(df_bancos_sum, total_sistema, on="Fecha").drop(columns="Fecha")
+    df_ms_final["Market_Share"] = (df_ms_final["Saldo_Act"] / df_ms_final["Total_Sistema"]) * 100
+    return df_ms_final.sort_values(["Periodo_DT", "Market_Share"], ascending=[True, False])
+
+def tabla_market_share(df_ms_final):
+    # Periodo x Banco con el share (%) y el volumen del sistema, en orden cronológico
+    df_ms_pivot = df_ms_final.pivot(index="Periodo", columns="Banco", values="Market_Share")
+    # Un valor por mes: Periodo -> Total_Sistema
+    df_totales = df_ms_final[["Periodo", "Total_Sistema", "Periodo_DT"]].drop_duplicates().set_index("Periodo")
+    df_ms_completa = df_ms_pivot.copy()
+    df_ms_completa["Total Sistema"] = df_totales["Total_Sistema"]
+    return df_ms_completa.reindex(df_totales.sort_values("Periodo_DT").index)
+
+def variacion_share(df_ms_final):
+    # Ganadores y perdedores: share del primer y último periodo del rango y su diferencia (p.p.).
+    # Devuelve (df_var, df_fin), con df_fin = share de cada banco en el último periodo.
+    p_min_dt = df_ms_final["Periodo_DT"].min()
+    p_max_dt = df_ms_final["Periodo_DT"].max()
+    df_inicio = df_ms_final[df_ms_final["Periodo_DT"] == p_min_dt][["Banco", "Market_Share"]]
+    df_fin = df_ms_final[df_ms_final["Periodo_DT"] == p_max_dt][["Banco", "Market_Share"]]
+
+    df_var = pd.merge(df_inicio, df_fin, on="Banco", suffixes=('_ini', '_fin'))
+    df_var["Dif_pp"] = df_var["Market_Share_fin"] - df_var["Market_Share_ini"]
+    # Ascendente para que el que más gana quede arriba en el chart horizontal
+    return df_var.sort_values("Dif_pp", ascending=True), df_fin
+
+def share_con_resto(df_fin):
+    # Concentración al cierre: bancos elegidos + "Otros Bancos" con lo que falta para el 100%
+    share_resto = 100 - df_fin["Market_Share"].sum()
+    return pd.concat([df_fin, pd.DataFrame([{"Banco": "Otros Bancos", "Market_Share": share_resto}])])
+
+def armar_concentracion(datos, codigos, desde, hasta):
+    # Bancos, HHI, CR3 y CR5 de cada cuenta de `codigos` y periodo entre desde / hasta, del cubo precalculado
+    if "motor" in datos:
+        df = datos["motor"].concentracion(codigos, desde, hasta)
+    else:
+        cubo = datos["concentracion"]
+        df = cubo[cubo.index.isin(codigos)]
+        df = df[df["Fecha"].between(desde, hasta)].reset_index()
+    df["Cuenta"] = datos["cuentas"]["Cuenta"].reindex(df["Codigo"].to_numpy()).array
+    periodos = datos["periodos"].reindex(df["Fecha"].to_numpy())
+    df["Periodo"], df["Periodo_DT"] = periodos["Periodo"].array, periodos["Periodo_DT"].array
+    return df
+
+def armar_ranking(datos, codigo, desde, hasta):
+    # Todos los bancos en la cuenta `codigo` entre desde / hasta, con su Ranking (precalculado) y Share (%)
+    if "motor" in datos:
+        df = datos["motor"].ranking(codigo, desde, hasta)
+    else:
+        df = seleccionar(datos, desde, hasta, codigos=[codigo])[["Fecha", "ID", "Saldo_Act", "Ranking"]]
+    df = armar_vista(df, datos)
+    valor = df["Saldo_Act"].abs()
+    total = valor.groupby(df["Fecha"]).transform("sum")
+    df["Share"] = np.divide(valor, total, out=np.zeros(len(df)), where=(total != 0).to_numpy()) * 100
+    return df.sort_values(["Fecha", "Ranking"])
+
+def tabla_ranking(df_rank):
+    # Posiciones en el último periodo del rango y el cambio contra el primero (positivo = subió puestos;
+    # vacío si el banco no estaba al inicio)
+    fin = df_rank[df_rank["Fecha"] == df_rank["Fecha"].max()]
+    inicio = (df_rank[df_rank["Fecha"] == df_rank["Fecha"].min()]
+              .drop_duplicates("ID").set_index("ID")["Ranking"])
+    tabla = fin[["Ranking", "Banco", "Share", "Saldo_Act"]].copy()
+    tabla["Ranking_Inicio"] = inicio.reindex(fin["ID"].to_numpy()).array
+    tabla["Cambio"] = tabla["Ranking_Inicio"] - tabla["Ranking"]
+    return tabla.set_index("Ranking")
+
+def mapa_ranking(df_rank, top):
+    # Banco x Periodo con el Ranking de los `top` primeros del último periodo (para el heatmap)
+    lideres = df_rank[df_rank["Fecha"] == df_rank["Fecha"].max()].nsmallest(top, "Ranking")
+    df = df_rank[df_rank["ID"].isin(lideres["ID"])]
+    mapa = df.pivot_table(index="ID", columns="Fecha", values="Ranking", aggfunc="min").reindex(lideres["ID"].unique())
+    mapa.index = mapa.index.map(df.drop_duplicates("ID").set_index("ID")["Banco"])
+    mapa.columns = mapa.columns.map(df.drop_duplicates("Fecha").set_index("Fecha")["Periodo"])
+    return mapa.rename_axis(index="Banco", columns="Periodo")
+
+def mapa_concentracion(df_conc, metrica="HHI"):
+    # Cuenta x Periodo con la `metrica` de concentración (para el heatmap), cuentas en orden de código
+    mapa = df_conc.pivot_table(index="Codigo", columns="Fecha", values=metrica, aggfunc="first")
+    mapa.index = mapa.index.map(df_conc.drop_duplicates("Codigo").set_index("Codigo")["Cuenta"])
+    mapa.columns = mapa.columns.map(df_conc.drop_duplicates("Fecha").set_index("Fecha")["Periodo"])
+    return mapa.rename_axis(index="Cuenta", columns="Periodo")
+
+def armar_ratios(datos, desde, hasta):
+    # Todos los ratios de RATIOS para todos los bancos entre desde / hasta (precalculados), con Banco y Periodo
+    if "motor" in datos:
+        df = datos["motor"].ratios(desde, hasta)
+    else:
+        df = datos["ratios"]
+        df = df[df["Fecha"].between(desde, hasta)]
+    return armar_vista(df, datos).sort_values(["Ratio", "Fecha", "ID"])
+
+def ratio_sistema(df_ratios):
+    # Ratio del sistema por periodo: suma de numeradores sobre suma de denominadores de todos los
+    # bancos (ponderado por tamaño, no el promedio de los ratios de cada banco)
+    df = (df_ratios.groupby(["Ratio", "Fecha", "Periodo", "Periodo_DT"], observed=True)[["Numerador", "Denominador"]]
+          .sum().reset_index())
+    df["Valor"] = np.divide(df["Numerador"], df["Denominador"], out=np.full(len(df), np.nan),
+                            where=(df["Denominador"] != 0).to_numpy()) * 100
+    return df
+
+def tabla_ratio(df_ratio):
+    # Bancos en el último periodo del rango ordenados por un ratio (mayor valor primero; sin denominador
+    # quedan fuera), con el valor al inicio del rango y el cambio en puntos porcentuales
+    fin = df_ratio[df_ratio["Fecha"] == df_ratio["Fecha"].max()].dropna(subset=["Valor"])
+    inicio = (df_ratio[df_ratio["Fecha"] == df_ratio["Fecha"].min()]
+              .drop_duplicates("ID").set_index("ID")["Valor"])
+    tabla = fin[["ID", "Banco", "Valor", "Numerador", "Denominador"]].sort_values(["Valor", "ID"], ascending=[False, True])
+    tabla["Valor_Inicio"] = inicio.reindex(tabla["ID"].to_numpy()).array
+    tabla["Cambio_pp"] = tabla["Valor"] - tabla["Valor_Inicio"]
+    tabla.insert(0, "Puesto", np.arange(1, len(tabla) + 1))
+    return tabla.drop(columns="ID").set_index("Puesto")
+
+# Agrupaciones propias de ejemplo (se editan en la app): mismos términos que aristas_agrupaciones
+AGRUPACIONES = {
+    "Activos líquidos": ["11", "12"],
+    "Fondeo": ["31", "32", "36"],
+    "Margen financiero": ["51", "52"],
+    "Margen por servicios": ["54", "55"],
+}
+
+def leer_agrupaciones(texto):
+    # "Nombre: 11, 12, -1211" por línea (las vacías y las que empiezan con # se ignoran) -> dict
+    agrupaciones = {}
+    for n, linea in enumerate(texto.splitlines(), start=1):
+        linea = linea.strip()
+        if not linea or linea.startswith("#"):
+            continue
+        nombre, separador, terminos = linea.partition(":")
+        terminos = [t.strip() for t in terminos.split(",") if t.strip()]
+        if not separador or not nombre.strip() or not terminos:
+            raise ValueError(f"Línea {n}: se espera «Nombre: códigos separados por coma».")
+        invalidos = [t for t in terminos if not (t.lstrip("-").isdigit() and 1 <= len(t.lstrip("-")) <= 6)]
+        if invalidos:
+            raise ValueError(f"Línea {n}: {', '.join(invalidos)} no es un código ni un prefijo de código.")
+        agrupaciones[nombre.strip()] = terminos
+    return agrupaciones
+
+def texto_agrupaciones(agrupaciones):
+    return "\n".join(f"{nombre}: {', '.join(terminos)}" for nombre, terminos in agrupaciones.items())
+
+def hechos_periodo(datos, fecha):
+    # Fecha, ID, Codigo, Saldo_Act de todos los bancos y códigos de un periodo
+    if "motor" in datos:
+        return datos["motor"].saldos(None, None, fecha, fecha, por_cuenta=True)
+    return seleccionar(datos, fecha, fecha)[["Fecha", "ID", "Codigo", "Saldo_Act"]]
+
+def armar_consistencia(datos, fecha):
+    # Totalizadores informados contra los calculados con el roll-up de las hojas, todos los bancos de un periodo
+    hechos = hechos_periodo(datos, fecha)
+    df = verificar_totalizadores(hechos, armar_arbol(hechos["Codigo"].unique()))
+    df = armar_vista(df, datos)
+    return df[["Fecha", "ID", "Banco", "Codigo", "Cuenta", "Nivel_1", "Informado", "Calculado", "Diferencia", "Estado"]]
+
+def armar_agrupaciones(datos, fecha, agrupaciones):
+    # Banco x Agrupación con el saldo de cada agrupación propia en un periodo, más la fila del sistema
+    hechos = hechos_periodo(datos, fecha)
+    df = agregar_hojas(hechos, *aristas_agrupaciones(armar_arbol(hechos["Codigo"].unique()), agrupaciones))
+    nombres = list(agrupaciones)
+    tabla = df.pivot_table(index="ID", columns="Destino", values="Valor", aggfunc="sum")
+    tabla = tabla.reindex(columns=range(len(nombres))).set_axis(nombres, axis=1)
+    tabla.index = tabla.index.map(datos["bancos"]["Banco"])
+    tabla.loc["Total Sistema"] = tabla.sum()
+    return tabla.rename_axis(index="Banco", columns="Agrupación")
@@ -1,34 +1,120 @@
 import streamlit as st
-import pandas as pd
 import io
 import os
-import plotly.express as px
+import copy
+import time
+import functools
+import uuid
+import logging
+import threading
 import streamlit_authenticator as stauth
 import yaml
 from yaml.loader import SafeLoader
+import telemetria as tel
+# pandas, plotly y los módulos de la app (que traen pandas / pyarrow) se importan recién después del
+# login: la pantalla de login sale sin esperarlos y, mientras tanto, los importa el precalentamiento
 
+logger = logging.getLogger("bcra.app")
 
 
 # Configuración de página: Mantenemos wide pero los elementos internos se adaptarán
 st.set_page_config(page_title="BCRA Entidades Financieras", layout="wide", page_icon="📊")
 
+# Telemetría de esta recarga: tiempo por sección, caches y memoria (se emite como log JSON).
+# Arranca antes del login para medir también cuánto tarda en aparecer el formulario
+id_sesion = st.session_state.setdefault("id_sesion", uuid.uuid4().hex[:8])
+tel.iniciar(sesion=id_sesion)
+
+
+# --- DATOS (núcleo sin interfaz en analitica.py, compartido por todas las sesiones del proceso) ---
+# Motor de consulta: "pandas" (tabla de hechos en memoria) o "duckdb" (consulta los Parquet del cache
+# sin cargarlos, para historias largas; requiere `pip install duckdb`)
+@st.cache_resource(show_spinner=False)
+def funcion_de_carga():
+    import analitica as an
+    if os.environ.get("BCRA_MOTOR", "pandas") == "duckdb":
+        try:
+            import motor_duckdb
+        except ImportError:
+            logger.warning("BCRA_MOTOR=duckdb pero duckdb no está instalado: se usa el motor en memoria")
+        else:
+            memoria = os.environ.get("BCRA_DUCKDB_MEMORIA")  # Tope de memoria de DuckDB, p. ej. "2GB"
+            return lambda urls: motor_duckdb.cargar_datos(urls, memoria)
+    return an.cargar_datos
+
+# Datos por conjunto de periodos, compartidos entre sesiones y refrescados en segundo plano
+# cada BCRA_REFRESCO_SEG segundos (5 min por defecto): mientras se recargan se sirve la versión anterior
+@st.cache_resource(show_spinner=False)
+def almacen_datos():
+    import analitica as an
+    from refresco import AlmacenDatos
+    # Con el motor en memoria, un mes nuevo se suma a los datos ya cargados (an.ampliar_datos)
+    cargar = funcion_de_carga()
+    return AlmacenDatos(cargar, intervalo=float(os.environ.get("BCRA_REFRESCO_SEG", 300)), max_entradas=16,
+                        version_de=lambda urls: an.version_archivos(an.leer_archivos(urls)[0]),
+                        ampliar=an.ampliar_datos if cargar is an.cargar_datos else None)
+
+# Precalentamiento: una vez por proceso, con la primera página que se pide (el login), un hilo de fondo
+# importa los módulos pesados y carga los periodos de la vista inicial. Cuando el usuario termina de
+# autenticarse los datos ya están en el almacén (si todavía se están cargando, la sesión espera esa
+# misma carga: AlmacenDatos no carga dos veces lo mismo). BCRA_PRECALENTAR=0 lo desactiva.
+@st.cache_resource(show_spinner=False)
+def precalentar():
+    estado = {"inicio": time.perf_counter(), "fin": None, "error": None}
+
+    def trabajar():
+        try:
+            import plotly.express  # noqa: F401 (solo para dejarlo importado)
+            import exportar  # noqa: F401
+            import analitica as an
+            manifiesto = an.cargar_manifiesto()
+            almacen_datos().obtener(tuple(manifiesto[f] for f in an.periodos_iniciales(list(manifiesto))))
+        except Exception as e:
+            logger.exception("Falló el precalentamiento; los datos se cargan con la primera sesión")
+            estado["error"] = str(e)
+        estado["fin"] = time.perf_counter()
+
+    if os.environ.get("BCRA_PRECALENTAR", "1") != "0":
+        threading.Thread(target=trabajar, daemon=True, name="bcra-precalentar").start()
+    return estado
 
-#autenticadorrrrrr-----------------------##################
-with open('config.yaml') as file:
-    config = yaml.load(file, Loader=SafeLoader)
 
+#autenticadorrrrrr-----------------------##################
+# config.yaml se lee una vez por proceso; las contraseñas ya están hasheadas (bcrypt), así que el
+# autenticador no las vuelve a hashear en cada recarga (auto_hash=False). El objeto Authenticate sí
+# se arma en cada recarga: su manejador de cookies es un componente del navegador de cada sesión
+@st.cache_resource(show_spinner=False)
+def leer_config():
+    with open('config.yaml') as file:
+        return yaml.load(file, Loader=SafeLoader)
+
+config = leer_config()
 authenticator = stauth.Authenticate(
-    config['credentials'],
+    copy.deepcopy(config['credentials']),  # El autenticador anota intentos fallidos en las credenciales
     config['cookie']['name'],
     config['cookie']['key'],
-    config['cookie']['expiry_days']
+    config['cookie']['expiry_days'],
+    auto_hash=False
 )
 
 authentication_status = authenticator.login(location='main')
+tel.marca("login")
+arranque = precalentar()
 if st.session_state["authentication_status"]:
+    import pandas as pd
+    import numpy as np
+    import plotly.express as px
+    import analitica as an
+    import exportar
+    from cache_resultados import CacheLRU
+
     authenticator.logout('Cerrar Sesión', 'sidebar')
     st.write(f'# Bienvenido, {st.session_state["name"]}')
 
+    # Primera recarga ya autenticada de la sesión: se mide cuánto tarda en aparecer la primera tabla
+    primera_recarga = "primera_tabla_ms" not in st.session_state
+    tel.contexto(usuario=st.session_state["username"], primera_recarga=primera_recarga)
+
 
 
 
@@ -68,178 +154,108 @@ if st.session_state["authentication_status"]:
     def formato_ar(valor):
         return "{:,.2f}".format(valor).replace(",", "X").replace(".", ",").replace("X", ".")
 
-
-    # --- CARGA DE DATOS CORREGIDA ---
-    @st.cache_data(ttl=300) # Se actualiza cada 5 min
-    def cargar_datos():
-        col_names = ["ID", "Banco", "Fecha", "Codigo", "Cuenta", "Debe", "Haber"]
-        
-        # LINKS ACTUALIZADOS (Asegúrate de que terminen en dl=1)
-        urls_dropbox = [
-            "https://www.dropbox.com/scl/fi/2thtj89g9cjmad8uscgc0/COMPLETO_012024.TXT?rlkey=dtw65whie2ziy8x53sqfei092&st=33i8rpi8&dl=1",
-            "https://www.dropbox.com/scl/fi/oejvpyqqnqkm0fe03xo2u/COMPLETO_012025.TXT?rlkey=r9jr18xgglsghdtvo6hzuyncw&st=204zs88q&dl=1",
-            "https://www.dropbox.com/scl/fi/jwu9e9o03azraun5btjr3/COMPLETO_022024.TXT?rlkey=rse0pblnigca10yrzx9fubt2b&st=xgw0ydvz&dl=1",
-            "https://www.dropbox.com/scl/fi/phaay4tqo6k9cl7tmmv7w/COMPLETO_022025.TXT?rlkey=guf8wvclj2dfi11rg38ngs3jy&st=mt7t0twd&dl=1",
-            "https://www.dropbox.com/scl/fi/aqmv3summh1qvu5eui630/COMPLETO_032024.TXT?rlkey=yly86q1ggh6ls6g5lttcqild9&st=r9qmx42i&dl=1",
-            "https://www.dropbox.com/scl/fi/2yxg3e88ldidszijj6h14/COMPLETO_032025.TXT?rlkey=qxkdybcetym19wy98t1kfwm0e&st=sgdp8ql5&dl=1",
-            "https://www.dropbox.com/scl/fi/xh626k6froeqt5nf2bmdm/COMPLETO_042024.TXT?rlkey=vq4pk6l7r1yltz81vrs86rdyg&st=e30dg962&dl=1",
-            "https://www.dropbox.com/scl/fi/rktfcui7v763abd0uklqj/COMPLETO_042025.TXT?rlkey=lc1bsy5iu3lazqozegvs0jht5&st=6v0a0ndk&dl=1",
-            "https://www.dropbox.com/scl/fi/jb6t1kf34ds2o7r37s5nt/COMPLETO_052024.TXT?rlkey=v521r07u5zo2xm51baki541s5&st=t4qzlv95&dl=1",
-            "https://www.dropbox.com/scl/fi/dml1so4mlihqyemltrurw/COMPLETO_052025.TXT?rlkey=ut4kzind6ehq1kciaebish2bc&st=k6qgw4u0&dl=1",
-            "https://www.dropbox.com/scl/fi/9assg4wabgga0pp1w7ev1/COMPLETO_062024.TXT?rlkey=dylywpzow96cjhfiseabhq6dl&st=09tdxg6y&dl=1",
-            "https://www.dropbox.com/scl/fi/36af4oulc0u17ir0ff5bq/COMPLETO_062025.TXT?rlkey=8w5o6ccpasdyd1ei0e3wf5ivk&st=08i7mf4a&dl=1",
-            "https://www.dropbox.com/scl/fi/untycpf8v73rdwjpuhmuc/COMPLETO_072024.TXT?rlkey=yfdtqhawmgfb3lreh7eyozn8v&st=wvzzqwty&dl=1",
-            "https://www.dropbox.com/scl/fi/10o1tzwkw10g74ij3aj9k/COMPLETO_072025.TXT?rlkey=jjwxxzd7etj05hfafltsqdto4&st=5feidyil&dl=1",
-            "https://www.dropbox.com/scl/fi/mrefw1v12sse84ubgrs4g/COMPLETO_082024.TXT?rlkey=gvkqqfjlgkszbuhfgj2doru8t&st=4sx2gcg8&dl=1",
-            "https://www.dropbox.com/scl/fi/im8wu9yogq1k8do4uqnki/COMPLETO_082025.TXT?rlkey=063f4008n9zr9iw662zymbz51&st=bnupulsy&dl=1",
-            "https://www.dropbox.com/scl/fi/ahdi9acnjazu6vc1lwq8s/COMPLETO_092024.TXT?rlkey=txzt1vf8tciwfjq8zh6opwl8c&st=7ug09y6m&dl=1",
-            "https://www.dropbox.com/scl/fi/z9ekxx4aj9lnavfcs6x30/COMPLETO_092025.TXT?rlkey=3w2ouxmvpb2rzmkq3whq4j4yr&st=fbvgc228&dl=1",
-            "https://www.dropbox.com/scl/fi/9s8m2jfkeisvdat98r69h/COMPLETO_102024.TXT?rlkey=n9tuh48jg7kjcyj6fy5ad0tpt&st=xl9049aw&dl=1",
-            "https://www.dropbox.com/scl/fi/v6zuzso37koc1cjevjkyi/COMPLETO_102025.TXT?rlkey=9a565f1ichtuih2b35ysdekbo&st=ybzb24eb&dl=1",
-            "https://www.dropbox.com/scl/fi/40jvychhch3j5twcjs6gt/COMPLETO_112024.TXT?rlkey=bu2yrb6m73a7lisj7jj5q2bw8&st=01wt51nr&dl=1",
-            "https://www.dropbox.com/scl/fi/oahhtuelswvw502m7vwcx/COMPLETO_122024.TXT?rlkey=bafcwn7agyrrzva7wdu062ziz&st=de1nxxc2&dl=1"
-
-
-        ]
-        
-        lista_df = []
-        for url in urls_dropbox:
-            try:
-                temp_df = pd.read_csv(url, sep='\t', names=col_names, encoding='latin-1', on_bad_lines='skip')
-                lista_df.append(temp_df)
-            except Exception as e:
-                st.error(f"Error al descargar desde Dropbox: {e}")
-        
-        if not lista_df: 
-            return pd.DataFrame(columns=col_names + ["Año", "Mes", "Nivel_0", "Nivel_1", "Saldo_Act"])
-            
-        df = pd.concat(lista_df, ignore_index=True)
-
-
-        
-        # 1. NORMALIZAR NOMBRES DE BANCOS (Tomar el último según la Fecha)
-        # Ordenamos por fecha para que el más reciente quede al final
-        df = df.sort_values("Fecha")
-        
-        # Creamos un mapeo: ID -> Último Nombre conocido
-        mapeo_bancos = df.drop_duplicates('ID', keep='last').set_index('ID')['Banco'].to_dict()
-        # Aplicamos el nombre más nuevo a todos los registros con ese ID
-        df['Banco'] = df['ID'].map(mapeo_bancos)
-
-        # 2. NORMALIZAR NOMBRES DE CUENTAS (Tomar el último según la Fecha)
-        # Hacemos lo mismo para el Codigo de cuenta
-        mapeo_cuentas = df.drop_duplicates('Codigo', keep='last').set_index('Codigo')['Cuenta'].to_dict()
-        df['Cuenta'] = df['Codigo'].map(mapeo_cuentas)
-        
-        for col in ['Banco', 'Cuenta', 'Fecha', 'ID', 'Codigo']:
-            df[col] = df[col].astype(str).str.replace('"', '').str.strip()
-
-        df = df[df['Fecha'].str.len() == 6]
-        df = df.drop_duplicates()
-        
-        df['Año'] = df['Fecha'].str[:4]
-        df['Mes'] = df['Fecha'].str[4:]
-        df['Debe'] = pd.to_numeric(df['Debe'], errors='coerce').fillna(0)
-        df['Haber'] = pd.to_numeric(df['Haber'], errors='coerce').fillna(0)
-        df['Saldo_Act'] = df['Debe'] + df['Haber']  
-        df["Periodo_DT"] = pd.to_datetime(df["Fecha"], format='%Y%m', errors='coerce')
-        # Periodo para mostrar (MM-AAAA)
-        df["Periodo"] = df["Fecha"].str[4:] + "-" + df["Fecha"].str[:4]
-        #df["Periodo"] = df["Mes"] + "-" + df["Año"]
-        
-        def clasificar_nivel_0(codigo):
-            if not codigo: return "Otros"
-            p = codigo[0]
-            if p in ['1', '2']: return "Activo"
-            elif p == '3': return "Pasivo"
-            elif p in ['4', '5', '6']: return "Patrimonio Neto"
-            elif p == '7': return "Partidas fuera del balance"
-            else: return "Otros"
-
-        def clasificar_nivel_1(codigo):
-            if not codigo: return "Otro"
-            # 1. Casos específicos para Totalizador_1
-            if codigo.endswith("00000") or codigo == "650000": return "Totalizador_1"
-            # 2. Casos para Totalizador_2 (terminan en 0000 pero no son el 650000)
-            elif codigo.endswith("0000"):return "Totalizador_2"
-            # 3. Casos para Totalizador_3
-            elif codigo.endswith("000"): return "Totalizador_3"
-            # 4. Casos específicos para Totalizador_4 (Agrupados en una lista)
-            elif codigo in ["511100", "511500", "515500", "521100", "521900", 
-                            "525100", "525900", "515100", "521500"]:return "Totalizador_4"
-            # 5. Todo lo demás
-            else: return "Otro"
-
-        def clasificar_vista(codigo):
-            if not codigo: return "Otro"
-            # El 650000 y los terminados en 00000 son MACRO
-            if codigo == "650000" or codigo.endswith("00000"):
-                return "Vista Macro"
-            # Los terminados en 0000 (que no sean el anterior) son SUBTOTALES
-            elif codigo.endswith("0000"):
-                return "Vista Subtotales"
-            else:
-                return "Otro"  
-
-        mapeo_n2 = {
-            "11": "Efectivo y depósitos en bancos",
-            "12": "Títulos públicos y privados",
-            "13": "Préstamos",
-            "14": "Otros créditos por intermediación financiera",
-            "15": "Créditos por arrendamientos financieros",
-            "16": "Participaciones en otras sociedades",
-            "17": "Créditos diversos",
-            "18": "Propiedad, planta y equipo",
-            "19": "Bienes diversos",
-            "21": "Activos intangibles",
-            "22": "Filiales en el exterior",
-            "23": "Partidas pendientes de imputación (deudores)",
-            "31": "Depósitos",
-            "32": "Otras obligaciones por intermediación financiera",
-            "33": "Obligaciones diversas",
-            "34": "Provisiones",
-            "35": "Partidas pendientes de imputación (acreedores)",
-            "36": "Obligaciones subordinadas",
-            "41": "Capital social",
-            "42": "Aportes no capitalizado",
-            "43": "Ajustes al patrimonio",
-            "44": "Reserva de utilidades",
-            "45": "Resultados no asignados",
-            "46": "Otros resultados integrales acumulados",
-            "51": "Ingresos financieros",
-            "52": "Egresos financieros",
-            "53": "Cargos por incobrabilidad",
-            "54": "Ingresos por servicios",
-            "55": "Egresos por servicios",
-            "56": "Gastos de administración",
-            "57": "Utilidades diversas",
-            "58": "Perdidas diversas",
-            "59": "Resultado de filiales en el exterior",
-            "61": "Impuesto a las ganancias",
-            "62": "Resultado monetario",
-            "65": "Otros resultados integrales (ORI)",
-            "71": "PFB - Deudoras",
-            "72": "PFB - Acreedoras"
-        }
-
-
-        
-        
-        
-        df['Nivel_0'] = df['Codigo'].apply(clasificar_nivel_0)
-        df['Nivel_1'] = df['Codigo'].apply(clasificar_nivel_1)
-        df['Nivel_2'] = df['Codigo'].str[:2].map(mapeo_n2)
-        df['Vista'] = df['Codigo'].apply(clasificar_vista)
-        
-
-        return df
-
-    # --- CARGA DE DATOS ---
-    df = cargar_datos()
-
-    if df.empty:
+    def botones_descarga(df, nombre, index=False):
+        # CSV y Excel de la tabla completa (no solo la página visible). El archivo se arma recién al
+        # hacer clic, en otro hilo y por bloques de filas (ver exportar.py): no frena la recarga de la página
+        c_csv, c_xlsx, _ = st.columns([1, 1, 6])
+        with c_csv:
+            st.download_button("⬇️ CSV", data=lambda: exportar.tabla_a_csv(df, index), file_name=f"{nombre}.csv",
+                               mime=exportar.FORMATOS["csv"], key=f"csv_{nombre}", on_click="ignore")
+        with c_xlsx:
+            st.download_button("⬇️ Excel", data=lambda: exportar.tabla_a_excel(df, nombre, index), file_name=f"{nombre}.xlsx",
+                               mime=exportar.FORMATOS["xlsx"], key=f"xlsx_{nombre}", on_click="ignore")
+
+
+    # --- FRAGMENTOS ---
+    # Las secciones con widgets propios son st.fragment: al tocar uno de esos widgets se vuelve a ejecutar
+    # solo esa sección, con los argumentos que recibió en la última recarga completa (sus dependencias de
+    # datos van explícitas como argumentos). Los filtros del sidebar afectan a todo y recargan la página.
+    def fragmento(nombre):
+        def decorador(funcion):
+            @st.fragment
+            @functools.wraps(funcion)
+            def ejecutar(*args, **kwargs):
+                # Recarga solo del fragmento: se registra aparte en la telemetría
+                propia = not tel.en_curso()
+                if propia:
+                    tel.iniciar(usuario=st.session_state["username"], sesion=id_sesion, fragmento=nombre)
+                funcion(*args, **kwargs)
+                if propia:
+                    tel.cerrar()
+            return ejecutar
+        return decorador
+
+
+    # --- DATOS (funciones de carga y almacén definidos arriba, antes del login) ---
+    cargar_manifiesto = tel.cacheada("cargar_manifiesto", st.cache_data(ttl=300))(an.cargar_manifiesto)
+    if os.environ.get("BCRA_MOTOR", "pandas") == "duckdb" and funcion_de_carga() is an.cargar_datos:
+        st.warning("BCRA_MOTOR=duckdb pero duckdb no está instalado: se usa el motor en memoria.")
+
+    def cargar_datos(urls):
+        entrada, acierto = almacen_datos().obtener(urls)
+        tel.contar_cache("cargar_datos", acierto)
+        return entrada
+
+    # --- CACHE DE RESULTADOS (tablas y figuras), compartido entre sesiones y acotado en memoria ---
+    @st.cache_resource
+    def exportaciones():
+        return exportar.ExportacionesEnFondo()
+
+    @st.cache_resource
+    def cache_resultados():
+        return CacheLRU(max_mb=float(os.environ.get("BCRA_CACHE_RESULTADOS_MB", 256)))
+
+    def resultado_cacheado(seccion, clave, calcular, datos_seccion=None):
+        # `clave` es la selección de filtros normalizada; con la versión de los datos, un refresco
+        # no reutiliza lo calculado con datos viejos (esas entradas salen por LRU).
+        # datos_seccion: los datos con que calcula la sección, si no son los de la página (ver seccion_rango)
+        version = (datos if datos_seccion is None else datos_seccion)["version"]
+        valor, acierto = cache_resultados().obtener((seccion, version) + clave, calcular)
+        tel.contar_cache(seccion, acierto)
+        return valor
+
+    # --- CARGA DE DATOS (solo los periodos que se están mirando) ---
+    manifiesto = cargar_manifiesto()
+    fechas_manifiesto = sorted(manifiesto)
+    # Periodo (MM-AAAA) <-> Fecha (AAAAMM entero), sin necesidad de cargar datos
+    periodo_de_fecha = {f: f"{f % 100:02d}-{f // 100}" for f in fechas_manifiesto}
+    fecha_de_periodo = {p: f for f, p in periodo_de_fecha.items()}
+    lista_periodos = [periodo_de_fecha[f] for f in reversed(fechas_manifiesto)]
+    lista_periodos_slicer = lista_periodos[::-1]
+
+    # Por defecto: el último periodo y su mes anterior (para la tabla y el rango de análisis)
+    fecha_ultima = fechas_manifiesto[-1]
+    fecha_previa = int(an.fecha_mes_anterior(fecha_ultima))
+    rango_default = (periodo_de_fecha.get(fecha_previa, periodo_de_fecha[fecha_ultima]), periodo_de_fecha[fecha_ultima])
+
+    def urls_pedidas():
+        # Los widgets que definen qué periodos hacen falta se leen de session_state antes de dibujarlos.
+        # También la usa el fragmento del rango de análisis: al mover el slider pide los mismos periodos
+        # que pediría la página completa
+        periodo_pedido = st.session_state.get("periodo_sel", lista_periodos[0])
+        comparar_pedido = st.session_state.get("comparar_contra", "Mes anterior")
+        rango_pedido = st.session_state.get("rango_analisis", rango_default)
+
+        necesarios = an.periodos_necesarios(
+            fechas_manifiesto, fecha_de_periodo[periodo_pedido], comparar_pedido,
+            fecha_de_periodo[st.session_state.get("periodo_base", lista_periodos[-1])],
+            fecha_de_periodo[rango_pedido[0]], fecha_de_periodo[rango_pedido[1]])
+        return tuple(manifiesto[f] for f in necesarios)
+
+    entrada_datos = cargar_datos(urls_pedidas())
+    datos, archivos_fallidos = entrada_datos["datos"], entrada_datos["fallidos"]
+    st.sidebar.caption(f"🗂️ Datos versión {entrada_datos['version']} · actualizados {entrada_datos['actualizado']:%d/%m/%Y %H:%M}")
+    bancos, cuentas, periodos = datos["bancos"], datos["cuentas"], datos["periodos"]
+
+    if archivos_fallidos:
+        detalle = "\n".join(f"- {archivo}: {error}" for archivo, error in archivos_fallidos)
+        st.warning(f"No se pudieron descargar {len(archivos_fallidos)} archivo(s) desde Dropbox:\n{detalle}")
+
+    if periodos.empty:
         st.error("No hay datos disponibles.")
         st.stop()
+    tel.marca("carga")
+    tel.memoria("datos", datos)
 
 
     # --------------------- SECCION TABLA ENTIDADES FINANCIERAS ---------------------#
@@ -248,27 +264,32 @@ if st.session_state["authentication_status"]:
     st.subheader("📊 **Entidades Financieras**")
     with st.sidebar:
     #with st.expander("🎯 **Configurar Filtros**", expanded=True):
-        lista_bancos_master = sorted(df["Banco"].unique())
-        bancos_sel = st.multiselect("🏢 Entidades Financieras:", options=lista_bancos_master, default=[lista_bancos_master[0]] if lista_bancos_master else [])
+        lista_bancos_master = sorted(bancos["Banco"].unique())
+        bancos_sel = st.multiselect("🏢 Entidades Financieras:", options=lista_bancos_master, default=[lista_bancos_master[0]] if lista_bancos_master else [], key="bancos_sel")
 
         
-        lista_periodos = df.sort_values("Periodo_DT", ascending=False)["Periodo"].unique().tolist()
-        periodo_sel = st.selectbox("📅 Periodo de Tabla (MM-AAAA):", options=lista_periodos)
+        periodo_sel = st.selectbox("📅 Periodo de Tabla (MM-AAAA):", options=lista_periodos, key="periodo_sel")
+
+        # Contra qué periodo se calculan las variaciones de la tabla
+        comparar_contra = st.selectbox("↔️ Comparar contra:", options=an.COMPARACIONES, key="comparar_contra")
+        if comparar_contra == "Periodo base":
+            periodo_base = st.selectbox("📌 Periodo base (MM-AAAA):", options=lista_periodos, index=len(lista_periodos) - 1, key="periodo_base")
         
         # CAMBIO: Multiselect para Masa Patrimonial
-        opciones_n0 = sorted(df["Nivel_0"].unique().tolist())
+        opciones_n0 = sorted(cuentas["Nivel_0"].unique().tolist())
         nivel0_sel = st.multiselect("Masa Patrimonial:", opciones_n0, default=opciones_n0)
 
 
         # CAMBIO: Lógica .isin() para evitar error
-        df_n2_opc = df[df["Nivel_0"].isin(nivel0_sel)] if nivel0_sel else df
+        df_n2_opc = cuentas[cuentas["Nivel_0"].isin(nivel0_sel)] if nivel0_sel else cuentas
         opciones_n2 = sorted([str(x) for x in df_n2_opc["Nivel_2"].dropna().unique().tolist()])
         nivel2_sel = st.selectbox("Rubro (Nivel 2):", ["Todos"] + opciones_n2)
         
-        nivel1_sel = st.selectbox("Nivel de Detalle:", ["Todos"] + sorted(df["Nivel_1"].unique().tolist()))
+        nivel1_sel = st.selectbox("Nivel de Detalle:", ["Todos"] + sorted(cuentas["Nivel_1"].unique().tolist()))
 
-        # Filtro para el Multiselect de Cuentas
-        df_opc = df[df["Periodo"] == periodo_sel].copy()
+        # Filtro para el Multiselect de Cuentas: solo los códigos presentes en el periodo elegido
+        codigos_periodo = an.codigos_del_periodo(datos, fecha_de_periodo[periodo_sel])
+        df_opc = cuentas.loc[codigos_periodo]
 
         # 2. Aplicamos los filtros de Masa, Rubro y Detalle para que la lista sea corta y útil
         if nivel0_sel:  df_opc = df_opc[df_opc["Nivel_0"].isin(nivel0_sel)]
@@ -276,7 +297,7 @@ if st.session_state["authentication_status"]:
         if nivel1_sel != "Todos":  df_opc = df_opc[df_opc["Nivel_1"] == nivel1_sel]
 
         # 3. Creamos la lista única de etiquetas "Código - Cuenta"
-        lista_cuentas_master = sorted((df_opc["Codigo"] + " - " + df_opc["Cuenta"]).unique())
+        lista_cuentas_master = sorted((df_opc.index.astype(str) + " - " + df_opc["Cuenta"]).unique())
         # 4. Única instancia del multiselect
         cuentas_sel_list = st.multiselect(
             "🔢 Seleccionar Cuentas:", 
@@ -284,134 +305,243 @@ if st.session_state["authentication_status"]:
             help="Seleccione las cuentas que desea comparar en el gráfico de líneas al final de la página."
         )
 
+    tel.marca("opciones_sidebar")
+
     # --- COMPARATIVO ---
-    try:
-        mes_sel, año_sel = periodo_sel.split("-")
-        mes_num, año_num = int(mes_sel), int(año_sel)
-        if mes_num == 1: mes_ant, año_ant = "12", str(año_num - 1)
-        else: mes_ant, año_ant = str(mes_num - 1).zfill(2), str(año_num)
-    except:
-        mes_ant, año_ant = None, None
-
-    df_actual = df[(df["Año"] == año_sel) & (df["Mes"] == mes_sel) & (df["Banco"].isin(bancos_sel))].copy()
-    df_anterior = df[(df["Año"] == año_ant) & (df["Mes"] == mes_ant) & (df["Banco"].isin(bancos_sel))].copy()
-
-    df_comp = pd.merge(df_actual, df_anterior[['Banco', 'Codigo', 'Saldo_Act']], on=['Banco', 'Codigo'], how='left', suffixes=('', '_Ant')).fillna(0)
-    df_comp['Var. Absoluta'] = df_comp['Saldo_Act'] - df_comp['Saldo_Act_Ant']
-    df_comp['Var. %'] = df_comp.apply(lambda x: ((x['Saldo_Act'] - x['Saldo_Act_Ant']) / abs(x['Saldo_Act_Ant']) * 100) if x['Saldo_Act_Ant'] != 0 else 0, axis=1)
-
-    # --- SELECTOR DE VISTA ---
-    opcion_vista = st.radio("🧐 **Seleccione nivel de análisis:**", options=["Vista Macro", "Vista Subtotales", "Todo"], horizontal=True)
-
-    df_res = df_comp.copy()
-
-    # Filtrado por Vista (Lógica corregida)
-    if opcion_vista == "Vista Macro":
-        df_res = df_res[df_res["Vista"] == "Vista Macro"]
-    elif opcion_vista == "Vista Subtotales":
-        df_res = df_res[(df_res["Vista"] == "Vista Subtotales") | (df_res["Codigo"] == "650000")]
-
-    # Filtros adicionales
-    if nivel0_sel: df_res = df_res[df_res["Nivel_0"].isin(nivel0_sel)]
-    if nivel2_sel != "Todos": df_res = df_res[df_res["Nivel_2"] == nivel2_sel]
-    if nivel1_sel != "Todos": df_res = df_res[df_res["Nivel_1"] == nivel1_sel]
-    if cuentas_sel_list:
-        codigos_sel = [c.split(" - ")[0] for c in cuentas_sel_list]
-        df_res = df_res[df_res["Codigo"].isin(codigos_sel)]
-
-    # --- TABLA Y TOTALES ---
-    def color_variacion(val):
-        if val < 0: return 'color: #ff4b4b; font-weight: bold;'
-        elif val > 0: return 'color: #008000; font-weight: bold;'
-        return 'color: black;'
-
-    st.subheader(f"📝 Balance contable ({opcion_vista}) de {bancos_sel}")
-    df_res=df_res.sort_values("Codigo", ascending=True)
-
-    # --- AJUSTE DE COLUMNAS DINÁMICAS PARA VISTA SLIM ---
-    # Columnas que SIEMPRE se muestran
-    cols_a_mostrar = ["Codigo", "Cuenta", "Saldo_Act", "Var. Absoluta", "Var. %"]
-
-    # Columnas que se muestran SOLO si no hay un filtro específico (para evitar redundancia)
-    # --- AJUSTE DE COLUMNAS DINÁMICAS (LÓGICA PERSONALIZADA) ---
-
-    # 1. Definimos la base de columnas según la vista y cantidad de bancos
-    if len(bancos_sel) == 1:
-        if opcion_vista == "Vista Macro":
-            # Solo Cuenta y datos numéricos (Sin Código)
-            cols_a_mostrar = ["Cuenta", "Saldo_Act", "Var. Absoluta", "Var. %"]
-        elif opcion_vista == "Vista Subtotales":
-            # Se agrega el Código a la visión macro
-            cols_a_mostrar = ["Codigo", "Cuenta", "Saldo_Act", "Var. Absoluta", "Var. %"]
+    # IDs de los bancos elegidos (el filtro se hace sobre enteros, no sobre nombres)
+    ids_sel = bancos.index[bancos["Banco"].isin(bancos_sel)]
+    fecha_sel = fecha_de_periodo[periodo_sel]
+
+    fecha_base = fecha_de_periodo[periodo_base] if comparar_contra == "Periodo base" else None
+    fecha_ref = an.fecha_referencia(fecha_sel, comparar_contra, fecha_base)
+
+    if fecha_ref not in periodos.index:
+        st.caption(f"⚠️ No hay datos para el periodo de comparación ({str(fecha_ref)[4:]}-{str(fecha_ref)[:4]}): las variaciones se calculan contra saldo 0.")
+
+    codigos_sel = [c.split(" - ")[0] for c in cuentas_sel_list]
+
+    # Exportación completa: todos los bancos y todos los periodos del manifiesto, en segundo plano.
+    # Fragmento propio: elegir el formato o actualizar el estado no recarga la tabla
+    @fragmento("exportacion")
+    def seccion_exportacion():
+        with st.expander("📦 Exportación completa (todos los bancos y periodos)"):
+            urls_todas = tuple(manifiesto[f] for f in fechas_manifiesto)
+            formato_completo = st.radio("Formato:", ["xlsx", "csv"], horizontal=True, key="formato_completo",
+                                        format_func=lambda f: "Excel (una hoja por periodo)" if f == "xlsx" else "CSV")
+            trabajo = exportaciones().estado(urls_todas, formato_completo)
+            if trabajo is None or trabajo["estado"] == "error":
+                if trabajo is not None:
+                    st.error(f"La exportación anterior falló: {trabajo['error']}")
+                # Con on_click la exportación arranca antes de que se vuelva a dibujar el fragmento
+                st.button("Generar exportación", key="generar_completo",
+                          on_click=exportaciones().iniciar, args=(urls_todas, formato_completo))
+            elif trabajo["estado"] == "en curso":
+                st.progress(trabajo["progreso"], text=f"Generando desde las {trabajo['inicio']:%H:%M}... (puede seguir usando la app)")
+                st.button("🔄 Actualizar estado", key="actualizar_completo")
+            else:
+                # El archivo se lee recién al hacer clic, no en cada recarga de la página
+                st.download_button(f"⬇️ Descargar ({os.path.getsize(trabajo['ruta']) / 2**20:,.1f} MB)",
+                                   data=lambda: exportar.leer_exportacion(trabajo["ruta"]),
+                                   file_name=os.path.basename(trabajo["ruta"]), mime=exportar.FORMATOS[formato_completo],
+                                   key="descargar_completo", on_click="ignore")
+
+    # --- SECCIÓN BALANCE (fragmento: nivel de análisis, paginación, tabla y gráfico de barras) ---
+    # Depende solo de los filtros del sidebar; el rango de análisis no la afecta
+    @fragmento("balance")
+    def seccion_balance(datos, ids_sel, bancos_sel, fecha_sel, comparar_contra, fecha_base,
+                        nivel0_sel, nivel2_sel, nivel1_sel, codigos_sel):
+        # --- SELECTOR DE VISTA ---
+        opcion_vista = st.radio("🧐 **Seleccione nivel de análisis:**", options=an.VISTAS, horizontal=True)
+
+        clave_balance = (tuple(ids_sel), fecha_sel, comparar_contra, fecha_base, opcion_vista,
+                         tuple(sorted(nivel0_sel)), nivel2_sel, nivel1_sel, tuple(sorted(codigos_sel)))
+        df_res = resultado_cacheado("balance", clave_balance, lambda: an.filtrar_balance(
+            an.armar_comparativo(datos, ids_sel, fecha_sel, comparar_contra, fecha_base)[0],
+            opcion_vista, nivel0_sel, nivel2_sel, nivel1_sel, codigos_sel))
+        tel.marca("comparativo")
+        tel.memoria("df_res", df_res)
+
+        # --- TABLA Y TOTALES ---
+        FILAS_POR_PAGINA = 100  # La tabla se pagina en el servidor: solo se estiliza y envía la página visible
+
+        def color_variacion(columna):
+            # Estilo de una columna entera de una vez (vectorizado), no celda por celda
+            return np.where(columna < 0, 'color: #ff4b4b; font-weight: bold;',
+                            np.where(columna > 0, 'color: #008000; font-weight: bold;', 'color: black;'))
+
+        st.subheader(f"📝 Balance contable ({opcion_vista}) de {bancos_sel}")
+        df_res=df_res.sort_values("Codigo", ascending=True)
+
+        # --- AJUSTE DE COLUMNAS DINÁMICAS PARA VISTA SLIM ---
+        # Columnas que SIEMPRE se muestran
+        cols_a_mostrar = ["Codigo", "Cuenta", "Saldo_Act", "Var. Absoluta", "Var. %"]
+
+        # Columnas que se muestran SOLO si no hay un filtro específico (para evitar redundancia)
+        # --- AJUSTE DE COLUMNAS DINÁMICAS (LÓGICA PERSONALIZADA) ---
+
+        # 1. Definimos la base de columnas según la vista y cantidad de bancos
+        if len(bancos_sel) == 1:
+            if opcion_vista == "Vista Macro":
+                # Solo Cuenta y datos numéricos (Sin Código)
+                cols_a_mostrar = ["Cuenta", "Saldo_Act", "Var. Absoluta", "Var. %"]
+            elif opcion_vista == "Vista Subtotales":
+                # Se agrega el Código a la visión macro
+                cols_a_mostrar = ["Codigo", "Cuenta", "Saldo_Act", "Var. Absoluta", "Var. %"]
+            else:
+                # Para "Todo" mantenemos el estándar
+                cols_a_mostrar = ["Codigo", "Cuenta", "Saldo_Act", "Var. Absoluta", "Var. %"]
         else:
-            # Para "Todo" mantenemos el estándar
-            cols_a_mostrar = ["Codigo", "Cuenta", "Saldo_Act", "Var. Absoluta", "Var. %"]
-    else:
-        # Si hay más de un banco, siempre mostramos Banco y Código
-        cols_a_mostrar = ["Banco", "Codigo", "Cuenta", "Saldo_Act", "Var. Absoluta", "Var. %"]
-
-    # 2. Agregamos Nivel_0 y Nivel_2 solo si el usuario no los filtró (para evitar redundancia)
-    if nivel2_sel == "Todos" and opcion_vista == "Todo":
-        cols_a_mostrar.insert(1, "Nivel_2")
-
-    if nivel0_sel == "Todos" and opcion_vista == "Todo":
-        cols_a_mostrar.insert(1, "Nivel_0")
-
-    # --- RENDERIZADO DE TABLA ---
-
-    # Ordenamos antes de aplicar el estilo
-    df_res = df_res.sort_values("Codigo", ascending=True)
-
-    df_styled = (df_res[cols_a_mostrar]
-                .style.format({
-                    "Saldo_Act": "{:,.0f}", 
-                    "Var. Absoluta": "{:,.0f}", 
-                    "Var. %": "{:.2f}%"
-                })
-                .map(color_variacion, subset=['Var. Absoluta', 'Var. %']))
-
-    # Altura automática para evitar scroll interno
-    st.dataframe(df_styled, use_container_width=True, hide_index=True, height="auto")
-
-
-
-    # --- TABLA LADO DERECHO ---
-
-    st.markdown(f"##### 📊 Composición por Cuenta ({opcion_vista})")
+            # Si hay más de un banco, siempre mostramos Banco y Código
+            cols_a_mostrar = ["Banco", "Codigo", "Cuenta", "Saldo_Act", "Var. Absoluta", "Var. %"]
+
+        # 2. Agregamos Nivel_0 y Nivel_2 solo si el usuario no los filtró (para evitar redundancia)
+        if nivel2_sel == "Todos" and opcion_vista == "Todo":
+            cols_a_mostrar.insert(1, "Nivel_2")
+
+        if nivel0_sel == "Todos" and opcion_vista == "Todo":
+            cols_a_mostrar.insert(1, "Nivel_0")
+
+        # --- RENDERIZADO DE TABLA ---
+
+        # Ordenamos antes de aplicar el estilo
+        df_res = df_res.sort_values("Codigo", ascending=True)
+
+        # Paginación: con muchos bancos en "Todo" se estiliza y envía solo la página elegida
+        df_pagina = df_res[cols_a_mostrar]
+        n_paginas = max(1, -(-len(df_res) // FILAS_POR_PAGINA))
+        if n_paginas > 1:
+            # Si cambian los filtros y hay menos páginas, se vuelve a la última que existe
+            if st.session_state.get("pagina_balance", 1) > n_paginas:
+                st.session_state["pagina_balance"] = n_paginas
+            c_pag, c_info = st.columns([1, 4])
+            with c_pag:
+                pagina = st.number_input("Página:", min_value=1, max_value=n_paginas, step=1, key="pagina_balance")
+            inicio = (pagina - 1) * FILAS_POR_PAGINA
+            df_pagina = df_pagina.iloc[inicio:inicio + FILAS_POR_PAGINA]
+            with c_info:
+                st.caption(f"Filas {inicio + 1:,}–{inicio + len(df_pagina):,} de {len(df_res):,} ({n_paginas} páginas)")
+
+        df_styled = (df_pagina
+                    .style.format({
+                        "Saldo_Act": "{:,.0f}", 
+                        "Var. Absoluta": "{:,.0f}", 
+                        "Var. %": "{:.2f}%"
+                    })
+                    .apply(color_variacion, subset=['Var. Absoluta', 'Var. %']))
+
+        # Altura automática para evitar scroll interno
+        st.dataframe(df_styled, use_container_width=True, hide_index=True, height="auto")
+        botones_descarga(df_res[an.COLUMNAS_BALANCE], f"balance_{fecha_sel}")
+
+        seccion_exportacion()
+        tel.marca("tabla")
+        if "primera_tabla_ms" not in st.session_state:
+            st.session_state["primera_tabla_ms"] = tel.transcurrido_ms()
+            tel.contexto(primera_tabla_ms=st.session_state["primera_tabla_ms"])
+
+
+
+        # --- TABLA LADO DERECHO ---
+
+        st.markdown(f"##### 📊 Composición por Cuenta ({opcion_vista})")
         
-    # Preparamos los datos para el gráfico
-    # Usamos df_res que ya tiene aplicados los filtros de arriba
-    df_graf = df_res.copy()
+        def figura_barras():
+            # Preparamos los datos para el gráfico
+            # Usamos df_res que ya tiene aplicados los filtros de arriba
+            df_graf = df_res.copy()
         
-    # Creamos el gráfico de barras agrupadas/apiladas
-    fig = px.bar(
-        df_graf, 
-        x="Banco", 
-        y="Saldo_Act", 
-        color="Cuenta",  # Esto crea el apilamiento por cuenta
-        title=None,
-        labels={"Saldo_Act": "Saldo Actual ($)", "Banco": "Entidad"},
-        text_auto='.2s', # Muestra el valor abreviado sobre las barras
-        template="plotly_white"
-    )
-
-    # Ajustes estéticos para que se vea bien en media pantalla
-    fig.update_layout(
-        margin=dict(l=0, r=0, t=20, b=0),
-        height=450,
-        showlegend=True,
-        legend=dict(
-        orientation="h",
-        yanchor="bottom",
-        y=-0.5,
-        xanchor="center",
-        x=0.5,
-        font=dict(size=10)
+            # Creamos el gráfico de barras agrupadas/apiladas
+            fig = px.bar(
+                df_graf, 
+                x="Banco", 
+                y="Saldo_Act", 
+                color="Cuenta",  # Esto crea el apilamiento por cuenta
+                title=None,
+                labels={"Saldo_Act": "Saldo Actual ($)", "Banco": "Entidad"},
+                text_auto='.2s', # Muestra el valor abreviado sobre las barras
+                template="plotly_white"
+            )
+
+            # Ajustes estéticos para que se vea bien en media pantalla
+            fig.update_layout(
+                margin=dict(l=0, r=0, t=20, b=0),
+                height=450,
+                showlegend=True,
+                legend=dict(
+                orientation="h",
+                yanchor="bottom",
+                y=-0.5,
+                xanchor="center",
+                x=0.5,
+                font=dict(size=10)
+                )
+            )
+            return fig
+
+        # La figura se cachea con la misma clave que la tabla
+        fig = resultado_cacheado("grafico_barras", clave_balance, figura_barras)
+
+        # Mostramos el gráfico en Streamlit
+        st.plotly_chart(fig, use_container_width=True)
+        tel.marca("grafico_barras")
+
+    seccion_balance(datos, ids_sel, bancos_sel, fecha_sel, comparar_contra, fecha_base,
+                    nivel0_sel, nivel2_sel, nivel1_sel, codigos_sel)
+
+    # --- JERARQUÍA DE CUENTAS (fragmento: consistencia de totalizadores y agrupaciones propias) ---
+    # El árbol se arma desde los códigos y las hojas se suman a todos sus totalizadores para todos los
+    # bancos del periodo a la vez (ver analitica.verificar_totalizadores); las agrupaciones usan el mismo roll-up
+    @fragmento("jerarquia")
+    def seccion_jerarquia(datos, ids_sel, fecha_sel):
+        st.markdown("---")
+        st.subheader("🌳 Jerarquía de Cuentas")
+
+        df_cons = resultado_cacheado("consistencia", (fecha_sel,), lambda: an.armar_consistencia(datos, fecha_sel))
+        if len(ids_sel):
+            df_cons = df_cons[df_cons["ID"].isin(ids_sel)]
+        estados = df_cons["Estado"].value_counts()
+        col_tot, col_ok, col_dif, col_falta = st.columns(4)
+        col_tot.metric("Totalizadores verificados", f"{len(df_cons):,}")
+        col_ok.metric("Coinciden", f"{estados.get('OK', 0):,}")
+        col_dif.metric("Con diferencias", f"{estados.get('Diferencia', 0):,}")
+        col_falta.metric("Sin detalle / sin informar", f"{estados.get('Sin detalle', 0) + estados.get('Sin informar', 0):,}")
+        st.caption(f"Cada totalizador informado contra la suma de las cuentas de detalle de su rama "
+                   f"(tolerancia $ {an.TOLERANCIA_TOTALES:,.0f}), "
+                   + ("de los bancos seleccionados." if len(ids_sel) else "de todos los bancos del sistema."))
+
+        if st.checkbox("Mostrar solo los totalizadores que no coinciden", value=True, key="solo_diferencias"):
+            df_cons = df_cons[df_cons["Estado"] != "OK"]
+        df_cons = df_cons.sort_values("Diferencia", key=lambda d: d.abs(), ascending=False, na_position="last")
+        st.dataframe(
+            df_cons.drop(columns=["Fecha", "ID"]).style.format({
+                "Informado": "{:,.0f}", "Calculado": "{:,.0f}", "Diferencia": "{:,.0f}"
+            }, na_rep="-"),
+            use_container_width=True, hide_index=True, height=350
         )
-    )
+        botones_descarga(df_cons, f"consistencia_{fecha_sel}")
+
+        st.markdown("##### 🧩 Agrupaciones propias")
+        texto_agr = st.text_area(
+            "Una agrupación por línea: «Nombre: códigos o prefijos separados por coma» (un - adelante resta).",
+            value=an.texto_agrupaciones(an.AGRUPACIONES), key="agrupaciones",
+            help="Un código de 6 dígitos suma las cuentas de detalle de su rama; un prefijo más corto (p. ej. 13), "
+                 "todas las cuentas de detalle que empiezan así."
+        )
+        try:
+            agrupaciones = an.leer_agrupaciones(texto_agr)
+        except ValueError as e:
+            st.error(str(e))
+            agrupaciones = {}
+        if agrupaciones:
+            clave_agr = (fecha_sel, tuple((nombre, tuple(terminos)) for nombre, terminos in agrupaciones.items()))
+            df_agr = resultado_cacheado("agrupaciones", clave_agr, lambda: an.armar_agrupaciones(datos, fecha_sel, agrupaciones))
+            if len(ids_sel):
+                df_agr = df_agr.loc[df_agr.index.isin(datos["bancos"].loc[ids_sel, "Banco"]) | (df_agr.index == "Total Sistema")]
+            st.dataframe(df_agr.style.format("{:,.0f}", na_rep="-"), use_container_width=True)
+            botones_descarga(df_agr, f"agrupaciones_{fecha_sel}", index=True)
+        tel.marca("jerarquia")
 
-    # Mostramos el gráfico en Streamlit
-    st.plotly_chart(fig, use_container_width=True)
+    seccion_jerarquia(datos, ids_sel, fecha_sel)
 
 
 
@@ -433,7 +563,7 @@ if st.session_state["authentication_status"]:
     # Diccionario de colores por banco
 
     # 1. Lista de bancos únicos
-    todos_los_bancos = df["Banco"].unique().tolist()
+    todos_los_bancos = bancos["Banco"].unique().tolist()
 
     # 2. Paleta de colores extendida
     colores_palette = px.colors.qualitative.Plotly + px.colors.qualitative.Safe
@@ -444,202 +574,355 @@ if st.session_state["authentication_status"]:
     # 4. Colores fijos para categorías especiales
     mapa_colores_bancos["Otros Bancos"] = "#d3d3d3"
     mapa_colores_bancos["Resto del Sistema"] = "#d3d3d3"
+    mapa_colores_bancos["Resto"] = "#d3d3d3"
 
+    # Límites de los gráficos de líneas: cantidad de series (las demás se suman en "Resto")
+    # y cantidad de puntos a partir de la cual se dibujan con WebGL (sin spline ni marcadores)
+    MAX_SERIES = 15
+    UMBRAL_WEBGL = 250
 
 
-    # --- PROCESAMIENTO DEL GRÁFICO EVOLUTIVO ---
-
-    st.markdown("---")
-    st.subheader("📅 Evolución Histórica")
-
-    # --- SELECTOR DE MODO DE GRÁFICO (El "Botón") ---
-    modo_grafico = st.radio(
-        "Seleccione visualización:",
-        options=["Sumar Cuentas (Consolidado)", "Detallar por Cuenta y Banco"],
-        horizontal=True
-    )
 
-    # (Mantenemos la lógica del slicer de periodos igual)
-    lista_periodos_slicer = df.sort_values("Periodo_DT")["Periodo"].unique().tolist()
-    rango_slicer = st.select_slider("Rango de análisis:", options=lista_periodos_slicer, value=(lista_periodos_slicer[0], lista_periodos_slicer[-1]))
-    p_inicio, p_fin = rango_slicer
+    # --- ANÁLISIS POR RANGO (evolución, market share, concentración y ratios) ---
+    # El gráfico evolutivo, la concentración y los ratios son fragmentos dentro del fragmento del rango:
+    # cambiar el modo del gráfico, la cuenta del ranking o el ratio recarga solo esa sección
+    @fragmento("evolucion")
+    def seccion_evolucion(datos, ids_sel, bancos_sel, cuentas_sel_list, p_inicio, p_fin):
+        # --- SELECTOR DE MODO DE GRÁFICO (El "Botón") ---
+        modo_grafico = st.radio(
+            "Seleccione visualización:",
+            options=["Sumar Cuentas (Consolidado)", "Detallar por Cuenta y Banco"],
+            horizontal=True
+        )
 
-    if bancos_sel and cuentas_sel_list:
-        # ... (Filtrado de fechas y códigos igual que antes) ...
-        codigos_comp = [c.split(" - ")[0] for c in cuentas_sel_list]
-        fecha_inf = df[df["Periodo"] == p_inicio]["Periodo_DT"].min()
-        fecha_sup = df[df["Periodo"] == p_fin]["Periodo_DT"].max()
-        
-        mask = (df["Banco"].isin(bancos_sel)) & (df["Codigo"].isin(codigos_comp)) & \
-            (df["Periodo_DT"] >= fecha_inf) & (df["Periodo_DT"] <= fecha_sup)
-        df_ev_final = df[mask].copy()
+        if bancos_sel and cuentas_sel_list:
+            # ... (Filtrado de fechas y códigos igual que antes) ...
+            codigos_comp = [int(c.split(" - ")[0]) for c in cuentas_sel_list]
+            fecha_inf = fecha_de_periodo[p_inicio]
+            fecha_sup = fecha_de_periodo[p_fin]
 
-        if not df_ev_final.empty:
             # --- LÓGICA DINÁMICA SEGÚN EL BOTÓN SELECCIONADO ---
-            if modo_grafico == "Sumar Cuentas (Consolidado)":
-                # Agrupamos solo por Banco y Periodo (Suma cuentas)
-                df_plot_ev = df_ev_final.groupby(["Periodo", "Periodo_DT", "Banco"])["Saldo_Act"].sum().reset_index()
-                color_param = "Banco"
-                titulo_graf = "Evolución Consolidada (Suma de Cuentas)"
-            else:
-                # Agrupamos por Banco, Cuenta y Periodo (Detalle total)
-                df_ev_final["Etiqueta"] = df_ev_final["Banco"] + " - " + df_ev_final["Cuenta"]
-                df_plot_ev = df_ev_final.groupby(["Periodo", "Periodo_DT", "Etiqueta"])["Saldo_Act"].sum().reset_index()
-                color_param = "Etiqueta"
-                titulo_graf = "Evolución Detallada por Banco y Cuenta"
-
-            # Orden cronológico
-            df_plot_ev = df_plot_ev.sort_values("Periodo_DT")
-
-
-            # 1. Definimos los argumentos del gráfico en un diccionario para que sea más limpio
-            kwargs_grafico = {
-                "data_frame": df_plot_ev,
-                "x": "Periodo",
-                "y": "Saldo_Act",
-                "color": color_param,  # SIN comillas, para que use la variable (Banco o Etiqueta)
-                "markers": True,
-                "template": "plotly_white",
-                "title": titulo_graf,
-                "labels": {"Saldo_Act": "Saldo ($)"},
-                "line_shape": "spline"
-            }
-
-            # 2. Si el usuario eligió ver por BANCO, le agregamos nuestro mapa de colores fijo
-            if color_param == "Banco":
-                kwargs_grafico["color_discrete_map"] = mapa_colores_bancos
-            
-            # 3. Creamos el gráfico usando esos argumentos (los ** desglosan el diccionario)
-            fig_ev = px.line(**kwargs_grafico)
+            consolidado = modo_grafico == "Sumar Cuentas (Consolidado)"
+
+            def calcular_evolucion():
+                # Tabla y figura juntas: se guardan en el cache de resultados con la selección como clave
+                df_plot_ev = an.armar_evolucion(datos, ids_sel, codigos_comp, fecha_inf, fecha_sup, consolidado)
+                if df_plot_ev.empty:
+                    return df_plot_ev, None, 0
+                if consolidado:
+                    color_param = "Banco"
+                    titulo_graf = "Evolución Consolidada (Suma de Cuentas)"
+                else:
+                    color_param = "Etiqueta"
+                    titulo_graf = "Evolución Detallada por Banco y Cuenta"
+
+
+                # 0. Aliviamos el gráfico: las MAX_SERIES series más grandes + "Resto", saldos redondeados
+                #    (el hover los muestra sin decimales) y WebGL si hay muchos puntos
+                df_graf_ev, n_resto = an.limitar_series(df_plot_ev, color_param, "Saldo_Act", MAX_SERIES)
+                webgl_ev = len(df_graf_ev) > UMBRAL_WEBGL
+
+                # 1. Definimos los argumentos del gráfico en un diccionario para que sea más limpio
+                kwargs_grafico = {
+                    "data_frame": df_graf_ev.round({"Saldo_Act": 0}),
+                    "x": "Periodo",
+                    "y": "Saldo_Act",
+                    "color": color_param,  # SIN comillas, para que use la variable (Banco o Etiqueta)
+                    "markers": not webgl_ev,
+                    "template": "plotly_white",
+                    "title": titulo_graf,
+                    "labels": {"Saldo_Act": "Saldo ($)"},
+                    "line_shape": "linear" if webgl_ev else "spline",
+                    "render_mode": "webgl" if webgl_ev else "svg"
+                }
+
+                # 2. Si el usuario eligió ver por BANCO, le agregamos nuestro mapa de colores fijo
+                if color_param == "Banco":
+                    kwargs_grafico["color_discrete_map"] = mapa_colores_bancos
+                else:
+                    kwargs_grafico["color_discrete_map"] = {"Resto": mapa_colores_bancos["Resto"]}
             
-            # 4. Ajustes finales de formato
-            fig_ev.update_layout(hovermode="x unified")
-            fig_ev.update_traces(hovertemplate="<b>%{fullData.name}</b>: $%{y:,.0f}<extra></extra>")
+                # 3. Creamos el gráfico usando esos argumentos (los ** desglosan el diccionario)
+                fig_ev = px.line(**kwargs_grafico)
             
-            st.plotly_chart(fig_ev, use_container_width=True)
-        else:
-            st.warning("No hay datos para los filtros seleccionados.")
-
-
-
-
-
-
-    # ----------------MARKET SHARE -------------------------------------------------
-    st.markdown("---")
-    st.subheader("📈 Participación de Mercado (Market Share)")
-
-    # --- 1. PREPARACIÓN DE DATOS DE MERCADO ---
-    # Usamos el DF original sin filtrar por banco para tener el 'Total Sistema'
-    if cuentas_sel_list and p_inicio and p_fin:
-        codigos_ms = [c.split(" - ")[0] for c in cuentas_sel_list]
-        fecha_inf_ms = df[df["Periodo"] == p_inicio]["Periodo_DT"].min()
-        fecha_sup_ms = df[df["Periodo"] == p_fin]["Periodo_DT"].max()
-
-        # Filtramos solo por Cuentas y Fechas (Incluye a todos los bancos del sistema)
-        mask_sistema = (
-            (df["Codigo"].isin(codigos_ms)) & 
-            (df["Periodo_DT"] >= fecha_inf_ms) & 
-            (df["Periodo_DT"] <= fecha_sup_ms)
-        )
-        df_sistema = df[mask_sistema].copy()
-
-        if not df_sistema.empty:
-            # Calculamos el Total del Sistema por cada Periodo
-            total_sistema = df_sistema.groupby(["Periodo", "Periodo_DT"])["Saldo_Act"].sum().reset_index()
-            total_sistema.rename(columns={"Saldo_Act": "Total_Sistema"}, inplace=True)
-
-            # Filtramos los bancos seleccionados por el usuario
-            df_bancos_ms = df_sistema[df_sistema["Banco"].isin(bancos_sel)].copy()
-            
-            # Sumamos las cuentas por Banco y Periodo
-            df_bancos_sum = df_bancos_ms.groupby(["Periodo", "Periodo_DT", "Banco"])["Saldo_Act"].sum().reset_index()
-
-            # Unimos los datos de los bancos con el total del sistema
-            df_ms_final = pd.merge(df_bancos_sum, total_sistema, on=["Periodo", "Periodo_DT"])
-
-            # Calculamos el % de participación
-            df_ms_final["Market_Share"] = (df_ms_final["Saldo_Act"] / df_ms_final["Total_Sistema"]) * 100
-            df_ms_final = df_ms_final.sort_values(["Periodo_DT", "Market_Share"], ascending=[True, False])
-
-            # --- 2. GRÁFICO DE MARKET SHARE ---
-            fig_ms = px.line(
-                df_ms_final, 
-                x="Periodo", 
-                y="Market_Share", 
+                # 4. Ajustes finales de formato
+                fig_ev.update_layout(hovermode="x unified")
+                fig_ev.update_traces(hovertemplate="<b>%{fullData.name}</b>: $%{y:,.0f}<extra></extra>")
+                return df_plot_ev, fig_ev, n_resto
+
+            clave_ev = (tuple(ids_sel), tuple(sorted(codigos_comp)), fecha_inf, fecha_sup, consolidado)
+            df_plot_ev, fig_ev, n_resto = resultado_cacheado("evolucion", clave_ev, calcular_evolucion, datos)
+
+            if fig_ev is not None:
+                st.plotly_chart(fig_ev, use_container_width=True)
+                if n_resto:
+                    st.caption(f"Se muestran las {MAX_SERIES} series de mayor saldo; las otras {n_resto} se suman en \"Resto\".")
+                botones_descarga(df_plot_ev, f"evolucion_{fecha_inf}_{fecha_sup}")
+            else:
+                st.warning("No hay datos para los filtros seleccionados.")
+
+        tel.marca("evolucion")
+
+    @fragmento("concentracion")
+    def seccion_concentracion(datos, cuentas_sel_list, codigos_periodo, p_inicio, p_fin):
+        # Rubros y subtotales del periodo + las cuentas elegidas en el sidebar
+        cuentas = datos["cuentas"]
+        df_opc_conc = cuentas.loc[codigos_periodo]
+        df_opc_conc = df_opc_conc[df_opc_conc["Vista"] != "Otro"]
+        lista_cuentas_conc = sorted(set(df_opc_conc.index.astype(str) + " - " + df_opc_conc["Cuenta"]) | set(cuentas_sel_list))
+        if lista_cuentas_conc and p_inicio and p_fin:
+            cuenta_conc = st.selectbox(
+                "Cuenta para el ranking:", lista_cuentas_conc,
+                index=lista_cuentas_conc.index(cuentas_sel_list[0]) if cuentas_sel_list else 0,
+                help="Ranking de todos los bancos del sistema por saldo (en valor absoluto) en el rango de análisis."
+            )
+            codigo_conc = int(cuenta_conc.split(" - ")[0])
+            fecha_inf_conc = fecha_de_periodo[p_inicio]
+            fecha_sup_conc = fecha_de_periodo[p_fin]
+            codigos_macro = cuentas.index[cuentas["Vista"] == "Vista Macro"].tolist()
+
+            def calcular_concentracion():
+                df_conc = an.armar_concentracion(datos, codigos_macro + [codigo_conc], fecha_inf_conc, fecha_sup_conc)
+                df_rank = an.armar_ranking(datos, codigo_conc, fecha_inf_conc, fecha_sup_conc)
+                if df_rank.empty:
+                    return None
+
+                # Heatmap 1: HHI de los rubros (Vista Macro) por periodo
+                mapa_hhi = an.mapa_concentracion(df_conc[df_conc["Codigo"].isin(codigos_macro)], "HHI")
+                fig_hhi = px.imshow(
+                    mapa_hhi.round(0),
+                    color_continuous_scale="Reds",
+                    aspect="auto",
+                    text_auto=True,
+                    template="plotly_white",
+                    title="Índice Herfindahl-Hirschman (HHI) por rubro",
+                    labels={"color": "HHI"}
+                )
+                fig_hhi.update_layout(height=max(350, 28 * len(mapa_hhi) + 150))
+
+                # Heatmap 2: posición de los primeros bancos del último periodo a lo largo del rango
+                mapa_rank = an.mapa_ranking(df_rank, MAX_SERIES)
+                fig_rank = px.imshow(
+                    mapa_rank,
+                    color_continuous_scale="Blues_r",
+                    aspect="auto",
+                    text_auto=True,
+                    template="plotly_white",
+                    title=f"Ranking de los {len(mapa_rank)} primeros bancos en {p_fin}",
+                    labels={"color": "Puesto"}
+                )
+                fig_rank.update_layout(height=max(350, 28 * len(mapa_rank) + 150))
+
+                # Leaderboard del último periodo con el cambio de puesto contra el inicio del rango
+                df_tabla_rank = an.tabla_ranking(df_rank)
+                df_conc_cta = df_conc[df_conc["Codigo"] == codigo_conc].sort_values("Fecha")
+                return {"df_conc_cta": df_conc_cta, "fig_hhi": fig_hhi, "fig_rank": fig_rank, "df_tabla_rank": df_tabla_rank}
+
+            clave_conc = (codigo_conc, fecha_inf_conc, fecha_sup_conc)
+            resultados_conc = resultado_cacheado("concentracion", clave_conc, calcular_concentracion, datos)
+
+            if resultados_conc is not None:
+                df_conc_cta = resultados_conc["df_conc_cta"]
+                ini_conc, fin_conc = df_conc_cta.iloc[0], df_conc_cta.iloc[-1]
+                col_hhi, col_cr3, col_cr5, col_n = st.columns(4)
+                # Más concentración = delta en rojo
+                col_hhi.metric("HHI", f"{fin_conc['HHI']:,.0f}", delta=f"{fin_conc['HHI'] - ini_conc['HHI']:+,.0f}", delta_color="inverse")
+                col_cr3.metric("CR3", f"{fin_conc['CR3']:.1f}%", delta=f"{fin_conc['CR3'] - ini_conc['CR3']:+.1f} p.p.", delta_color="inverse")
+                col_cr5.metric("CR5", f"{fin_conc['CR5']:.1f}%", delta=f"{fin_conc['CR5'] - ini_conc['CR5']:+.1f} p.p.", delta_color="inverse")
+                col_n.metric("Bancos con saldo", f"{fin_conc['Bancos']:,}")
+                st.caption(f"{fin_conc['Cuenta']} en {fin_conc['Periodo']} (variación contra {ini_conc['Periodo']}). "
+                           "HHI: menos de 1.500 no concentrado, 1.500 a 2.500 moderado, más de 2.500 alto.")
+
+                col_lider, col_mapa = st.columns(2)
+                with col_lider:
+                    st.markdown(f"**Leaderboard al cierre de {p_fin}**")
+                    st.dataframe(
+                        resultados_conc["df_tabla_rank"].style.format({
+                            "Share": "{:.2f}%", "Saldo_Act": "{:,.0f}",
+                            "Ranking_Inicio": "{:.0f}", "Cambio": "{:+.0f}"
+                        }, na_rep="nuevo"),
+                        use_container_width=True,
+                        height=420
+                    )
+                    botones_descarga(resultados_conc["df_tabla_rank"], f"ranking_{codigo_conc}_{fecha_sup_conc}", index=True)
+                with col_mapa:
+                    st.plotly_chart(resultados_conc["fig_rank"], use_container_width=True)
+
+                st.plotly_chart(resultados_conc["fig_hhi"], use_container_width=True)
+            else:
+                st.warning("No hay datos de la cuenta elegida en el rango de análisis.")
+        tel.marca("concentracion")
+
+    @fragmento("ratios")
+    def seccion_ratios(datos, ids_sel, bancos_sel, p_inicio, p_fin):
+        fecha_inf_rat = fecha_de_periodo[p_inicio]
+        fecha_sup_rat = fecha_de_periodo[p_fin]
+
+        def calcular_ratios():
+            # Todos los ratios de todos los bancos en el rango (precalculados al cargar) y el del sistema
+            df_rat = an.armar_ratios(datos, fecha_inf_rat, fecha_sup_rat)
+            if df_rat.empty:
+                return None
+            return {"df_rat": df_rat, "df_sis": an.ratio_sistema(df_rat)}
+
+        resultados_rat = resultado_cacheado("ratios", (fecha_inf_rat, fecha_sup_rat), calcular_ratios, datos)
+        if resultados_rat is None:
+            st.warning("No hay datos de las cuentas de los ratios en el rango de análisis.")
+            tel.marca("ratios")
+            return
+        df_rat, df_sis = resultados_rat["df_rat"], resultados_rat["df_sis"]
+
+        # Ratio del sistema al cierre del rango, con la variación contra el inicio
+        columnas_rat = st.columns(len(an.RATIOS))
+        for col, (nombre, definicion) in zip(columnas_rat, an.RATIOS.items()):
+            serie = df_sis[df_sis["Ratio"] == nombre].sort_values("Fecha")
+            if serie["Valor"].notna().any():
+                ini_rat, fin_rat = serie["Valor"].iloc[0], serie["Valor"].iloc[-1]
+                col.metric(nombre, f"{fin_rat:.2f}%", delta=f"{fin_rat - ini_rat:+.2f} p.p.", help=definicion["descripcion"])
+            else:
+                col.metric(nombre, "—", help=definicion["descripcion"])
+
+        ratio_sel = st.selectbox("Ratio para el ranking:", list(an.RATIOS), key="ratio_sel",
+                                 format_func=lambda r: f"{r}: {an.RATIOS[r]['descripcion']}")
+
+        def figuras_ratio():
+            df_ratio = df_rat[df_rat["Ratio"] == ratio_sel]
+            sistema = df_sis[df_sis["Ratio"] == ratio_sel]
+            df_tabla_rat = an.tabla_ratio(df_ratio)
+
+            # Barras: los MAX_SERIES primeros del sistema + los bancos elegidos, con el valor del sistema como referencia
+            df_barras = df_tabla_rat[(df_tabla_rat.index <= MAX_SERIES) | df_tabla_rat["Banco"].isin(bancos_sel)].reset_index()
+            df_barras["Grupo"] = np.where(df_barras["Banco"].isin(bancos_sel), "Seleccionado", "Sistema")
+            fig_barras_rat = px.bar(
+                df_barras.iloc[::-1],
+                x="Valor",
+                y="Banco",
+                color="Grupo",
+                color_discrete_map={"Seleccionado": "#636efa", "Sistema": "#d3d3d3"},
+                orientation="h",
+                template="plotly_white",
+                title=f"{ratio_sel} al cierre de {p_fin}",
+                labels={"Valor": "%", "Banco": ""},
+                hover_data={"Puesto": True, "Grupo": False}
+            )
+            fig_barras_rat.update_layout(height=max(350, 22 * len(df_barras) + 120), showlegend=False)
+            valor_sistema = sistema.sort_values("Fecha")["Valor"].iloc[-1]
+            if pd.notna(valor_sistema):
+                fig_barras_rat.add_vline(x=valor_sistema, line_dash="dash",
+                                         annotation_text=f"Sistema {valor_sistema:.2f}%")
+
+            # Evolución: bancos elegidos + el sistema
+            df_ev_rat = pd.concat([df_ratio[df_ratio["ID"].isin(ids_sel)][["Periodo_DT", "Periodo", "Banco", "Valor"]],
+                                   sistema[["Periodo_DT", "Periodo", "Valor"]].assign(Banco="Sistema")])
+            fig_ev_rat = px.line(
+                df_ev_rat.sort_values("Periodo_DT").round({"Valor": 2}),
+                x="Periodo",
+                y="Valor",
                 color="Banco",
-                color_discrete_map=mapa_colores_bancos,
+                color_discrete_map={**mapa_colores_bancos, "Sistema": "black"},
                 markers=True,
                 template="plotly_white",
-                title="Evolución de Cuota de Mercado (%)",
-                labels={"Market_Share": "Share"},
-                line_shape="spline"
+                title=f"Evolución de {ratio_sel}",
+                labels={"Valor": "%"}
             )
-
-            # Configuración del Hover (Cartelito)
-            fig_ms.update_traces(
-                # El orden en el recuadro respetará el orden del DataFrame
-                hovertemplate="<b>%{fullData.name}</b>: %{y:.2f}%<extra></extra>"
-            )
-
-            # Configuración del recuadro unificado y ordenamiento
-            fig_ms.update_layout(
-                hovermode="x unified",
-                yaxis_ticksuffix="%",
-                # Mantenemos el periodo como encabezado
-                xaxis=dict(hoverformat="%m-%Y"),
-                # Este parámetro asegura que el hover mantenga el orden que definimos en el DF
-                hoverlabel=dict(namelength=-1)
+            fig_ev_rat.update_layout(hovermode="x unified", yaxis_ticksuffix="%")
+            fig_ev_rat.update_traces(hovertemplate="<b>%{fullData.name}</b>: %{y:.2f}%<extra></extra>")
+            return {"df_tabla_rat": df_tabla_rat, "fig_barras_rat": fig_barras_rat, "fig_ev_rat": fig_ev_rat}
+
+        clave_rat = (ratio_sel, tuple(ids_sel), fecha_inf_rat, fecha_sup_rat)
+        figuras_rat = resultado_cacheado("ratio_sel", clave_rat, figuras_ratio, datos)
+
+        col_rank_rat, col_ev_rat = st.columns(2)
+        with col_rank_rat:
+            st.plotly_chart(figuras_rat["fig_barras_rat"], use_container_width=True)
+        with col_ev_rat:
+            st.plotly_chart(figuras_rat["fig_ev_rat"], use_container_width=True)
+        with st.expander(f"Ver ranking completo de {ratio_sel}"):
+            st.dataframe(
+                figuras_rat["df_tabla_rat"].style.format({
+                    "Valor": "{:.2f}%", "Valor_Inicio": "{:.2f}%", "Cambio_pp": "{:+.2f}",
+                    "Numerador": "{:,.0f}", "Denominador": "{:,.0f}"
+                }, na_rep="-"),
+                use_container_width=True
             )
+            botones_descarga(figuras_rat["df_tabla_rat"], f"ratio_{ratio_sel.replace(' / ', '_sobre_')}_{fecha_sup_rat}", index=True)
+        tel.marca("ratios")
+
+    # Mover el "Rango de análisis" recarga estas secciones y no la tabla del balance
+    @fragmento("rango")
+    def seccion_rango(ids_sel, bancos_sel, cuentas_sel_list, codigos_periodo):
+        # --- PROCESAMIENTO DEL GRÁFICO EVOLUTIVO ---
+
+        st.markdown("---")
+        st.subheader("📅 Evolución Histórica")
+
+        # (Mantenemos la lógica del slicer de periodos igual)
+        # Arranca mostrando el último periodo y el anterior; al ampliar el rango se cargan los meses que falten
+        rango_slicer = st.select_slider("Rango de análisis:", options=lista_periodos_slicer, value=rango_default, key="rango_analisis")
+        p_inicio, p_fin = rango_slicer
+
+        # Un rango más amplio puede necesitar otros periodos: se piden los mismos que pediría la página
+        datos = cargar_datos(urls_pedidas())["datos"]
+        seccion_evolucion(datos, ids_sel, bancos_sel, cuentas_sel_list, p_inicio, p_fin)
+
+        # ----------------MARKET SHARE -------------------------------------------------
+        st.markdown("---")
+        st.subheader("📈 Participación de Mercado (Market Share)")
+
+        # --- 1. PREPARACIÓN DE DATOS DE MERCADO ---
+        # Usamos el DF original sin filtrar por banco para tener el 'Total Sistema'
+        if cuentas_sel_list and p_inicio and p_fin:
+            codigos_ms = [int(c.split(" - ")[0]) for c in cuentas_sel_list]
+            fecha_inf_ms = fecha_de_periodo[p_inicio]
+            fecha_sup_ms = fecha_de_periodo[p_fin]
+
+            def calcular_market_share():
+                # Tablas y figuras de toda la sección (incluida la dinámica): se cachean juntas
+                # Share de cada banco sobre el total del sistema (cubo precalculado) por periodo
+                df_ms_final = an.armar_market_share(datos, ids_sel, codigos_ms, fecha_inf_ms, fecha_sup_ms)
+                if df_ms_final is None:
+                    return None
+
+                # --- 2. GRÁFICO DE MARKET SHARE ---
+                # Mismo alivio que en la evolución: bancos de mayor share + "Resto", WebGL si hay muchos puntos
+                df_graf_ms, n_resto_ms = an.limitar_series(df_ms_final, "Banco", "Market_Share", MAX_SERIES)
+                webgl_ms = len(df_graf_ms) > UMBRAL_WEBGL
+                fig_ms = px.line(
+                    df_graf_ms.round({"Market_Share": 4}), 
+                    x="Periodo", 
+                    y="Market_Share", 
+                    color="Banco",
+                    color_discrete_map=mapa_colores_bancos,
+                    markers=not webgl_ms,
+                    template="plotly_white",
+                    title="Evolución de Cuota de Mercado (%)",
+                    labels={"Market_Share": "Share"},
+                    line_shape="linear" if webgl_ms else "spline",
+                    render_mode="webgl" if webgl_ms else "svg"
+                )
 
-            st.plotly_chart(fig_ms, use_container_width=True)
+                # Configuración del Hover (Cartelito)
+                fig_ms.update_traces(
+                    # El orden en el recuadro respetará el orden del DataFrame
+                    hovertemplate="<b>%{fullData.name}</b>: %{y:.2f}%<extra></extra>"
+                )
 
-            with st.expander("Ver tabla de Market Share (%)"):
-                # 1. Creamos la tabla pivot de los bancos (Market Share %)
-                df_ms_pivot = df_ms_final.pivot(index="Periodo", columns="Banco", values="Market_Share")
-                
-                # 2. Obtenemos el Volumen del Sistema por periodo (un valor por mes)
-                # Quitamos duplicados para tener una serie: Periodo -> Total_Sistema
-                df_totales = df_ms_final[["Periodo", "Total_Sistema", "Periodo_DT"]].drop_duplicates().set_index("Periodo")
-                
-                # 3. Unimos el Volumen del Sistema a la tabla pivot
-                df_ms_completa = df_ms_pivot.copy()
-                df_ms_completa["Total Sistema"] = df_totales["Total_Sistema"]
-                
-                # 4. Aseguramos el orden cronológico antes de mostrar
-                df_ms_completa = df_ms_completa.reindex(df_totales.sort_values("Periodo_DT").index)
-                
-                # 5. Aplicamos formatos diferenciados: % para bancos y número para el Total
-                # Creamos un diccionario de formatos dinámico basado en las columnas
-                formatos = {col: "{:.2f}%" for col in df_ms_pivot.columns}
-                formatos["Total Sistema"] = "{:,.0f}" # Formato con separador de miles
-                
-                st.dataframe(
-                    df_ms_completa.style.format(formatos), 
-                    use_container_width=True
+                # Configuración del recuadro unificado y ordenamiento
+                fig_ms.update_layout(
+                    hovermode="x unified",
+                    yaxis_ticksuffix="%",
+                    # Mantenemos el periodo como encabezado
+                    xaxis=dict(hoverformat="%m-%Y"),
+                    # Este parámetro asegura que el hover mantenga el orden que definimos en el DF
+                    hoverlabel=dict(namelength=-1)
                 )
-        # =========================================================
-            # NUEVAS SUGERENCIAS: ANÁLISIS DE DINÁMICA DE MERCADO
-            # =========================================================
-            st.markdown("---")
-            st.subheader("🔍 Análisis de Dinámica de Mercado")
-            
-            # --- PREPARACIÓN DE DATOS PARA LAS SUGERENCIAS ---
-            p_min_dt = df_ms_final["Periodo_DT"].min()
-            p_max_dt = df_ms_final["Periodo_DT"].max()
-            
-            # 1. Datos para Sugerencia 2: Ganadores y Perdedores
-            df_inicio = df_ms_final[df_ms_final["Periodo_DT"] == p_min_dt][["Banco", "Market_Share"]]
-            df_fin = df_ms_final[df_ms_final["Periodo_DT"] == p_max_dt][["Banco", "Market_Share"]]
-            
-            df_var = pd.merge(df_inicio, df_fin, on="Banco", suffixes=('_ini', '_fin'))
-            df_var["Dif_pp"] = df_var["Market_Share_fin"] - df_var["Market_Share_ini"]
-            df_var = df_var.sort_values("Dif_pp", ascending=True) # Ascendente para que el que más gana quede arriba en el chart horizontal
 
-            # --- RENDERIZADO DE GRÁFICOS (Sugerencias 2 y 3) ---
-            col_var, col_resto = st.columns(2)
+                # Tabla pivot Periodo x Banco (Market Share %) + Volumen del Sistema, en orden cronológico
+                df_ms_completa = an.tabla_market_share(df_ms_final)
+
+                # Datos para Sugerencia 2: Ganadores y Perdedores
+                df_var, df_fin = an.variacion_share(df_ms_final)
 
-            with col_var:
                 # SUGERENCIA 2: Gráfico de barras horizontales de Variación
                 fig_var = px.bar(
                     df_var, 
@@ -655,18 +938,10 @@ if st.session_state["authentication_status"]:
                 )
                 fig_var.update_layout(coloraxis_showscale=False)
                 fig_var.update_traces(hovertemplate="<b>%{y}</b><br>Variación: %{x:.2f} p.p.<extra></extra>")
-                st.plotly_chart(fig_var, use_container_width=True)
 
-            with col_resto:
                 # SUGERENCIA 3: Concentración (Bancos seleccionados vs Resto)
                 # Calculamos el peso del último mes
-                share_total_sel = df_fin["Market_Share"].sum()
-                share_resto = 100 - share_total_sel
-                
-                df_pie = pd.concat([
-                    df_fin, 
-                    pd.DataFrame([{"Banco": "Otros Bancos", "Market_Share": share_resto}])
-                ])
+                df_pie = an.share_con_resto(df_fin)
 
                 fig_pie = px.pie(
                     df_pie, 
@@ -679,12 +954,97 @@ if st.session_state["authentication_status"]:
                     template="plotly_white"
                 )
                 fig_pie.update_traces(textposition='inside', textinfo='percent+label')
-                st.plotly_chart(fig_pie, use_container_width=True)
 
+                return {"df_ms_final": df_ms_final, "fig_ms": fig_ms, "n_resto_ms": n_resto_ms, "df_ms_completa": df_ms_completa,
+                        "df_var": df_var, "fig_var": fig_var, "df_pie": df_pie, "fig_pie": fig_pie}
+
+            clave_ms = (tuple(ids_sel), tuple(sorted(codigos_ms)), fecha_inf_ms, fecha_sup_ms)
+            resultados_ms = resultado_cacheado("market_share", clave_ms, calcular_market_share, datos)
+
+            if resultados_ms is not None:
+                df_ms_final, df_ms_completa = resultados_ms["df_ms_final"], resultados_ms["df_ms_completa"]
+                n_resto_ms = resultados_ms["n_resto_ms"]
+
+                st.plotly_chart(resultados_ms["fig_ms"], use_container_width=True)
+                if n_resto_ms:
+                    st.caption(f"Se muestran los {MAX_SERIES} bancos de mayor participación; los otros {n_resto_ms} se suman en \"Resto\".")
+
+                with st.expander("Ver tabla de Market Share (%)"):
+                    # Aplicamos formatos diferenciados: % para bancos y número para el Total
+                    # Creamos un diccionario de formatos dinámico basado en las columnas
+                    formatos = {col: "{:.2f}%" for col in df_ms_completa.columns if col != "Total Sistema"}
+                    formatos["Total Sistema"] = "{:,.0f}" # Formato con separador de miles
+                
+                    st.dataframe(
+                        df_ms_completa.style.format(formatos), 
+                        use_container_width=True
+                    )
+                    botones_descarga(df_ms_completa, f"market_share_{fecha_inf_ms}_{fecha_sup_ms}", index=True)
+            # =========================================================
+                # NUEVAS SUGERENCIAS: ANÁLISIS DE DINÁMICA DE MERCADO
+                # =========================================================
+                tel.marca("market_share")
+                st.markdown("---")
+                st.subheader("🔍 Análisis de Dinámica de Mercado")
+
+                # --- RENDERIZADO DE GRÁFICOS (Sugerencias 2 y 3) ---
+                col_var, col_resto = st.columns(2)
+
+                with col_var:
+                    st.plotly_chart(resultados_ms["fig_var"], use_container_width=True)
+
+                with col_resto:
+                    st.plotly_chart(resultados_ms["fig_pie"], use_container_width=True)
+                tel.marca("dinamica")
+
+            else:
+                st.warning("No hay datos suficientes para calcular el Market Share.")
         else:
-            st.warning("No hay datos suficientes para calcular el Market Share.")
-    else:
-        st.info("Seleccione bancos y cuentas arriba para calcular la participación de mercado.")
+            st.info("Seleccione bancos y cuentas arriba para calcular la participación de mercado.")
+        tel.marca("market_share")
+
+        # ---------------- CONCENTRACIÓN DEL SISTEMA -------------------------------------
+        # HHI, CR3 / CR5 y ranking de todos los bancos: salen del cubo y del Ranking que se calculan al
+        # cargar los datos (una pasada para todas las cuentas y periodos), acá solo se recortan
+        st.markdown("---")
+        st.subheader("🏆 Concentración del Sistema")
+        seccion_concentracion(datos, cuentas_sel_list, codigos_periodo, p_inicio, p_fin)
+
+        # ---------------- RATIOS DEL SISTEMA ---------------------------------------------
+        # Definidos en analitica.RATIOS y calculados al cargar los datos para todos los bancos y
+        # periodos (una pasada vectorizada): acá solo se recortan al rango y se ordenan
+        st.markdown("---")
+        st.subheader("📐 Ratios del Sistema")
+        seccion_ratios(datos, ids_sel, bancos_sel, p_inicio, p_fin)
+
+    seccion_rango(ids_sel, bancos_sel, cuentas_sel_list, codigos_periodo)
+
+    # --- TELEMETRÍA (panel solo para los usuarios de `admins` en config.yaml) ---
+    evento = tel.cerrar()
+    historial = st.session_state.setdefault("telemetria", [])
+    historial.append(evento)
+    del historial[:-20]  # Últimas 20 recargas de la sesión
+    if st.session_state["username"] in config.get("admins", []):
+        with st.sidebar.expander("⏱️ Telemetría (admin)"):
+            st.metric("Última recarga", f"{evento['total_ms']:,.0f} ms",
+                      help=f"Promedio de las últimas {len(historial)}: {sum(e['total_ms'] for e in historial) / len(historial):,.0f} ms")
+            st.dataframe(pd.DataFrame({
+                "Última (ms)": pd.Series(evento["secciones_ms"]),
+                "Promedio (ms)": pd.DataFrame([e["secciones_ms"] for e in historial]).mean(),
+            }).round(1), use_container_width=True)
+            st.dataframe(pd.DataFrame(evento["cache"]).T, use_container_width=True)
+            st.dataframe(pd.Series(evento["memoria_mb"], name="MB"), use_container_width=True)
+            estado = cache_resultados().estado()
+            st.caption(f"Cache de resultados: {estado['entradas']} entradas, {estado['mb']:,.1f} / {estado['max_mb']:,.0f} MB "
+                       f"({estado['hits']} aciertos, {estado['misses']} fallos)")
+            if arranque["error"]:
+                precalentamiento = f"falló ({arranque['error']})"
+            elif arranque["fin"]:
+                precalentamiento = f"{arranque['fin'] - arranque['inicio']:,.1f} s"
+            else:
+                precalentamiento = "en curso" if os.environ.get("BCRA_PRECALENTAR", "1") != "0" else "desactivado"
+            st.caption(f"Arranque de la sesión: login en {st.session_state.get('login_ms', 0):,.0f} ms, primera tabla en "
+                       f"{st.session_state.get('primera_tabla_ms', 0):,.0f} ms · precalentamiento del proceso: {precalentamiento}")
 
 
 
@@ -693,4 +1053,9 @@ if st.session_state["authentication_status"]:
 elif st.session_state["authentication_status"] is False:
     st.error('Usuario o contraseña incorrectos')
 elif st.session_state["authentication_status"] is None:
-    st.warning('Por favor, ingrese sus credenciales')
\ No newline at end of file
+    st.warning('Por favor, ingrese sus credenciales')
+
+if not st.session_state["authentication_status"]:
+    # Pantalla de login: la recarga también se registra, con el tiempo hasta mostrar el formulario
+    evento = tel.cerrar()
+    st.session_state.setdefault("login_ms", evento["secciones_ms"]["login"])
\ No newline at end of file
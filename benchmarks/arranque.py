@@ -0,0 +1,105 @@
+# Tiempo de arranque de la app (app.py) en un proceso nuevo, con AppTest y datos sintéticos:
+#   login_ms:          desde que arranca el proceso hasta que el formulario de login está dibujado
+#   primera_tabla_ms:  en la recarga que sigue al login, hasta que se dibuja la tabla del balance
+#   primera_recarga_ms: esa recarga completa (todas las secciones)
+# Entre el login y la recarga autenticada se esperan --espera segundos (lo que tarda el usuario en
+# escribir la contraseña): con el precalentamiento, los datos se cargan en ese intervalo. Se mide con
+# y sin precalentamiento (BCRA_PRECALENTAR) y con el cache Parquet vacío (arranque en frío).
+#
+#   python benchmarks/arranque.py                       # escala chico, 3 s de espera
+#   python benchmarks/arranque.py --escala mediano --espera 5
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+INICIO = time.perf_counter()  # Antes de importar Streamlit: cuenta el costo de los imports
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIR)
+RESULTADOS = os.path.join(DIR, "arranque.jsonl")
+sys.path.insert(0, DIR)
+from bench import DATOS, escala_a_tupla, pico_memoria_mb, version_git  # noqa: E402
+
+
+def medir(espera):
+    # Corre dentro del proceso hijo, con BCRA_MANIFIESTO y BCRA_CACHE_DIR ya fijados
+    import yaml
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(RAIZ)  # app.py lee config.yaml del directorio actual
+    with open("config.yaml", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    usuario = config.get("admins", [None])[0] or next(iter(config["credentials"]["usernames"]))
+
+    at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=600)
+    at.run()
+    resultado = {"login_ms": round((time.perf_counter() - INICIO) * 1000, 1)}
+    assert not at.exception, [e.value for e in at.exception]
+    assert len(at.text_input) >= 2, "No se dibujó el formulario de login"
+
+    time.sleep(espera)
+    at.session_state["authentication_status"] = True
+    at.session_state["name"] = config["credentials"]["usernames"][usuario]["name"]
+    at.session_state["username"] = usuario
+    inicio = time.perf_counter()
+    at.run()
+    resultado["primera_recarga_ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+    assert not at.exception, [e.value for e in at.exception]
+    resultado["primera_tabla_ms"] = at.session_state["primera_tabla_ms"]
+    resultado["memoria_pico_mb"] = pico_memoria_mb()
+    return resultado
+
+
+def correr(manifiesto, espera, precalentar):
+    with tempfile.TemporaryDirectory() as cache:
+        # PYTHONPATH: como `streamlit run`, que deja la carpeta de la app en sys.path (AppTest la agrega
+        # solo mientras corre el script, y el precalentamiento importa los módulos desde otro hilo)
+        entorno = {**os.environ, "BCRA_MANIFIESTO": manifiesto, "BCRA_CACHE_DIR": cache, "PYTHONPATH": RAIZ,
+                   "BCRA_PRECALENTAR": "1" if precalentar else "0", "BCRA_TELEMETRIA_LOG": os.devnull}
+        proceso = subprocess.run([sys.executable, __file__, "--medir", "--espera", str(espera)],
+                                 env=entorno, capture_output=True, text=True)
+    if proceso.returncode != 0:
+        sys.exit(f"Falló la medición:\n{proceso.stderr}")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo hasta el login y hasta la primera tabla de la app")
+    parser.add_argument("--escala", default="chico", help="chico, mediano, grande o BANCOSxCUENTASxMESES")
+    parser.add_argument("--espera", type=float, default=3.0, help="Segundos entre el login y la recarga autenticada")
+    parser.add_argument("--no-guardar", action="store_true", help="No agregar la corrida a arranque.jsonl")
+    parser.add_argument("--medir", action="store_true", help=argparse.SUPPRESS)  # Uso interno: proceso hijo
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.espera)))
+        return
+
+    from generar_datos import generar
+    bancos, cuentas, meses = escala_a_tupla(args.escala)
+    carpeta = os.path.join(DATOS, f"{bancos}x{cuentas}x{meses}")
+    manifiesto = os.path.join(carpeta, "manifiesto.yaml")
+    if not os.path.exists(manifiesto):
+        generar(carpeta, bancos, cuentas, meses)
+
+    print(f"== {args.escala} ({bancos} bancos x {cuentas} cuentas x {meses} meses), {args.espera:g} s de espera")
+    metricas = {}
+    for precalentar in (True, False):
+        variante = "con_precalentamiento" if precalentar else "sin_precalentamiento"
+        metricas[variante] = correr(manifiesto, args.espera, precalentar)
+        print(f"  {variante:<22} " + "  ".join(f"{k} {v:>10,.1f}" for k, v in metricas[variante].items()))
+
+    if not args.no_guardar:
+        registro = {"fecha": datetime.now().isoformat(timespec="seconds"), "commit": version_git(),
+                    "escala": args.escala, "espera_s": args.espera, "metricas": metricas}
+        with open(RESULTADOS, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
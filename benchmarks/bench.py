@@ -0,0 +1,188 @@
+# Benchmarks del núcleo de análisis (analitica.py) con datos sintéticos, sin red ni Streamlit.
+# Mide por escala: carga en frío (TXT -> Parquet), carga con cache, comparativo / Var. %,
+# evolución (groupby), market share, una "recarga de página" completa y el pico de memoria.
+#
+#   python benchmarks/bench.py                          # escalas chico y mediano
+#   python benchmarks/bench.py --escalas grande --repeticiones 3
+#   python benchmarks/bench.py --escalas 40x500x12      # BANCOSxCUENTASxMESES
+#
+# Cada escala corre en un proceso aparte (el pico de memoria no se mezcla entre escalas).
+# Los resultados se agregan a benchmarks/resultados.jsonl y se comparan contra la corrida
+# anterior de la misma escala: lo que empeora más que --umbral se marca con ⚠️.
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import statistics
+import subprocess
+import argparse
+import tempfile
+from datetime import datetime
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIR)
+RESULTADOS = os.path.join(DIR, "resultados.jsonl")
+DATOS = os.path.join(DIR, ".datos")  # Archivos generados, se reusan entre corridas
+
+ESCALAS = {
+    "chico": (20, 200, 6),
+    "mediano": (80, 1000, 12),
+    "grande": (80, 3000, 24),  # Del orden del sistema financiero real
+}
+
+
+def escala_a_tupla(escala):
+    if escala in ESCALAS:
+        return ESCALAS[escala]
+    return tuple(int(x) for x in escala.split("x"))
+
+
+def cronometrar(funcion, repeticiones):
+    # Mínimo y mediana en milisegundos
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return {"min_ms": round(min(tiempos), 2), "mediana_ms": round(statistics.median(tiempos), 2)}
+
+
+def pico_memoria_mb():
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def medir(manifiesto, repeticiones):
+    # Corre dentro del proceso hijo, con BCRA_CACHE_DIR apuntando a un directorio vacío
+    sys.path.insert(0, RAIZ)
+    import analitica as an
+
+    urls = tuple(an.cargar_manifiesto(manifiesto).values())
+    resultado = {}
+
+    inicio = time.perf_counter()
+    datos, fallidos = an.cargar_datos(urls)
+    resultado["carga_fria"] = {"ms": round((time.perf_counter() - inicio) * 1000, 2)}
+    resultado["memoria_pico_carga_mb"] = pico_memoria_mb()
+    assert not fallidos, fallidos
+    resultado["carga_con_cache"] = cronometrar(lambda: an.cargar_datos(urls), repeticiones)
+
+    hechos, bancos, cuentas = datos["hechos"], datos["bancos"], datos["cuentas"]
+    resultado["filas"] = len(hechos)
+    resultado["datos_mb"] = round(sum(v.memory_usage(deep=True).sum() for v in (hechos, bancos, cuentas)) / 2**20, 1)
+
+    # Selección típica de la página: los 10 bancos más grandes, 10 cuentas, todo el rango
+    fechas = datos["periodos"].index
+    desde, hasta = int(fechas.min()), int(fechas.max())
+    ids = hechos[hechos["Fecha"] == hasta].groupby("ID")["Saldo_Act"].sum().nlargest(10).index
+    codigos = cuentas.index[cuentas["Vista"] == "Vista Subtotales"][:10]
+    todos = bancos.index
+
+    for comparar in an.COMPARACIONES:
+        clave = "comparativo_" + comparar.lower().replace(" ", "_")
+        resultado[clave] = cronometrar(lambda: an.filtrar_balance(
+            an.armar_comparativo(datos, todos, hasta, comparar, desde)[0], "Todo"), repeticiones)
+    resultado["evolucion_consolidada"] = cronometrar(lambda: an.armar_evolucion(datos, ids, codigos, desde, hasta), repeticiones)
+    resultado["evolucion_detalle"] = cronometrar(lambda: an.armar_evolucion(datos, ids, codigos, desde, hasta, False), repeticiones)
+
+    def market_share():
+        df_ms = an.armar_market_share(datos, ids, codigos, desde, hasta)
+        an.tabla_market_share(df_ms)
+        an.variacion_share(df_ms)
+    resultado["market_share"] = cronometrar(market_share, repeticiones)
+
+    def pagina():
+        # Lo que recalcula una recarga de la app con los filtros de arriba
+        df_comp, _ = an.armar_comparativo(datos, ids, hasta)
+        an.filtrar_balance(df_comp, "Todo", codigos_sel=[str(c) for c in codigos])
+        an.armar_evolucion(datos, ids, codigos, desde, hasta)
+        market_share()
+    resultado["recarga_pagina"] = cronometrar(pagina, repeticiones)
+    resultado["memoria_pico_mb"] = pico_memoria_mb()
+    return resultado
+
+
+def version_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def correr_escala(escala, repeticiones):
+    # Genera (o reusa) los archivos y mide en un proceso nuevo con el cache Parquet vacío
+    sys.path.insert(0, DIR)
+    from generar_datos import generar
+
+    bancos, cuentas, meses = escala_a_tupla(escala)
+    carpeta = os.path.join(DATOS, f"{bancos}x{cuentas}x{meses}")
+    manifiesto = os.path.join(carpeta, "manifiesto.yaml")
+    if not os.path.exists(manifiesto):
+        generar(carpeta, bancos, cuentas, meses)
+
+    with tempfile.TemporaryDirectory() as cache:
+        proceso = subprocess.run(
+            [sys.executable, __file__, "--medir", manifiesto, "--repeticiones", str(repeticiones)],
+            env={**os.environ, "BCRA_CACHE_DIR": cache}, capture_output=True, text=True)
+    if proceso.returncode != 0:
+        sys.exit(f"Falló la escala {escala}:\n{proceso.stderr}")
+    return {"escala": escala, "bancos": bancos, "cuentas": cuentas, "meses": meses, **json.loads(proceso.stdout)}
+
+
+def tiempo(valor):
+    # Valor que se compara entre corridas: el mínimo si se repitió (es el menos ruidoso)
+    return valor.get("min_ms", valor.get("ms")) if isinstance(valor, dict) else valor
+
+
+def comparar_con_anterior(actual, umbral):
+    anteriores = []
+    if os.path.exists(RESULTADOS):
+        with open(RESULTADOS, encoding="utf-8") as f:
+            anteriores = [json.loads(linea) for linea in f if linea.strip()]
+    anterior = next((r for r in reversed(anteriores) if r["escala"] == actual["escala"]), None)
+
+    print(f"\n== {actual['escala']} ({actual['bancos']} bancos x {actual['cuentas']} cuentas x {actual['meses']} meses, {actual['filas']:,} filas)")
+    for metrica, valor in actual["metricas"].items():
+        linea = f"  {metrica:<40} {tiempo(valor):>12,.2f}"
+        if anterior and metrica in anterior["metricas"]:
+            previo = tiempo(anterior["metricas"][metrica])
+            cambio = (tiempo(valor) - previo) / previo * 100 if previo else 0
+            linea += f"   antes {previo:>12,.2f}  {cambio:+6.1f}%" + ("  ⚠️" if cambio > umbral else "")
+        print(linea)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del núcleo de análisis con datos sintéticos")
+    parser.add_argument("--escalas", nargs="*", default=["chico", "mediano"], help=f"{', '.join(ESCALAS)} o BANCOSxCUENTASxMESES")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--umbral", type=float, default=10.0, help="%% de empeoramiento que se marca como regresión")
+    parser.add_argument("--no-guardar", action="store_true", help="No agregar la corrida a resultados.jsonl")
+    parser.add_argument("--medir", help=argparse.SUPPRESS)  # Uso interno: proceso hijo
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.medir, args.repeticiones)))
+        return
+
+    import numpy, pandas, pyarrow
+    entorno = {"python": platform.python_version(), "pandas": pandas.__version__, "numpy": numpy.__version__,
+               "pyarrow": pyarrow.__version__, "maquina": platform.node(), "cpus": os.cpu_count()}
+    for escala in args.escalas:
+        medido = correr_escala(escala, args.repeticiones)
+        metricas = {k: v for k, v in medido.items() if k not in ("escala", "bancos", "cuentas", "meses", "filas")}
+        registro = {"fecha": datetime.now().isoformat(timespec="seconds"), "commit": version_git(),
+                    "escala": escala, "bancos": medido["bancos"], "cuentas": medido["cuentas"],
+                    "meses": medido["meses"], "filas": medido["filas"], "repeticiones": args.repeticiones,
+                    "entorno": entorno, "metricas": metricas}
+        comparar_con_anterior(registro, args.umbral)
+        if not args.no_guardar:
+            with open(RESULTADOS, "a", encoding="utf-8") as f:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# Prueba de carga de la app (app.py): muchas sesiones a la vez sobre datos sintéticos locales.
+# Cada sesión es un AppTest en su propio hilo, dentro de un mismo proceso, como las sesiones de un
+# servidor de Streamlit: comparten st.cache_resource (el almacén de datos) y el GIL. Cada sesión
+# repite un guion de uso (elegir bancos, cambiar el periodo, elegir cuentas, mover el rango de
+# análisis) y se mide cada recarga. Para cada nivel de concurrencia, en un proceso nuevo:
+#   p50_ms / p95_ms:   latencia de las recargas (en total y por paso del guion)
+#   recargas_s:        recargas completadas por segundo entre todas las sesiones
+#   memoria_base_mb:   pico de memoria del proceso con los datos ya cargados (una sesión de calentamiento)
+#   memoria_pico_mb:   pico de memoria al terminar; mb_por_sesion = (pico - base) / sesiones
+#
+#   python benchmarks/carga.py                             # escala chico, 1, 2, 4 y 8 sesiones
+#   python benchmarks/carga.py --sesiones 1 4 16 --ciclos 5 --pausa 0.5
+#   python benchmarks/carga.py --escala mediano --motor duckdb
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+RAIZ = os.path.dirname(DIR)
+RESULTADOS = os.path.join(DIR, "carga.jsonl")
+sys.path.insert(0, DIR)
+from bench import DATOS, escala_a_tupla, pico_memoria_mb, version_git  # noqa: E402
+
+PASOS = ("bancos", "periodo", "cuentas", "rango")
+
+
+def runtime_compartido():
+    # AppTest crea un Runtime simulado en cada corrida y al terminar lo borra (Runtime._instance = None):
+    # con varias sesiones en hilos, una lo borraría mientras otra está corriendo. También compila app.py
+    # en cada corrida con un ScriptCache nuevo, y compilar desde varios hilos a la vez falla. Como en un
+    # servidor, todas las sesiones usan el mismo Runtime y el mismo ScriptCache (app.py se compila una vez)
+    from unittest.mock import MagicMock
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = app_test.MediaFileManager(app_test.MemoryMediaFileStorage("/mock/media"))
+    runtime.dataframe_source_mgr = app_test.DataframeSourceManager()
+    runtime.cache_storage_manager = app_test.MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    script_cache = app_test.ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script_cache
+    # Cada corrida de AppTest fija global.appTest y al salir restaura el valor anterior: si ya vale
+    # True, el orden en que terminan las sesiones no importa
+    config.set_option("global.appTest", True)
+
+
+def percentiles(tiempos):
+    import numpy as np
+    if not tiempos:
+        return {"n": 0}
+    p50, p95 = np.percentile(tiempos, [50, 95])
+    return {"n": len(tiempos), "p50_ms": round(float(p50), 1), "p95_ms": round(float(p95), 1),
+            "max_ms": round(max(tiempos), 1)}
+
+
+class Sesion:
+    def __init__(self, numero, config, usuario):
+        from streamlit.testing.v1 import AppTest
+        self.numero = numero
+        self.azar = random.Random(numero)  # Cada sesión sigue su propio guion, reproducible
+        self.at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=600)
+        self.at.session_state["authentication_status"] = True
+        self.at.session_state["name"] = config["credentials"]["usernames"][usuario]["name"]
+        self.at.session_state["username"] = usuario
+        self.tiempos = {paso: [] for paso in PASOS}
+        self.errores = []
+
+    def recargar(self, paso, widget):
+        # widget ya tiene el valor nuevo: run() manda la interacción y espera la recarga completa
+        inicio = time.perf_counter()
+        widget.run()
+        ms = (time.perf_counter() - inicio) * 1000
+        if self.at.exception:
+            self.errores.append(f"{paso}: {self.at.exception[0].value}")
+        else:
+            self.tiempos[paso].append(ms)
+
+    def abrir(self):
+        self.at.run()
+        if self.at.exception:
+            raise RuntimeError(f"La sesión {self.numero} no pudo abrir la app: {self.at.exception[0].value}")
+
+    def ciclo(self, pausa):
+        # Un recorrido del guion; entre paso y paso, `pausa` segundos (lo que tarda el usuario en decidir)
+        azar, at = self.azar, self.at
+        for paso in PASOS:
+            if paso == "bancos":
+                widget = at.multiselect(key="bancos_sel")
+                widget.set_value(azar.sample(widget.options, min(len(widget.options), azar.randint(1, 4))))
+            elif paso == "periodo":
+                widget = at.selectbox(key="periodo_sel")
+                widget.set_value(azar.choice(widget.options))
+            elif paso == "cuentas":
+                widget = next(w for w in at.multiselect if w.label == "🔢 Seleccionar Cuentas:")
+                if not widget.options:
+                    continue  # Periodo sin cuentas con los filtros actuales
+                widget.set_value(azar.sample(widget.options, min(len(widget.options), azar.randint(1, 3))))
+            else:
+                widget = at.select_slider(key="rango_analisis")
+                desde, hasta = sorted(azar.sample(range(len(widget.options)), 2))
+                widget.set_range(widget.options[desde], widget.options[hasta])
+            self.recargar(paso, widget)
+            if pausa:
+                time.sleep(pausa * azar.uniform(0.5, 1.5))
+
+
+def medir(sesiones, ciclos, pausa):
+    # Corre dentro del proceso hijo, con BCRA_MANIFIESTO y BCRA_CACHE_DIR ya fijados
+    import yaml
+
+    os.chdir(RAIZ)  # app.py lee config.yaml del directorio actual
+    with open("config.yaml", encoding="utf-8") as f:
+        config = yaml.safe_load(f)
+    usuario = config.get("admins", [None])[0] or next(iter(config["credentials"]["usernames"]))
+    runtime_compartido()
+
+    # Calentamiento: una sesión carga los datos, así las demás miden recargas y no la primera carga
+    inicio = time.perf_counter()
+    Sesion(-1, config, usuario).abrir()
+    resultado = {"calentamiento_ms": round((time.perf_counter() - inicio) * 1000, 1),
+                 "memoria_base_mb": pico_memoria_mb()}
+
+    todas = [Sesion(i, config, usuario) for i in range(sesiones)]
+    # El reloj arranca cuando todas las sesiones abrieron la app y largan juntas
+    largada_en = []
+    largada = threading.Barrier(sesiones, action=lambda: largada_en.append(time.perf_counter()))
+    fallas = []
+
+    def usar(sesion):
+        try:
+            sesion.abrir()
+            largada.wait()
+            for _ in range(ciclos):
+                sesion.ciclo(pausa)
+        except Exception as e:
+            largada.abort()
+            fallas.append(f"sesión {sesion.numero}: {e!r}")
+
+    hilos = [threading.Thread(target=usar, args=(s,), name=f"sesion-{s.numero}") for s in todas]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    if fallas:
+        raise RuntimeError("; ".join(fallas))
+    duracion = time.perf_counter() - largada_en[0]
+
+    tiempos = [t for s in todas for paso in PASOS for t in s.tiempos[paso]]
+    resultado.update(percentiles(tiempos))
+    resultado["recargas_s"] = round(len(tiempos) / duracion, 2)
+    resultado["por_paso"] = {paso: percentiles([t for s in todas for t in s.tiempos[paso]]) for paso in PASOS}
+    resultado["errores"] = [e for s in todas for e in s.errores][:10]
+    resultado["memoria_pico_mb"] = pico_memoria_mb()
+    resultado["mb_por_sesion"] = round((resultado["memoria_pico_mb"] - resultado["memoria_base_mb"]) / sesiones, 1)
+    return resultado
+
+
+def correr(manifiesto, cache, motor, sesiones, ciclos, pausa):
+    # Un proceso nuevo por nivel de concurrencia: la memoria y los caches de Streamlit no se arrastran
+    # de un nivel al otro. El cache Parquet (BCRA_CACHE_DIR) sí se comparte: solo afecta al calentamiento
+    entorno = {**os.environ, "BCRA_MANIFIESTO": manifiesto, "BCRA_CACHE_DIR": cache, "PYTHONPATH": RAIZ,
+               "BCRA_MOTOR": motor, "BCRA_PRECALENTAR": "0", "BCRA_TELEMETRIA_LOG": os.devnull}
+    proceso = subprocess.run([sys.executable, __file__, "--medir", "--sesiones", str(sesiones),
+                              "--ciclos", str(ciclos), "--pausa", str(pausa)],
+                             env=entorno, capture_output=True, text=True)
+    if proceso.returncode != 0:
+        sys.exit(f"Falló la medición con {sesiones} sesiones:\n{proceso.stderr}")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia, throughput y memoria de la app con sesiones concurrentes")
+    parser.add_argument("--escala", default="chico", help="chico, mediano, grande o BANCOSxCUENTASxMESES")
+    parser.add_argument("--sesiones", type=int, nargs="+", default=[1, 2, 4, 8], help="Niveles de concurrencia")
+    parser.add_argument("--ciclos", type=int, default=3, help="Veces que cada sesión recorre el guion")
+    parser.add_argument("--pausa", type=float, default=0.0, help="Segundos (promedio) entre interacciones")
+    parser.add_argument("--motor", default="pandas", choices=["pandas", "duckdb"], help="BCRA_MOTOR de la app")
+    parser.add_argument("--no-guardar", action="store_true", help="No agregar la corrida a carga.jsonl")
+    parser.add_argument("--medir", action="store_true", help=argparse.SUPPRESS)  # Uso interno: proceso hijo
+    args = parser.parse_args()
+
+    if args.medir:
+        print(json.dumps(medir(args.sesiones[0], args.ciclos, args.pausa)))
+        return
+
+    from generar_datos import generar
+    bancos, cuentas, meses = escala_a_tupla(args.escala)
+    carpeta = os.path.join(DATOS, f"{bancos}x{cuentas}x{meses}")
+    manifiesto = os.path.join(carpeta, "manifiesto.yaml")
+    if not os.path.exists(manifiesto):
+        generar(carpeta, bancos, cuentas, meses)
+
+    print(f"== {args.escala} ({bancos} bancos x {cuentas} cuentas x {meses} meses), motor {args.motor}, "
+          f"{args.ciclos} ciclos de {len(PASOS)} pasos, pausa {args.pausa:g} s")
+    metricas = {}
+    with tempfile.TemporaryDirectory() as cache:
+        for sesiones in args.sesiones:
+            m = correr(manifiesto, cache, args.motor, sesiones, args.ciclos, args.pausa)
+            metricas[str(sesiones)] = m
+            print(f"  {sesiones:>3} sesiones  p50 {m.get('p50_ms', 0):>8,.1f} ms  p95 {m.get('p95_ms', 0):>8,.1f} ms  "
+                  f"{m['recargas_s']:>6,.2f} recargas/s  pico {m['memoria_pico_mb']:>7,.1f} MB  "
+                  f"({m['mb_por_sesion']:,.1f} MB/sesión)")
+            for error in m["errores"]:
+                print(f"      ⚠️ {error}")
+
+    if not args.no_guardar:
+        registro = {"fecha": datetime.now().isoformat(timespec="seconds"), "commit": version_git(),
+                    "escala": args.escala, "motor": args.motor, "ciclos": args.ciclos, "pausa_s": args.pausa,
+                    "metricas": metricas}
+        with open(RESULTADOS, "a", encoding="utf-8") as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Generador de archivos COMPLETO_MMAAAA.TXT sintéticos, con el mismo formato que publica el BCRA
+# (separados por tab, latin-1, textos entre comillas) y un manifiesto.yaml que apunta a ellos.
+# Escala en bancos x cuentas x meses; con la misma semilla genera siempre los mismos archivos.
+#
+#   python benchmarks/generar_datos.py --bancos 80 --cuentas 3000 --meses 24 --salida /tmp/bcra
+#   BCRA_MANIFIESTO=/tmp/bcra/manifiesto.yaml streamlit run app.py
+import os
+import csv
+import argparse
+import numpy as np
+import pandas as pd
+import yaml
+
+# Rubros (dos primeros dígitos del código) como los de la dimensión de cuentas
+RUBROS = ["11", "12", "13", "14", "15", "16", "17", "18", "19", "21", "22", "23",
+          "31", "32", "33", "34", "35", "36", "41", "42", "43", "44", "45", "46",
+          "51", "52", "53", "54", "55", "56", "57", "58", "59", "61", "62", "65", "71", "72"]
+
+
+def generar_codigos(n):
+    # Códigos jerárquicos de 6 dígitos repartidos entre los rubros: el totalizador XX0000,
+    # subtotales XXY000 y cuentas de detalle XXYZZZ (como en el plan de cuentas real)
+    por_rubro = [n // len(RUBROS) + (i < n % len(RUBROS)) for i in range(len(RUBROS))]
+    codigos = []
+    for rubro, k in zip(RUBROS, por_rubro):
+        if k == 0:
+            continue
+        codigos.append(int(rubro + "0000"))
+        for j in range(k - 1):
+            sub, hoja = j // 100 % 9 + 1, j % 100
+            codigos.append(int(f"{rubro}{sub}{hoja:03d}"))
+    return sorted(set(codigos))
+
+
+def fechas_desde(desde, meses):
+    # AAAAMM consecutivos a partir de `desde`
+    anio, mes = divmod(desde, 100)
+    fechas = []
+    for _ in range(meses):
+        fechas.append(anio * 100 + mes)
+        anio, mes = (anio + 1, 1) if mes == 12 else (anio, mes + 1)
+    return fechas
+
+
+def generar(salida, bancos=20, cuentas=200, meses=6, desde=202401, semilla=0):
+    # Escribe un TXT por mes y el manifiesto. Devuelve la ruta del manifiesto.
+    os.makedirs(salida, exist_ok=True)
+    rng = np.random.default_rng(semilla)
+    codigos = np.array(generar_codigos(cuentas))
+    ids = np.arange(1, bancos + 1) * 7  # IDs no consecutivos, como los del BCRA
+
+    # Tamaño de cada banco (muy desigual, como el sistema real) y peso de cada cuenta
+    tamanio = rng.pareto(1.2, bancos) + 1
+    peso = rng.lognormal(0, 2, len(codigos))
+    base = np.outer(tamanio, peso).ravel() * 1e6
+    # Algunos bancos no informan todas las cuentas
+    presente = rng.random(base.size) > 0.15
+
+    nombres_cuentas = pd.Series([f"CUENTA {c} - DESCRIPCIÓN" for c in codigos])
+    manifiesto = {}
+    for k, fecha in enumerate(fechas_desde(desde, meses)):
+        # Crecimiento mensual con ruido; un banco cambia de nombre a mitad de la serie
+        saldo = base * (1.03 ** k) * rng.lognormal(0, 0.05, base.size)
+        debe = np.round(saldo * rng.uniform(1.0, 1.5, base.size), 2)
+        haber = np.round(saldo - debe, 2)
+        nombres = pd.Series([f"BANCO SINTÉTICO Ñ {i:03d}" for i in range(1, bancos + 1)])
+        if k >= meses // 2:
+            nombres.iloc[0] += " S.A.U."
+
+        df = pd.DataFrame({
+            "ID": np.repeat([f"{i:05d}" for i in ids], len(codigos)),
+            "Banco": np.repeat(nombres.to_numpy(), len(codigos)),
+            "Fecha": str(fecha),
+            "Codigo": np.tile(codigos.astype(str), bancos),
+            "Cuenta": np.tile(nombres_cuentas.to_numpy(), bancos),
+            "Debe": debe,
+            "Haber": haber,
+        })[presente]
+        archivo = os.path.join(salida, f"COMPLETO_{fecha % 100:02d}{fecha // 100}.TXT")
+        # Textos entre comillas, números sin comillas, separados por tab, sin encabezado
+        df.to_csv(archivo, sep="\t", header=False, index=False, encoding="latin-1",
+                  quoting=csv.QUOTE_NONNUMERIC, lineterminator="\n")
+        manifiesto[str(fecha)] = os.path.abspath(archivo)
+
+    ruta_manifiesto = os.path.join(salida, "manifiesto.yaml")
+    with open(ruta_manifiesto, "w", encoding="utf-8") as f:
+        yaml.safe_dump({"periodos": manifiesto}, f, allow_unicode=True)
+    return ruta_manifiesto
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera archivos COMPLETO_MMAAAA.TXT sintéticos")
+    parser.add_argument("--bancos", type=int, default=20)
+    parser.add_argument("--cuentas", type=int, default=200)
+    parser.add_argument("--meses", type=int, default=6)
+    parser.add_argument("--desde", type=int, default=202401, help="Primer periodo (AAAAMM)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", required=True)
+    args = parser.parse_args()
+    print(generar(args.salida, args.bancos, args.cuentas, args.meses, args.desde, args.semilla))
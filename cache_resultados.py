@@ -0,0 +1,76 @@
+# Cache LRU de resultados ya calculados (tablas y figuras), compartido entre sesiones y acotado
+# por memoria: cuando la suma estimada de lo guardado pasa el máximo, se descartan las entradas
+# usadas hace más tiempo. La app guarda una sola instancia con st.cache_resource.
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+def estimar_bytes(objeto):
+    # Tamaño aproximado en memoria de DataFrames, arrays, figuras de plotly y contenedores de ellos
+    if objeto is None:
+        return 0
+    if isinstance(objeto, dict):
+        return sum(estimar_bytes(v) for v in objeto.values())
+    if isinstance(objeto, (list, tuple)):
+        return sum(estimar_bytes(v) for v in objeto)
+    if isinstance(objeto, pd.DataFrame):
+        return int(objeto.memory_usage(deep=True).sum())
+    if isinstance(objeto, (pd.Series, pd.Index)):
+        return int(objeto.memory_usage(deep=True))
+    if isinstance(objeto, np.ndarray):
+        return objeto.nbytes
+    if hasattr(objeto, "data") and hasattr(objeto, "layout"):
+        # Figura de plotly: lo que pesa son los valores de cada traza
+        return sum(_bytes_valores(np.asarray(traza[campo])) for traza in objeto.data
+                   for campo in ("x", "y", "labels", "values", "text", "customdata")
+                   if campo in traza and traza[campo] is not None)
+    return 64  # Escalares, textos cortos
+
+
+def _bytes_valores(valores):
+    # Arrays de texto (object): se cuentan los caracteres además de los punteros
+    if valores.dtype == object:
+        return valores.nbytes + sum(len(str(v)) for v in valores.ravel())
+    return valores.nbytes
+
+
+class CacheLRU:
+    def __init__(self, max_mb=256):
+        self.max_bytes = int(max_mb * 2**20)
+        self._entradas = OrderedDict()  # clave -> (valor, bytes), de la menos a la más usada
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def obtener(self, clave, calcular):
+        # Devuelve (valor, acierto). Si la clave no está, se calcula fuera del lock (dos sesiones
+        # pueden calcular lo mismo a la vez; se guarda el primero) y se guarda si entra en el máximo.
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                self.hits += 1
+                return self._entradas[clave][0], True
+            self.misses += 1
+
+        valor = calcular()
+        tamanio = estimar_bytes(valor)
+        with self._lock:
+            if clave not in self._entradas and tamanio <= self.max_bytes:
+                self._entradas[clave] = (valor, tamanio)
+                self._bytes += tamanio
+                while self._bytes > self.max_bytes:
+                    _, (_, liberado) = self._entradas.popitem(last=False)
+                    self._bytes -= liberado
+        return valor, False
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._bytes = 0
+
+    def estado(self):
+        with self._lock:
+            return {"entradas": len(self._entradas), "mb": self._bytes / 2**20, "max_mb": self.max_bytes / 2**20,
+                    "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,196 @@
+# Exportación de tablas a Excel y CSV escribiendo por bloques de filas. El libro se arma con
+# openpyxl en modo write_only (cada fila se vuelca al archivo al agregarla, no queda el libro
+# entero en memoria) y el CSV se escribe de a FILAS_BLOQUE filas. La exportación completa (todos
+# los bancos, todos los periodos) se arma periodo por periodo en un hilo de fondo y deja el
+# archivo en el cache, así no bloquea la sesión que la pidió.
+import io
+import os
+import logging
+import tempfile
+import threading
+from datetime import datetime
+import pandas as pd
+from openpyxl import Workbook
+import analitica as an
+
+logger = logging.getLogger("bcra.exportar")
+
+FILAS_BLOQUE = 50_000          # Filas que se convierten / escriben por vez
+MAX_FILAS_EXCEL = 1_048_575    # Filas de datos que entran en una hoja (sin el encabezado)
+EXPORTACIONES = os.path.join(an.CACHE_DIR, "exportaciones")
+EXPORTACIONES_GUARDADAS = 3    # Exportaciones completas que se conservan en el cache
+COLUMNAS_COMPLETA = ["Periodo", "ID", "Banco", "Codigo", "Cuenta", "Nivel_0", "Nivel_1", "Nivel_2",
+                     "Debe", "Haber", "Saldo_Act"]
+FORMATOS = {"xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "csv": "text/csv"}
+
+
+def filas(df):
+    # Filas como tuplas de valores de Python (NaN -> celda vacía), convertidas de a FILAS_BLOQUE
+    for inicio in range(0, len(df), FILAS_BLOQUE):
+        bloque = df.iloc[inicio:inicio + FILAS_BLOQUE].astype(object)
+        yield from bloque.where(bloque.notna(), None).itertuples(index=False, name=None)
+
+
+def nombre_hoja(nombre, parte=1):
+    # Excel no acepta []:*?/\ en el nombre de la hoja y lo corta en 31 caracteres
+    nombre = "".join(c for c in str(nombre) if c not in "[]:*?/\\")[:31 - 4 * (parte > 1)]
+    return nombre if parte == 1 else f"{nombre} ({parte})"
+
+
+def escribir_excel(destino, hojas):
+    # hojas: iterable de (nombre, DataFrame). Si una tabla no entra en una hoja sigue en "nombre (2)", ...
+    libro = Workbook(write_only=True)
+    for nombre, df in hojas:
+        encabezado = [str(c) for c in df.columns]
+        hoja, parte = None, 0
+        for n, fila in enumerate(filas(df)):
+            if n % MAX_FILAS_EXCEL == 0:
+                parte += 1
+                hoja = libro.create_sheet(nombre_hoja(nombre, parte))
+                hoja.freeze_panes = "A2"
+                hoja.append(encabezado)
+            hoja.append(fila)
+        if hoja is None:  # Tabla vacía: solo el encabezado
+            libro.create_sheet(nombre_hoja(nombre)).append(encabezado)
+    if not libro.sheetnames:
+        libro.create_sheet("Datos")
+    libro.save(destino)
+
+
+def escribir_csv(destino, bloques):
+    # destino: archivo binario; bloques: iterable de DataFrames con las mismas columnas (un encabezado)
+    texto = io.TextIOWrapper(destino, encoding="utf-8-sig", newline="")
+    encabezado = True
+    for df in bloques:
+        for inicio in range(0, max(len(df), 1), FILAS_BLOQUE):
+            df.iloc[inicio:inicio + FILAS_BLOQUE].to_csv(texto, header=encabezado, index=False)
+            encabezado = False
+    texto.flush()
+    texto.detach()  # El archivo lo cierra quien lo abrió
+
+
+def a_bytes(escribir, contenido):
+    # Para st.download_button: se escribe en un temporal (en disco si pasa los 32 MB) y se devuelve
+    with tempfile.SpooledTemporaryFile(max_size=32 * 2**20) as f:
+        escribir(f, contenido)
+        f.seek(0)
+        return f.read()
+
+
+def tabla_a_excel(df, nombre="Datos", index=False):
+    return a_bytes(escribir_excel, [(nombre, df.reset_index() if index else df)])
+
+
+def tabla_a_csv(df, index=False):
+    return a_bytes(escribir_csv, [df.reset_index() if index else df])
+
+
+# --- EXPORTACIÓN COMPLETA (todos los bancos, todos los periodos) ---
+def periodos_completos(rutas):
+    # (Fecha, DataFrame) por periodo con todas las filas, leyendo un Parquet del cache por vez.
+    # Bancos y cuentas llevan el último nombre conocido, como en la app. Devuelve (cantidad, generador).
+    nombres_bancos, nombres_cuentas, fechas_archivo = [], [], {}
+    for ruta in rutas:
+        df = pd.read_parquet(ruta, columns=["Fecha", "ID", "Banco", "Codigo", "Cuenta"])
+        nombres_bancos.append(df[["Fecha", "ID", "Banco"]].drop_duplicates())
+        nombres_cuentas.append(df[["Fecha", "Codigo", "Cuenta"]].drop_duplicates())
+        fechas_archivo[ruta] = sorted(df["Fecha"].unique())
+    fechas = sorted({f for fs in fechas_archivo.values() for f in fs})
+    if not fechas:
+        return 0, iter(())
+    bancos = (pd.concat(nombres_bancos).sort_values("Fecha", kind="stable")
+              .drop_duplicates("ID", keep="last").set_index("ID")[["Banco"]])
+    cuentas = (pd.concat(nombres_cuentas).sort_values("Fecha", kind="stable")
+               .drop_duplicates("Codigo", keep="last").set_index("Codigo")[["Cuenta"]].sort_index())
+    dimensiones = {"bancos": bancos, "cuentas": an.clasificar_cuentas(cuentas), "periodos": an.armar_periodos(fechas)}
+
+    def generar():
+        for ruta in sorted(rutas, key=lambda r: fechas_archivo[r][0] if fechas_archivo[r] else 0):
+            hechos = (pd.read_parquet(ruta, columns=list(an.TIPOS_HECHOS)).drop_duplicates()
+                      .sort_values(["Fecha", "ID", "Codigo"]))
+            hechos["Saldo_Act"] = hechos["Debe"] + hechos["Haber"]
+            for fecha, bloque in hechos.groupby("Fecha", sort=True):
+                yield fecha, an.armar_vista(bloque, dimensiones)[COLUMNAS_COMPLETA]
+    return len(fechas), generar()
+
+
+def exportar_completo(urls, formato, carpeta=EXPORTACIONES, progreso=None):
+    # Escribe la exportación completa de `urls` (una hoja por periodo en Excel, un solo CSV) y devuelve
+    # la ruta. El nombre lleva la versión de los datos: si ya existe, se reutiliza sin rearmarla.
+    rutas, fallidos = an.leer_archivos(urls)
+    if fallidos:
+        raise RuntimeError("No se pudieron descargar: " + ", ".join(archivo for archivo, _ in fallidos))
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = os.path.join(carpeta, f"bcra_completo_{an.version_archivos(rutas)}.{formato}")
+    if os.path.exists(ruta):
+        return ruta
+
+    total, periodos = periodos_completos(rutas)
+
+    def con_progreso():
+        for listos, (fecha, df) in enumerate(periodos, start=1):
+            yield fecha, df
+            if progreso:
+                progreso(listos / max(total, 1))
+
+    fd, tmp = tempfile.mkstemp(dir=carpeta, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if formato == "xlsx":
+                escribir_excel(f, ((f"{fecha % 100:02d}-{fecha // 100}", df) for fecha, df in con_progreso()))
+            else:
+                escribir_csv(f, (df for _, df in con_progreso()))
+        os.replace(tmp, ruta)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+    # Exportaciones viejas: quedan las EXPORTACIONES_GUARDADAS más recientes
+    viejas = sorted((os.path.join(carpeta, a) for a in os.listdir(carpeta) if a.startswith("bcra_completo_")),
+                    key=os.path.getmtime, reverse=True)
+    for vieja in viejas[EXPORTACIONES_GUARDADAS:]:
+        try:
+            os.remove(vieja)
+        except OSError:
+            pass
+    return ruta
+
+
+def leer_exportacion(ruta):
+    with open(ruta, "rb") as f:
+        return f.read()
+
+
+class ExportacionesEnFondo:
+    # Una exportación completa por (urls, formato), en un hilo de fondo. La app guarda una sola
+    # instancia con st.cache_resource: si otra sesión pide la misma, ve la que ya está en curso.
+    def __init__(self, carpeta=EXPORTACIONES):
+        self.carpeta = carpeta
+        self._trabajos = {}  # (urls, formato) -> {"estado", "progreso", "ruta", "error", "inicio"}
+        self._lock = threading.Lock()
+
+    def estado(self, urls, formato):
+        with self._lock:
+            trabajo = self._trabajos.get((urls, formato))
+        if trabajo and trabajo["estado"] == "lista" and not os.path.exists(trabajo["ruta"]):
+            return None  # El archivo se borró (p. ej. al rotar las exportaciones viejas)
+        return trabajo
+
+    def iniciar(self, urls, formato):
+        with self._lock:
+            trabajo = self._trabajos.get((urls, formato))
+            if trabajo and trabajo["estado"] == "en curso":
+                return trabajo
+            trabajo = {"estado": "en curso", "progreso": 0.0, "ruta": None, "error": None, "inicio": datetime.now()}
+            self._trabajos[(urls, formato)] = trabajo
+        threading.Thread(target=self._exportar, args=(urls, formato, trabajo), daemon=True,
+                         name="bcra-exportacion").start()
+        return trabajo
+
+    def _exportar(self, urls, formato, trabajo):
+        try:
+            ruta = exportar_completo(urls, formato, self.carpeta, progreso=lambda p: trabajo.update(progreso=p))
+            trabajo.update(estado="lista", ruta=ruta, progreso=1.0)
+        except Exception as e:
+            logger.exception("Falló la exportación completa")
+            trabajo.update(estado="error", error=str(e))
@@ -0,0 +1,165 @@
+# Motor opcional para historias largas (BCRA_MOTOR=duckdb): en lugar de armar la tabla de hechos
+# en memoria, consulta con DuckDB (embebido, sin servidor) los Parquet mensuales que ya deja el
+# cache de analitica.py. Cada Parquet es un periodo, así que el filtro por Fecha descarta archivos
+# enteros (por las estadísticas de cada row group) y los de banco / código y las sumas se resuelven
+# dentro de DuckDB: a pandas vuelven solo tablas del tamaño del resultado.
+# Las dimensiones (bancos, cuentas, periodos) son chicas y se arman igual que en analitica.py.
+import threading
+import duckdb
+import numpy as np
+import pandas as pd
+import analitica as an
+
+
+def lista_sql(valores):
+    # Enteros para un IN (...): van como literales para que DuckDB pueda empujar el filtro al scan
+    valores = sorted({int(v) for v in valores})
+    return ", ".join(map(str, valores)) if valores else "NULL"
+
+
+def fecha_sql(fecha):
+    return "NULL" if fecha is None else str(int(fecha))
+
+
+class MotorDuckDB:
+    def __init__(self, rutas, memoria=None):
+        self._con = duckdb.connect()
+        self._lock = threading.Lock()
+        if memoria:
+            self._con.execute(f"SET memory_limit = '{memoria}'")
+        if rutas:
+            archivos = ", ".join("'" + r.replace("'", "''") + "'" for r in rutas)
+            origen = f"read_parquet([{archivos}])"
+        else:
+            origen = ("(SELECT 0::INTEGER AS ID, ''::VARCHAR AS Banco, 0::INTEGER AS Fecha, 0::INTEGER AS Codigo,"
+                      " ''::VARCHAR AS Cuenta, 0::DOUBLE AS Debe, 0::DOUBLE AS Haber WHERE false)")
+        self._con.execute(f"CREATE VIEW crudos AS SELECT * FROM {origen}")
+        # Mismo criterio de duplicados que armar_hechos: filas idénticas en (ID, Codigo, Fecha, Debe, Haber)
+        self._con.execute("""CREATE VIEW hechos AS
+            SELECT DISTINCT ID, Codigo, Fecha, Debe, Haber, Debe + Haber AS Saldo_Act FROM crudos""")
+
+    def consultar(self, sql):
+        # Un cursor por consulta: las sesiones de Streamlit consultan desde hilos distintos
+        with self._lock:
+            cursor = self._con.cursor()
+        try:
+            return cursor.execute(sql).df()
+        finally:
+            cursor.close()
+
+    def fechas(self):
+        return self.consultar("SELECT DISTINCT Fecha FROM crudos ORDER BY Fecha")["Fecha"].to_numpy()
+
+    def nombres(self, clave, nombre):
+        # Último nombre conocido (según la Fecha) por ID / Codigo, como en cargar_datos
+        df = self.consultar(f"SELECT {clave}, arg_max({nombre}, Fecha) AS {nombre} FROM crudos GROUP BY {clave} ORDER BY {clave}")
+        return df.astype({clave: "int32", nombre: "str"}).set_index(clave)
+
+    def codigos(self, fecha):
+        return self.consultar(f"SELECT DISTINCT Codigo FROM crudos WHERE Fecha = {fecha_sql(fecha)}")["Codigo"].to_numpy()
+
+    def comparativo(self, ids, fecha, fecha_ref):
+        # Filas de `ids` en `fecha` (columnas de hechos, con MoM / YoY) y la variación contra `fecha_ref`.
+        # Si una cuenta no existe en el periodo de referencia se toma saldo 0 (Var. % = 0).
+        fecha_mom, fecha_yoy = int(an.fecha_mes_anterior(fecha)), fecha - 100
+        ids = lista_sql(ids)
+        df = self.consultar(f"""
+            WITH actual AS (SELECT * FROM hechos WHERE Fecha = {fecha_sql(fecha)} AND ID IN ({ids})),
+            ref AS (SELECT Fecha, ID, Codigo, first(Saldo_Act) AS Saldo FROM hechos
+                    WHERE Fecha IN ({fecha_mom}, {fecha_yoy}, {fecha_sql(fecha_ref)}) AND ID IN ({ids})
+                    GROUP BY Fecha, ID, Codigo)
+            SELECT a.*,
+                   a.Saldo_Act - coalesce(m.Saldo, 0) AS Var_Abs_MoM,
+                   CASE WHEN coalesce(m.Saldo, 0) <> 0 THEN (a.Saldo_Act - m.Saldo) / abs(m.Saldo) * 100 ELSE 0 END AS Var_Pct_MoM,
+                   a.Saldo_Act - coalesce(y.Saldo, 0) AS Var_Abs_YoY,
+                   CASE WHEN coalesce(y.Saldo, 0) <> 0 THEN (a.Saldo_Act - y.Saldo) / abs(y.Saldo) * 100 ELSE 0 END AS Var_Pct_YoY,
+                   a.Saldo_Act - coalesce(r.Saldo, 0) AS Var_Abs_Ref,
+                   CASE WHEN coalesce(r.Saldo, 0) <> 0 THEN (a.Saldo_Act - r.Saldo) / abs(r.Saldo) * 100 ELSE 0 END AS Var_Pct_Ref
+            FROM actual a
+            LEFT JOIN ref m ON m.Fecha = {fecha_mom} AND m.ID = a.ID AND m.Codigo = a.Codigo
+            LEFT JOIN ref y ON y.Fecha = {fecha_yoy} AND y.ID = a.ID AND y.Codigo = a.Codigo
+            LEFT JOIN ref r ON r.Fecha = {fecha_sql(fecha_ref)} AND r.ID = a.ID AND r.Codigo = a.Codigo
+            ORDER BY a.Fecha, a.ID, a.Codigo""")
+        var_ref = (df.pop("Var_Abs_Ref").to_numpy(), df.pop("Var_Pct_Ref").to_numpy())
+        return df, var_ref
+
+    def saldos(self, ids, codigos, desde, hasta, por_cuenta=False):
+        # Saldo_Act de `ids` en `codigos` (None = sin filtro) entre desde / hasta, sumado por (Fecha, ID)
+        # o (Fecha, ID, Codigo)
+        grupo = "Fecha, ID, Codigo" if por_cuenta else "Fecha, ID"
+        filtro_ids = "" if ids is None else f"AND ID IN ({lista_sql(ids)})"
+        filtro_codigos = "" if codigos is None else f"AND Codigo IN ({lista_sql(codigos)})"
+        return self.consultar(f"""
+            SELECT {grupo}, sum(Saldo_Act) AS Saldo_Act FROM hechos
+            WHERE Fecha BETWEEN {fecha_sql(desde)} AND {fecha_sql(hasta)} {filtro_ids} {filtro_codigos}
+            GROUP BY {grupo} ORDER BY {grupo}""")
+
+    def totales(self, codigos, desde, hasta):
+        # Total del sistema (todos los bancos) en `codigos`, por Fecha
+        return self.consultar(f"""
+            SELECT Fecha, sum(Saldo_Act) AS Total_Sistema FROM hechos
+            WHERE Fecha BETWEEN {fecha_sql(desde)} AND {fecha_sql(hasta)} AND Codigo IN ({lista_sql(codigos)})
+            GROUP BY Fecha ORDER BY Fecha""")
+
+    def ranking(self, codigo, desde, hasta):
+        # Todos los bancos en `codigo` entre desde / hasta con su Ranking, mismo criterio que
+        # analitica.calcular_concentracion (|Saldo_Act| descendente, empates por ID)
+        return self.consultar(f"""
+            SELECT Fecha, ID, Saldo_Act,
+                   row_number() OVER (PARTITION BY Fecha ORDER BY abs(Saldo_Act) DESC, ID)::INTEGER AS Ranking
+            FROM hechos WHERE Fecha BETWEEN {fecha_sql(desde)} AND {fecha_sql(hasta)} AND Codigo = {int(codigo)}
+            ORDER BY Fecha, ID""")
+
+    def concentracion(self, codigos, desde, hasta):
+        # Bancos, HHI, CR3 y CR5 por (Codigo, Fecha): sin tabla de hechos en memoria no hay cubo
+        # precalculado, se resuelve con funciones de ventana sobre las cuentas pedidas
+        return self.consultar(f"""
+            WITH partes AS (
+                SELECT Codigo, Fecha,
+                       CASE WHEN sum(abs(Saldo_Act)) OVER grupo <> 0
+                            THEN abs(Saldo_Act) / sum(abs(Saldo_Act)) OVER grupo * 100 ELSE 0 END AS Share,
+                       row_number() OVER (grupo ORDER BY abs(Saldo_Act) DESC, ID) AS Puesto
+                FROM hechos
+                WHERE Fecha BETWEEN {fecha_sql(desde)} AND {fecha_sql(hasta)} AND Codigo IN ({lista_sql(codigos)})
+                WINDOW grupo AS (PARTITION BY Codigo, Fecha))
+            SELECT Codigo, Fecha, count(*)::INTEGER AS Bancos, sum(Share * Share) AS HHI,
+                   sum(CASE WHEN Puesto <= 3 THEN Share ELSE 0 END) AS CR3,
+                   sum(CASE WHEN Puesto <= 5 THEN Share ELSE 0 END) AS CR5
+            FROM partes GROUP BY Codigo, Fecha ORDER BY Codigo, Fecha""")
+
+    def ratios(self, desde, hasta):
+        # Los ratios de analitica.RATIOS para todos los bancos: la matriz de pesos va como tabla de
+        # valores (Codigo, Ratio, parte, peso) y numeradores y denominadores son una suma por (Fecha, ID, Ratio)
+        codigos, absoluto, pesos = an.pesos_ratios()
+        nombres = list(an.RATIOS)
+        filas = ", ".join(f"({codigos[i]}, {j % len(nombres)}, {j >= len(nombres)}, {float(pesos[i, j])})"
+                          for i, j in zip(*pesos.nonzero()))
+        df = self.consultar(f"""
+            WITH pesos(Codigo, Ratio, Denominador, Peso) AS (VALUES {filas}),
+            valores AS (
+                SELECT Fecha, ID, Codigo,
+                       CASE WHEN Codigo IN ({lista_sql(codigos[absoluto])}) THEN abs(Saldo_Act) ELSE Saldo_Act END AS Valor
+                FROM hechos
+                WHERE Fecha BETWEEN {fecha_sql(desde)} AND {fecha_sql(hasta)} AND Codigo IN ({lista_sql(codigos)}))
+            SELECT Fecha, ID, Ratio,
+                   sum(CASE WHEN NOT Denominador THEN Peso * Valor ELSE 0 END) AS Numerador,
+                   sum(CASE WHEN Denominador THEN Peso * Valor ELSE 0 END) AS Denominador
+            FROM valores JOIN pesos USING (Codigo)
+            GROUP BY Fecha, ID, Ratio ORDER BY Fecha, ID, Ratio""")
+        df = df.astype({"Fecha": "int32", "ID": "int32"})
+        df["Ratio"] = pd.Categorical.from_codes(df["Ratio"].to_numpy(), categories=nombres)
+        df["Valor"] = np.divide(df["Numerador"], df["Denominador"], out=np.full(len(df), np.nan),
+                                where=(df["Denominador"] != 0).to_numpy()) * 100
+        return df
+
+
+def cargar_datos(urls, memoria=None):
+    # Misma firma y mismas dimensiones que analitica.cargar_datos, con el motor en lugar de los hechos
+    rutas, fallidos = an.leer_archivos(urls)
+    motor = MotorDuckDB(rutas, memoria)
+    datos = {"motor": motor,
+             "bancos": motor.nombres("ID", "Banco"),
+             "cuentas": an.clasificar_cuentas(motor.nombres("Codigo", "Cuenta")),
+             "periodos": an.armar_periodos(motor.fechas()),
+             "version": an.version_archivos(rutas)}
+    return datos, fallidos
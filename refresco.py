@@ -0,0 +1,118 @@
+# Datos servidos con "stale-while-revalidate": cada conjunto de periodos pedido se carga una vez
+# y después se refresca en un hilo de fondo cada `intervalo` segundos. Mientras se recarga, las
+# sesiones siguen recibiendo la versión anterior; la nueva se publica de una sola vez (se
+# reemplaza la referencia bajo un lock). Ninguna recarga de página paga el costo de refrescar:
+# solo la primera vez que alguien pide un conjunto de periodos nuevo se carga en línea.
+import time
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger("bcra.refresco")
+
+
+class AlmacenDatos:
+    def __init__(self, cargar, intervalo=300, max_entradas=16, version_de=None, ampliar=None):
+        # cargar(urls) -> (datos, fallidos), con datos["version"]
+        # version_de(urls) -> versión actual de los archivos sin armar los datos (opcional): si no
+        #   cambió, el refresco no reconstruye nada
+        # ampliar(datos, urls) -> (datos, fallidos) a partir de datos ya cargados (opcional): se usa
+        #   con la entrada que más urls comparte, p. ej. cuando aparece un mes nuevo en el manifiesto
+        self.cargar = cargar
+        self.intervalo = intervalo
+        self.max_entradas = max_entradas
+        self.version_de = version_de
+        self.ampliar = ampliar
+        self._entradas = OrderedDict()  # urls -> entrada, de la menos a la más usada
+        self._cargando = {}  # urls -> Lock: dos sesiones que piden lo mismo lo cargan una sola vez
+        self._lock = threading.Lock()
+        if intervalo > 0:
+            threading.Thread(target=_refrescar_periodicamente, args=(weakref.ref(self),),
+                             daemon=True, name="bcra-refresco").start()
+
+    def _cargar(self, urls, base=None):
+        if base is not None and self.ampliar is not None:
+            datos, fallidos = self.ampliar(base["datos"], urls)
+        else:
+            datos, fallidos = self.cargar(urls)
+        return {"datos": datos, "fallidos": fallidos, "version": datos["version"], "actualizado": datetime.now()}
+
+    def _base_para(self, urls):
+        # Entrada cargada que más urls comparte con `urls` (None si ninguna comparte)
+        pedidas = set(urls)
+        with self._lock:
+            comunes = [(len(pedidas.intersection(clave)), entrada) for clave, entrada in self._entradas.items()]
+        comunes = [c for c in comunes if c[0]]
+        return max(comunes, key=lambda c: c[0])[1] if comunes else None
+
+    def obtener(self, urls):
+        # Devuelve (entrada, acierto); entrada = {"datos", "fallidos", "version", "actualizado"}
+        with self._lock:
+            if urls in self._entradas:
+                self._entradas.move_to_end(urls)
+                return self._entradas[urls], True
+            candado = self._cargando.setdefault(urls, threading.Lock())
+        with candado:
+            with self._lock:
+                entrada = self._entradas.get(urls)  # Otra sesión pudo cargarlo mientras esperábamos
+            if entrada is None:
+                entrada = self._cargar(urls, self._base_para(urls))
+                with self._lock:
+                    self._entradas[urls] = entrada
+                    while len(self._entradas) > self.max_entradas:
+                        self._entradas.popitem(last=False)
+        with self._lock:
+            self._cargando.pop(urls, None)
+        return entrada, False
+
+    def refrescar(self, urls):
+        # Recarga un conjunto de periodos y, si cambió, publica la versión nueva
+        with self._lock:
+            vieja = self._entradas.get(urls)
+        if vieja is None:
+            return
+        try:
+            if self.version_de is not None and self.version_de(urls) == vieja["version"]:
+                with self._lock:
+                    if urls in self._entradas:
+                        self._entradas[urls] = {**vieja, "actualizado": datetime.now()}
+                return
+            nueva = self._cargar(urls, vieja)
+        except Exception:
+            logger.exception("No se pudieron refrescar los datos; se siguen sirviendo los anteriores")
+            return
+
+        with self._lock:
+            if urls not in self._entradas:
+                return  # Salió del LRU mientras se recargaba
+            if len(nueva["fallidos"]) > len(vieja["fallidos"]):
+                # Una descarga parcial no reemplaza datos completos
+                logger.warning("Refresco con %d archivo(s) fallidos; se mantiene la versión %s",
+                               len(nueva["fallidos"]), vieja["version"])
+                return
+            self._entradas[urls] = nueva
+        logger.info("Datos actualizados: versión %s -> %s", vieja["version"], nueva["version"])
+
+    def claves(self):
+        with self._lock:
+            return list(self._entradas)
+
+
+def _refrescar_periodicamente(referencia):
+    # El hilo solo guarda una referencia débil: si el almacén se descarta (p. ej. al limpiar
+    # st.cache_resource), el hilo termina solo
+    while True:
+        almacen = referencia()
+        if almacen is None:
+            return
+        intervalo = almacen.intervalo
+        del almacen
+        time.sleep(intervalo)
+        almacen = referencia()
+        if almacen is None:
+            return
+        for urls in almacen.claves():
+            almacen.refrescar(urls)
+        del almacen
@@ -0,0 +1,127 @@
+# Reportes por lotes, sin Streamlit: calcula las mismas tablas que la app (balance comparativo,
+# evolución y market share) para un conjunto de bancos / cuentas / periodos y las guarda en archivos.
+#
+#   python reportes.py --periodo 202510                       # todos los bancos, vistas macro
+#   python reportes.py --periodo 202510 --bancos 7 11 --cuentas 131000 311000 --desde 202401 --formato xlsx
+#
+# Cada banco se procesa en un proceso aparte (--procesos, por defecto todos los núcleos).
+import os
+import re
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import analitica as an
+
+_DATOS = None  # Datos cargados, compartidos con los procesos hijos (fork) o recargados desde el cache
+
+
+def _iniciar_proceso(urls):
+    global _DATOS
+    if _DATOS is None:
+        # Con "spawn" el proceso arranca vacío: se relee desde el cache Parquet en disco
+        _DATOS, _ = an.cargar_datos(urls)
+
+
+def guardar_tabla(df, ruta, formato, index=False):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    ruta = f"{ruta}.{formato}"
+    if formato == "csv":
+        df.to_csv(ruta, index=index, encoding="utf-8-sig")
+    elif formato == "xlsx":
+        df.to_excel(ruta, index=index)
+    else:
+        # Parquet exige un tipo por columna: las de texto con 0 del fillna de la app van como texto
+        df.astype({col: str for col in df.columns if df[col].dtype == object}).to_parquet(ruta, index=index)
+    return ruta
+
+
+def nombre_seguro(texto):
+    # "BANCO DE LA NACION ARGENTINA" -> "BANCO_DE_LA_NACION_ARGENTINA" (apto para nombre de archivo)
+    return re.sub(r"[^0-9A-Za-z]+", "_", str(texto)).strip("_")
+
+
+def reporte_banco(id_banco, args, codigos):
+    # Balance comparativo y evolución de un banco. Devuelve (ID, filas del balance, archivos escritos).
+    datos = _DATOS
+    prefijo = f"{id_banco}_{nombre_seguro(datos['bancos'].at[id_banco, 'Banco'])}"
+    df_comp, _ = an.armar_comparativo(datos, [id_banco], args.periodo, args.comparar_contra, args.base)
+    df_res = an.filtrar_balance(df_comp, args.vista)
+    archivos = [guardar_tabla(df_res[an.COLUMNAS_BALANCE], os.path.join(args.salida, "balance", prefijo), args.formato)]
+
+    df_ev = an.armar_evolucion(datos, [id_banco], codigos, args.desde, args.periodo, consolidado=False)
+    if not df_ev.empty:
+        archivos.append(guardar_tabla(df_ev, os.path.join(args.salida, "evolucion", prefijo), args.formato))
+    return id_banco, len(df_res), archivos
+
+
+def elegir_bancos(bancos, pedidos):
+    # Acepta IDs o nombres (exactos); sin nada, todos los bancos
+    if not pedidos:
+        return bancos.index.tolist()
+    ids = []
+    for pedido in pedidos:
+        if pedido.isdigit() and int(pedido) in bancos.index:
+            ids.append(int(pedido))
+        else:
+            encontrados = bancos.index[bancos["Banco"] == pedido].tolist()
+            if not encontrados:
+                sys.exit(f"Banco desconocido: {pedido}")
+            ids.extend(encontrados)
+    return list(dict.fromkeys(ids))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reportes por lotes de los balances del BCRA")
+    parser.add_argument("--periodo", type=int, help="Periodo de la tabla (AAAAMM). Por defecto el último del manifiesto")
+    parser.add_argument("--desde", type=int, help="Inicio del rango de evolución / market share (AAAAMM). Por defecto --periodo")
+    parser.add_argument("--bancos", nargs="*", default=[], help="IDs o nombres de bancos. Por defecto todos")
+    parser.add_argument("--cuentas", nargs="*", type=int, default=[], help="Códigos para evolución y market share. Por defecto los de Vista Macro")
+    parser.add_argument("--comparar-contra", choices=an.COMPARACIONES, default="Mes anterior")
+    parser.add_argument("--base", type=int, help="Periodo base (AAAAMM) si --comparar-contra es 'Periodo base'")
+    parser.add_argument("--vista", choices=an.VISTAS, default="Todo")
+    parser.add_argument("--manifiesto", default=an.MANIFIESTO)
+    parser.add_argument("--salida", default="reportes")
+    parser.add_argument("--formato", choices=["csv", "xlsx", "parquet"], default="csv")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count())
+    args = parser.parse_args(argv)
+
+    manifiesto = an.cargar_manifiesto(args.manifiesto)
+    fechas = sorted(manifiesto)
+    args.periodo = args.periodo or fechas[-1]
+    args.desde = args.desde or args.periodo
+    if args.comparar_contra == "Periodo base" and args.base is None:
+        parser.error("--base es obligatorio con --comparar-contra 'Periodo base'")
+    if args.periodo not in manifiesto:
+        parser.error(f"El periodo {args.periodo} no está en el manifiesto")
+
+    # Una sola carga (descargas en paralelo + cache Parquet) para todo el lote
+    global _DATOS
+    urls = tuple(manifiesto[f] for f in an.periodos_necesarios(fechas, args.periodo, args.comparar_contra, args.base, args.desde, args.periodo))
+    _DATOS, fallidos = an.cargar_datos(urls)
+    for archivo, error in fallidos:
+        print(f"No se pudo descargar {archivo}: {error}", file=sys.stderr)
+    if _DATOS["hechos"].empty:
+        sys.exit("No hay datos disponibles.")
+
+    ids = elegir_bancos(_DATOS["bancos"], args.bancos)
+    cuentas = _DATOS["cuentas"]
+    codigos = args.cuentas or cuentas.index[cuentas["Vista"] == "Vista Macro"].tolist()
+
+    # Market share de todos los bancos del lote juntos (un solo cálculo vectorizado)
+    df_ms = an.armar_market_share(_DATOS, ids, codigos, args.desde, args.periodo)
+    if df_ms is not None:
+        guardar_tabla(df_ms, os.path.join(args.salida, "market_share"), args.formato)
+        guardar_tabla(an.tabla_market_share(df_ms), os.path.join(args.salida, "market_share_tabla"), args.formato, index=True)
+        guardar_tabla(an.variacion_share(df_ms)[0], os.path.join(args.salida, "market_share_variacion"), args.formato)
+
+    # Un banco por tarea, repartidos entre los procesos
+    procesos = max(1, min(args.procesos, len(ids)))
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso, initargs=(urls,)) as pool:
+        n = len(ids)
+        resultados = pool.map(reporte_banco, ids, [args] * n, [codigos] * n, chunksize=max(1, n // (procesos * 4)))
+        for id_banco, filas, archivos in resultados:
+            print(f"{id_banco}: {filas} cuentas -> {', '.join(archivos)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# Telemetría de cada recarga de la app: tiempo por sección, aciertos / fallos de los caches
+# y memoria de las tablas. Cada recarga se emite como una línea JSON en el logger
+# "bcra.telemetria" (a stderr, o al archivo de BCRA_TELEMETRIA_LOG) para poder agregarla
+# entre sesiones. No depende de Streamlit: cada recarga corre en su propio hilo, así que
+# el registro en curso se guarda por hilo.
+import os
+import json
+import time
+import logging
+import threading
+import functools
+from datetime import datetime, timezone
+
+logger = logging.getLogger("bcra.telemetria")
+if not logger.handlers:
+    destino = os.environ.get("BCRA_TELEMETRIA_LOG")
+    handler = logging.FileHandler(destino, encoding="utf-8") if destino else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+_hilo = threading.local()
+
+
+def iniciar(**contexto):
+    # Abre el registro de una recarga; `contexto` (usuario, sesión, filtros...) va tal cual al log
+    ahora = time.perf_counter()
+    _hilo.registro = {"inicio": ahora, "ultima_marca": ahora, "contexto": contexto,
+                      "secciones": {}, "cache": {}, "memoria_mb": {}}
+    return _hilo.registro
+
+
+def en_curso():
+    # Hay una recarga registrándose en este hilo (p. ej. la página completa, que contiene al fragmento)
+    return getattr(_hilo, "registro", None) is not None
+
+
+def contexto(**datos):
+    # Agrega datos al contexto de la recarga en curso (p. ej. el usuario, una vez autenticado)
+    registro = getattr(_hilo, "registro", None)
+    if registro is not None:
+        registro["contexto"].update(datos)
+
+
+def transcurrido_ms():
+    # Milisegundos desde iniciar (None si no hay una recarga en curso)
+    registro = getattr(_hilo, "registro", None)
+    if registro is None:
+        return None
+    return round((time.perf_counter() - registro["inicio"]) * 1000, 1)
+
+
+def marca(seccion):
+    # Suma a `seccion` el tiempo transcurrido desde la marca anterior (o desde iniciar)
+    registro = getattr(_hilo, "registro", None)
+    if registro is None:
+        return
+    ahora = time.perf_counter()
+    registro["secciones"][seccion] = registro["secciones"].get(seccion, 0.0) + (ahora - registro["ultima_marca"]) * 1000
+    registro["ultima_marca"] = ahora
+
+
+def tamanio_mb(objeto):
+    # Memoria de un DataFrame / Series / array, o de un dict o tupla de ellos (como `datos`).
+    # numpy / pandas se importan acá: el resto del módulo se usa también en la pantalla de login
+    import numpy as np
+    import pandas as pd
+    if isinstance(objeto, (dict, list, tuple)):
+        valores = objeto.values() if isinstance(objeto, dict) else objeto
+        return sum(tamanio_mb(v) for v in valores)
+    if isinstance(objeto, pd.DataFrame):
+        return objeto.memory_usage(deep=True).sum() / 2**20
+    if isinstance(objeto, (pd.Series, pd.Index)):
+        return objeto.memory_usage(deep=True) / 2**20
+    if isinstance(objeto, np.ndarray):
+        return objeto.nbytes / 2**20
+    return 0.0
+
+
+def memoria(nombre, objeto):
+    registro = getattr(_hilo, "registro", None)
+    if registro is not None:
+        registro["memoria_mb"][nombre] = round(tamanio_mb(objeto), 2)
+
+
+def _contar(nombre, campo):
+    registro = getattr(_hilo, "registro", None)
+    if registro is not None:
+        contador = registro["cache"].setdefault(nombre, {"llamadas": 0, "misses": 0})
+        contador[campo] += 1
+
+
+def contar_cache(nombre, acierto):
+    # Para caches propios (p. ej. el de resultados): una llamada, y un fallo si no hubo acierto
+    _contar(nombre, "llamadas")
+    if not acierto:
+        _contar(nombre, "misses")
+
+
+def cacheada(nombre, cache):
+    # Envuelve `cache` (p. ej. st.cache_data(ttl=300)) contando llamadas y fallos: el cuerpo
+    # de la función solo se ejecuta cuando el resultado no estaba en el cache.
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def ejecutar(*args, **kwargs):
+            _contar(nombre, "misses")
+            return funcion(*args, **kwargs)
+        en_cache = cache(ejecutar)
+
+        @functools.wraps(funcion)
+        def llamar(*args, **kwargs):
+            _contar(nombre, "llamadas")
+            return en_cache(*args, **kwargs)
+        llamar.clear = getattr(en_cache, "clear", None)
+        return llamar
+    return decorador
+
+
+def cerrar():
+    # Cierra el registro de la recarga, lo emite como JSON y lo devuelve (para el panel de admin)
+    registro = getattr(_hilo, "registro", None)
+    if registro is None:
+        return None
+    _hilo.registro = None
+    evento = {
+        "evento": "recarga",
+        "momento": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        **registro["contexto"],
+        "total_ms": round((time.perf_counter() - registro["inicio"]) * 1000, 1),
+        "secciones_ms": {k: round(v, 1) for k, v in registro["secciones"].items()},
+        "cache": {k: {"hits": v["llamadas"] - v["misses"], "misses": v["misses"]} for k, v in registro["cache"].items()},
+        "memoria_mb": registro["memoria_mb"],
+    }
+    logger.info(json.dumps(evento, ensure_ascii=False, default=str))
+    return evento